@@ -0,0 +1,123 @@
+"""Synthetic policies for benchmarks.
+
+Each generator returns a scenario: {'policies': [policy, ...], 'questions': [(role, privilege, resource), ...]}.
+The first policy is loaded into the root ACL, each next one into a child
+ACL whose parent is the previous one. Questions are asked of the last ACL.
+"""
+from __future__ import absolute_import, unicode_literals
+import random
+
+PRIVILEGES = ['browse', 'view', 'add', 'edit', 'delete']
+
+
+def _privileges(models):
+    return ['{0}.{1}'.format(action, model) for model in models for action in PRIVILEGES]
+
+
+def deep_dotted(scale=1.0, depth=8, seed=1):
+    """Resources like "site.l1.l2...l7.N", with rules at every level"""
+    rnd = random.Random(seed)
+    count = int(2000 * scale)
+    resources = ['.'.join(['site'] + ['l{0}_{1}'.format(level, i % (level + 2)) for level in range(1, depth)] +
+                          [str(i)]) for i in range(count)]
+    roles = ['role_{0}'.format(i) for i in range(20)]
+    privileges = _privileges(['site.page'])
+    acl = {}
+    for i, resource in enumerate(resources):
+        parts = resource.split('.')
+        target = '.'.join(parts[:rnd.randint(1, len(parts))])
+        acl.setdefault(target, {}).setdefault(rnd.choice(roles), {})[rnd.choice(PRIVILEGES)] = rnd.random() > 0.2
+    questions = [(rnd.choice(roles), rnd.choice(privileges), rnd.choice(resources)) for i in range(2000)]
+    return {'policies': [{'roles': roles, 'privileges': privileges, 'resources': resources, 'acl': acl}],
+            'questions': questions}
+
+
+def wide_roles(scale=1.0, width=20, seed=2):
+    """Users inheriting from many groups, which inherit from a few base roles"""
+    rnd = random.Random(seed)
+    bases = ['base_{0}'.format(i) for i in range(10)]
+    groups = ['group_{0}'.format(i) for i in range(int(500 * scale) or 1)]
+    users = ['user_{0}'.format(i) for i in range(int(1000 * scale) or 1)]
+    privileges = _privileges(['blog.post', 'blog.comment'])
+    resources = ['blog.post.{0}'.format(i) for i in range(int(1000 * scale) or 1)]
+    # Parents are kept in one global order, otherwise C3 linearization fails
+    roles = bases + [[group, sorted(rnd.sample(bases, 3), key=bases.index)] for group in groups]
+    roles += [[user, [groups[i] for i in sorted(rnd.sample(range(len(groups)), min(width, len(groups))))]]
+              for user in users]
+    acl = {'any': dict((base, {rnd.choice(PRIVILEGES): True}) for base in bases)}
+    for group in groups:
+        acl.setdefault(rnd.choice(resources), {})[group] = {rnd.choice(privileges): rnd.random() > 0.3}
+    questions = [(rnd.choice(users), rnd.choice(privileges), rnd.choice(resources)) for i in range(2000)]
+    return {'policies': [{'roles': roles, 'privileges': privileges, 'resources': resources, 'acl': acl}],
+            'questions': questions}
+
+
+def resource_role_parents(scale=1.0, seed=3):
+    """Users which are moderators or authors of particular resources"""
+    rnd = random.Random(seed)
+    resources = ['forum.topic.{0}'.format(i) for i in range(int(2000 * scale) or 1)]
+    users = ['user_{0}'.format(i) for i in range(int(2000 * scale) or 1)]
+    privileges = _privileges(['forum.topic'])
+    roles = ['authenticated', 'moderator', 'author']
+    for user in users:
+        parents = {'any': ['authenticated']}
+        for resource in rnd.sample(resources, min(5, len(resources))):
+            parents[resource] = [rnd.choice(['moderator', 'author'])]
+        roles.append([user, parents])
+    acl = {
+        'any': {'authenticated': {'browse': True, 'view': True}},
+        'forum.topic': {'moderator': {'edit': True, 'delete': True}, 'author': {'edit': True}},
+    }
+    questions = [(rnd.choice(users), rnd.choice(privileges), rnd.choice(resources)) for i in range(2000)]
+    return {'policies': [{'roles': roles, 'privileges': privileges, 'resources': resources, 'acl': acl}],
+            'questions': questions}
+
+
+def acl_chain(scale=1.0, length=5, seed=4):
+    """ACLs inheriting from each other, rules spread over the chain"""
+    rnd = random.Random(seed)
+    privileges = _privileges(['shop.order'])
+    policies, users, resources = [], [], []
+    for level in range(length):
+        level_users = ['user_{0}_{1}'.format(level, i) for i in range(int(200 * scale) or 1)]
+        level_resources = ['shop.order.{0}_{1}'.format(level, i) for i in range(int(500 * scale) or 1)]
+        policy = {
+            'roles': ['staff_{0}'.format(level)] + [[user, ['staff_{0}'.format(rnd.randint(0, level))]]
+                                                    for user in level_users],
+            'privileges': privileges if level == 0 else [],
+            'resources': level_resources,
+            'acl': dict((resource, {'staff_{0}'.format(level): {rnd.choice(PRIVILEGES): rnd.random() > 0.2}})
+                        for resource in level_resources[::3]),
+        }
+        policies.append(policy)
+        users += level_users
+        resources += level_resources
+    questions = [(rnd.choice(users), rnd.choice(privileges), rnd.choice(resources)) for i in range(2000)]
+    return {'policies': policies, 'questions': questions}
+
+
+def many_users(scale=1.0, seed=5):
+    """Lots of users with direct rules on their own objects"""
+    rnd = random.Random(seed)
+    users = ['user_{0}'.format(i) for i in range(int(20000 * scale) or 1)]
+    privileges = _privileges(['docs.document'])
+    resources = ['docs.document.{0}'.format(i) for i in range(len(users))]
+    acl = dict((resource, {user: {'edit': True, 'view': True}}) for user, resource in zip(users, resources))
+    acl['any'] = {'authenticated': {'browse': True}}
+    roles = ['authenticated'] + [[user, ['authenticated']] for user in users]
+    questions = [(rnd.choice(users), rnd.choice(privileges), rnd.choice(resources)) for i in range(2000)]
+    return {'policies': [{'roles': roles, 'privileges': privileges, 'resources': resources, 'acl': acl}],
+            'questions': questions}
+
+
+SCENARIOS = {
+    'deep_dotted': deep_dotted,
+    'wide_roles': wide_roles,
+    'resource_role_parents': resource_role_parents,
+    'acl_chain': acl_chain,
+    'many_users': many_users,
+}
+
+
+def count_rules(policy):
+    return sum(len(rules) for role_rules in policy.get('acl', {}).values() for rules in role_rules.values())
@@ -0,0 +1,52 @@
+"""Memory per rule of SimpleBackend and CompactBackend.
+
+Usage: python benchmarks/memory.py [rules]
+"""
+from __future__ import absolute_import, unicode_literals, print_function
+import gc
+import os
+import sys
+import tracemalloc
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(
+        os.path.dirname(os.path.abspath(__file__))
+    ))
+
+import simpleacl
+from simpleacl import json
+
+
+def build(backend_factory, rules, users=1000):
+    acl = simpleacl.Acl(backend_factory)
+    acl.add_privilege('edit.blog.post')
+    for i in range(users):
+        acl.add_role('user_{0}'.format(i))
+    for i in range(rules):
+        resource = acl.add_resource('blog.post.{0}'.format(i))
+        acl.add_rule('user_{0}'.format(i % users), 'edit.blog.post', resource, True)
+    return acl
+
+
+def measure(backend_factory, rules):
+    gc.collect()
+    tracemalloc.start()
+    acl = build(backend_factory, rules)
+    gc.collect()
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del acl
+    return {'backend': backend_factory.__name__,
+            'rules': rules,
+            'bytes': current,
+            'bytes_per_rule': current / float(rules)}
+
+
+def main(rules=100000):
+    results = [measure(factory, rules) for factory in (simpleacl.SimpleBackend, simpleacl.CompactBackend)]
+    print(json.dumps(results, indent=2))
+    return results
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:]])
@@ -0,0 +1,236 @@
+"""Benchmark suite, prints the results as JSON.
+
+Usage:
+    python benchmarks/run.py [--scale 1.0] [--scenario NAME ...] [--output results.json]
+    python benchmarks/run.py --compare old.json new.json [--threshold 1.1]
+
+Each result is a record {"scenario", "metric", "mode", "value", "unit"};
+records of two runs with the same (scenario, metric, mode) are compared.
+"""
+from __future__ import absolute_import, unicode_literals, print_function
+import argparse
+import gc
+import os
+import platform
+import sys
+import time
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(
+        os.path.dirname(os.path.abspath(__file__))
+    ))
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import simpleacl
+from simpleacl import json
+import generators
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None  # Python 2.*
+
+timer = getattr(time, 'perf_counter', time.time)
+
+MODES = {
+    'default': {},
+    'compiled': {'compiled': True},
+}
+
+
+def build(scenario, loader='bulk_load', **options):
+    acl = None
+    for policy in scenario['policies']:
+        parent, acl = acl, simpleacl.Acl(**options)
+        acl.parent = parent
+        getattr(acl, loader)(policy)
+    return acl
+
+
+def percentiles(samples, points=(50, 90, 99)):
+    samples = sorted(samples)
+    result = dict(('p{0}'.format(point), samples[min(len(samples) - 1, len(samples) * point // 100)])
+                  for point in points)
+    result['max'] = samples[-1]
+    result['mean'] = sum(samples) / len(samples)
+    return result
+
+
+def record(name, metric, mode, value, unit):
+    return {'scenario': name, 'metric': metric, 'mode': mode, 'value': value, 'unit': unit}
+
+
+def bench_is_allowed(name, scenario):
+    results = []
+    for mode, options in sorted(MODES.items()):
+        acl = build(scenario, **options)
+        for phase in ('cold', 'warm'):
+            samples = []
+            for question in scenario['questions']:
+                start = timer()
+                acl.is_allowed(*question)
+                samples.append((timer() - start) * 1e6)
+            for key, value in sorted(percentiles(samples).items()):
+                results.append(record(name, 'is_allowed.{0}.{1}'.format(phase, key), mode, value, 'us'))
+    return results
+
+
+def bench_bulk_load(name, scenario):
+    results = []
+    rules = sum(generators.count_rules(policy) for policy in scenario['policies'])
+    entries = rules + sum(len(policy.get(section, ())) for policy in scenario['policies']
+                          for section in ('roles', 'privileges', 'resources'))
+    for loader in ('bulk_load', 'fast_bulk_load'):
+        start = timer()
+        build(scenario, loader)
+        elapsed = timer() - start
+        results.append(record(name, '{0}.seconds'.format(loader), 'default', elapsed, 's'))
+        results.append(record(name, '{0}.throughput'.format(loader), 'default', entries / elapsed, 'entries/s'))
+    return results
+
+
+def bench_memory(name, scenario):
+    if tracemalloc is None:
+        return []
+    rules = sum(generators.count_rules(policy) for policy in scenario['policies'])
+    results = []
+    for backend in (simpleacl.SimpleBackend, simpleacl.CompactBackend):
+        gc.collect()
+        tracemalloc.start()
+        acl = build(scenario, backend_factory=backend)
+        gc.collect()
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del acl
+        results.append(record(name, 'memory.bytes', backend.__name__, current, 'B'))
+        results.append(record(name, 'memory.bytes_per_rule', backend.__name__, current / float(rules or 1), 'B'))
+    return results
+
+
+def bench_has_perm(scale):
+    """has_perm() of django_simpleacl.backends.PermissionBackend, empty when Django is missing"""
+    try:
+        import django
+        from django.conf import settings as django_settings
+    except ImportError:
+        return []
+    if not django_settings.configured:
+        django_settings.configure(
+            INSTALLED_APPS=['django.contrib.auth', 'django.contrib.contenttypes'],
+            DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+        )
+        django.setup()
+    from simpleacl import paste, settings
+    from simpleacl.django_simpleacl.backends import PermissionBackend
+
+    class Groups(object):
+        def __init__(self, names):
+            self.names = names
+
+        def all(self):
+            return self
+
+        def values_list(self, *args, **kwargs):
+            return self.names
+
+    class User(object):
+        def __init__(self, pk):
+            self.pk = pk
+            self.groups = Groups(['authenticated'])
+
+    class Meta(object):
+        app_label = 'docs'
+        module_name = model_name = 'document'
+
+    class Document(object):
+        _meta = Meta()
+
+        def __init__(self, pk):
+            self.pk = pk
+
+    scenario = generators.many_users(scale)
+    old_data = settings.INITIAL_DATA
+    settings.INITIAL_DATA = scenario['policies'][0]
+    paste._ctx.__dict__.clear()
+    paste.shared_acl.reset()
+    try:
+        backend = PermissionBackend()
+        users = len(scenario['policies'][0]['roles']) - 1
+        questions = [(User(i % users), 'docs.edit_document', Document((i * 7) % users)) for i in range(2000)]
+        results = []
+        for phase in ('cold', 'warm'):
+            samples = []
+            for user, perm, obj in questions:
+                start = timer()
+                backend.has_perm(user, perm, obj)
+                samples.append((timer() - start) * 1e6)
+            for key, value in sorted(percentiles(samples).items()):
+                results.append(record('many_users', 'has_perm.{0}.{1}'.format(phase, key), 'default', value, 'us'))
+        return results
+    finally:
+        settings.INITIAL_DATA = old_data
+        paste._ctx.__dict__.clear()
+        paste.shared_acl.reset()
+
+
+def run(scale=1.0, scenarios=None):
+    results = []
+    for name in sorted(scenarios or generators.SCENARIOS):
+        scenario = generators.SCENARIOS[name](scale)
+        for bench in (bench_bulk_load, bench_is_allowed, bench_memory):
+            results.extend(bench(name, scenario))
+    results.extend(bench_has_perm(scale))
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'scale': scale,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+
+
+def compare(old, new, threshold=1.1):
+    """Returns the records of new run with the ratio to the old one, slowdowns are flagged"""
+    old_values = dict(((i['scenario'], i['metric'], i['mode']), i['value']) for i in old['results'])
+    result = []
+    for item in new['results']:
+        key = (item['scenario'], item['metric'], item['mode'])
+        if key not in old_values or not old_values[key]:
+            continue
+        ratio = item['value'] / old_values[key]
+        if item['unit'].endswith('/s'):
+            ratio = 1 / ratio if ratio else float('inf')  # Higher is better
+        result.append(dict(item, old_value=old_values[key], ratio=ratio, slower=ratio > threshold))
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=float, default=1.0)
+    parser.add_argument('--scenario', action='append', choices=sorted(generators.SCENARIOS))
+    parser.add_argument('--output')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    parser.add_argument('--threshold', type=float, default=1.1)
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as old, open(args.compare[1]) as new:
+            result = compare(json.load(old), json.load(new), args.threshold)
+        print(json.dumps(result, indent=2))
+        return 1 if any(i['slower'] for i in result) else 0
+
+    result = run(args.scale, args.scenario)
+    data = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(data)
+    else:
+        print(data)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -18,8 +18,13 @@
 #######################################################################
 from __future__ import absolute_import, unicode_literals
 
-import collections
+import copy
+import time
+import weakref
+from array import array
+from collections import namedtuple, OrderedDict
 from functools import partial
+from threading import local
 from simpleacl import exceptions, interfaces, walkers, utils
 from simpleacl.constants import ANY_PRIVILEGE, ANY_RESOURCE
 
@@ -37,8 +42,17 @@ except NameError:
     integer_types = (int,)
 
 
+_state = local()
+
+# Probe visited by Acl.explain(), rule is the stored value, result is the value returned by is_plain_allowed()
+ExplainStep = namedtuple('ExplainStep', ('acl', 'role', 'resource', 'privilege', 'rule', 'result', 'seconds'))
+Explanation = namedtuple('Explanation', ('allow', 'matched', 'steps', 'seconds'))
+
+
 class Entity(interfaces.IEntity):
     """Abstract Entity class"""
+    __slots__ = ('name', '_acl', '__weakref__')
+
     def __init__(self, name):
         self.name = name
 
@@ -63,24 +77,71 @@ class Entity(interfaces.IEntity):
     def get_name(self):
         return self.name
 
+    def _parents_changed(self):
+        """Drops the linearizations and the decisions of the ACL which depend on the parents"""
+        utils.mro_cache.invalidate(self)
+        acl = getattr(self, '_acl', None)
+        acl = acl and acl()
+        if acl is not None:
+            acl._changed()
+
 
 class Role(Entity, interfaces.IRole):
     """Holds a role value"""
+    __slots__ = ('_parents', '_children', '_walk')
+
     def __init__(self, name, walker=None):
         self.name = name
-        self._parents = collections.defaultdict(list)  # Order is important, so use the list(), not set
+        self._parents = {}  # Order is important, so use the list(), not set
+        self._children = None  # resource (None for dotted names) -> weakly referenced children by id
         self._walk = walker or walkers.default_role_walker
 
     def add_parent(self, parent, resource):
         parents = self._parents.setdefault(resource, [])
         if parent not in parents:
             parents.append(parent)
+            parent.add_child(self, resource)
+            self._parents_changed()
+
+    def add_child(self, child, resource=None):
+        """Registers the inverse link of child.add_parent(self, resource).
+
+        Dotted names like "staff.editor" are children of "staff" with resource None.
+        """
+        if self._children is None:
+            self._children = {}
+        children = self._children.get(resource)
+        if children is None:
+            children = self._children[resource] = weakref.WeakValueDictionary()
+        children[id(child)] = child
+
+    def remove_parent(self, parent, resource):
+        parents = self._parents.get(resource, [])
+        if parent in parents:
+            parents.remove(parent)
+            if not parents:
+                del self._parents[resource]
+            parent.remove_child(self, resource)
+            self._parents_changed()
+
+    def remove_child(self, child, resource=None):
+        children = (self._children or {}).get(resource)
+        if children is not None:
+            children.pop(id(child), None)
+
+    def get_children_map(self):
+        """Returns {resource: children}, the resource is None for dotted names"""
+        return dict((resource, list(children.values())) for resource, children in (self._children or {}).items())
 
     def get_parents(self, resource, acl):
         return self._walk(self, resource, acl)
 
     def get_plain_parents(self, resource, acl):
-        return tuple(self._parents[resource])
+        return tuple(self._parents.get(resource, ()))
+
+    def get_parents_map(self):
+        """Returns {resource: parents} for all resources the role has parents for"""
+        return dict((resource, tuple(parents)) for resource, parents in self._parents.items() if parents)
 
 
 class BoundRole(Entity, interfaces.IRole):
@@ -91,18 +152,20 @@ class BoundRole(Entity, interfaces.IRole):
 
     def __getattr__(self, name):
         if name in ('is_allowed', 'allow', 'remove_allow', 'remove_rule',
-                    'deny', 'add_rule', 'remove_rule', ):
+                    'deny', 'add_rule', 'remove_rule', 'filter_allowed', ):
             return partial(getattr(self.acl, name), self.role)
         raise AttributeError
 
 
 class Privilege(Entity, interfaces.IPrivilege):
     """Holds a privilege value"""
-    pass
+    __slots__ = ()
 
 
 class Resource(Entity, interfaces.IResource):
     """Holds a role value"""
+    __slots__ = ('_parents',)
+
     def __init__(self, name):
         """For example, name == 'blog.post.15'.
 
@@ -110,11 +173,17 @@ class Resource(Entity, interfaces.IResource):
         to obtain name from model.
         """
         self.name = name
-        self._parents = []  # Order is important, so use the list(), not set
+        self._parents = ()  # Order is important, so use the tuple(), not set
 
     def add_parent(self, parent):
         if parent not in self._parents:
-            self._parents.append(parent)
+            self._parents += (parent, )
+            self._parents_changed()
+
+    def remove_parent(self, parent):
+        if parent in self._parents:
+            self._parents = tuple(i for i in self._parents if i != parent)
+            self._parents_changed()
 
     def get_parents(self):
         return self._parents
@@ -139,6 +208,9 @@ class SimpleBackend(interfaces.IBackend):
         self._privileges = {}
         self._acl = {}
         self._resources = {}
+        self._rule_index = {}  # (role, privilege) -> set of resources
+        self._role_rules = {}  # role -> number of rules
+        self.version = 0  # Changes on each change of rules
 
     def add_role(self, instance):
         """Adds role"""
@@ -151,10 +223,22 @@ class SimpleBackend(interfaces.IBackend):
         except KeyError:
             raise exceptions.MissingRole('Missing Role "{0}"'.format(name))
 
+    def remove_role(self, instance):
+        """Removes role, but not its rules"""
+        self._roles.pop(instance.get_name(), None)
+
     def add_privilege(self, instance):
         """Adds privilege"""
         self._privileges[instance.get_name()] = instance
 
+    def remove_privilege(self, instance):
+        """Removes privilege, but not its rules"""
+        self._privileges.pop(instance.get_name(), None)
+
+    def get_privileges(self):
+        """Returns all privilege instances"""
+        return list(self._privileges.values())
+
     def get_privilege(self, name):
         """Returns a privilege instance"""
         try:
@@ -166,6 +250,14 @@ class SimpleBackend(interfaces.IBackend):
         """Adds privilege"""
         self._resources[instance.get_name()] = instance
 
+    def remove_resource(self, instance):
+        """Removes resource, but not its rules"""
+        self._resources.pop(instance.get_name(), None)
+
+    def get_resources(self):
+        """Returns all resource instances"""
+        return list(self._resources.values())
+
     def get_resource(self, name):
         """Returns a privilege instance"""
         try:
@@ -175,35 +267,540 @@ class SimpleBackend(interfaces.IBackend):
 
     def add_rule(self, role, privilege, resource, allow=True):
         """Adds rule to the ACL"""
-        self._acl.setdefault(resource, {}).setdefault(role, {})[privilege] = allow
+        rules = self._acl.setdefault(resource, {}).setdefault(role, {})
+        if privilege not in rules:
+            self._role_rules[role] = self._role_rules.get(role, 0) + 1
+        elif rules[privilege] == allow:
+            return self
+        rules[privilege] = allow
+        self._rule_index.setdefault((role, privilege), set()).add(resource)
+        self.version += 1
         return self
 
     def remove_rule(self, role, privilege, resource, allow=True):
         """Removes rule from ACL"""
-        try:
-            if self._acl[resource][role][privilege] == allow:
-                del self._acl[resource][role][privilege]
-        except KeyError:
-            pass
+        role_rules = self._acl.get(resource, {})
+        rules = role_rules.get(role, {})
+        if privilege in rules and rules[privilege] == allow:
+            del rules[privilege]
+            if not rules:
+                del role_rules[role]
+                if not role_rules:
+                    del self._acl[resource]
+            self._role_rules[role] -= 1
+            if not self._role_rules[role]:
+                del self._role_rules[role]
+            resources = self._rule_index[(role, privilege)]
+            resources.discard(resource)
+            if not resources:
+                del self._rule_index[(role, privilege)]
+            self.version += 1
         return self
 
+    def has_rules(self, role=None, resource=None):
+        """Returns False if there are no rules for the role, the resource, or both of them"""
+        if resource is None:
+            return role in self._role_rules
+        role_rules = self._acl.get(resource)
+        return role_rules is not None and (role is None or role in role_rules)
+
+    def get_roles(self):
+        """Returns all role instances"""
+        return list(self._roles.values())
+
+    def get_rules(self):
+        """Returns all (role, privilege, resource, allow)"""
+        return [(role, privilege, resource, allow)
+                for resource, role_rules in self._acl.items()
+                for role, rules in role_rules.items()
+                for privilege, allow in rules.items()]
+
+    def get_rule_roles(self, resources, privileges):
+        """Returns the roles which have rules for any of given resources and privileges"""
+        result = []
+        for resource in resources:
+            for role, rules in self._acl.get(resource, {}).items():
+                if any(privilege in rules for privilege in privileges):
+                    result.append(role)
+        return result
+
+    def get_rule_resources(self, roles, privileges):
+        """Returns the resources which have rules for any of given roles and privileges"""
+        result = set()
+        for role in roles:
+            for privilege in privileges:
+                result.update(self._rule_index.get((role, privilege), ()))
+        return result
+
     def is_allowed(self, role, privilege, resource, undef=None):
         """Returns True if role is allowed for given arguments"""
+        role_rules = self._acl.get(resource)
+        if role_rules is not None:
+            rules = role_rules.get(role)
+            if rules is not None:
+                return rules.get(privilege, undef)
+        return undef
+
+
+class CompactRole(Role):
+    """Role of CompactBackend, it's held by the backend once it has parents or children.
+
+    Children are referenced weakly by their parents, so a child (e.g. a dotted
+    name without parents of its own) is held once it's linked too.
+    """
+    __slots__ = ('_backend', '_id')
+
+    def add_parent(self, parent, resource):
+        _hold(self)
+        super(CompactRole, self).add_parent(parent, resource)
+
+    def add_child(self, child, resource=None):
+        _hold(self)
+        _hold(child)
+        super(CompactRole, self).add_child(child, resource)
+
+
+class CompactPrivilege(Privilege):
+    """Privilege of CompactBackend"""
+    __slots__ = ('_backend', '_id')
+
+
+class CompactResource(Resource):
+    """Resource of CompactBackend, it's held by the backend once it has parents"""
+    __slots__ = ('_backend', '_id')
+
+    def add_parent(self, parent):
+        _hold(self)
+        super(CompactResource, self).add_parent(parent)
+
+
+def _hold(instance):
+    backend = getattr(instance, '_backend', None)
+    if backend is not None:
+        backend._hold(instance)
+
+
+class CompactBackend(SimpleBackend):
+    """A storage with interned names and a flat table of rules.
+
+    Each name gets an integer id in a utils.NameTable, and a rule is stored
+    under one integer key packed from the ids of its resource, role and
+    privilege in a utils.IntTable. Entities are created from the names on
+    access. Only the ones with parents or children (or of other classes)
+    are held, the others are kept while they are used elsewhere. Reverse
+    queries scan the table, so they are slower than with SimpleBackend.
+    """
+    role_class = CompactRole
+    privilege_class = CompactPrivilege
+    resource_class = CompactResource
+    id_bits = 21  # The key of a rule must fit into 63 bits
+    kinds = ('role', 'privilege', 'resource')
+
+    def __init__(self):
+        """Constructor."""
+        self._names = dict((kind, utils.NameTable()) for kind in self.kinds)
+        self._present = dict((kind, bytearray()) for kind in self.kinds)  # 1 for registered ids
+        self._counts = dict((kind, array(str('I'))) for kind in self.kinds)  # Number of rules by id
+        self._held = dict((kind, {}) for kind in self.kinds)  # name -> instance
+        self._used = dict((kind, weakref.WeakValueDictionary()) for kind in self.kinds)  # name -> instance
+        self._values = []  # Interned values of rules
+        self._value_ids = {}
+        self._rules = utils.IntTable()  # key -> index of value
+        self._owner = None
+        self.version = 0
+
+    def __deepcopy__(self, memo):
+        """Entities which aren't held are kept by the copy while they are used"""
+        obj = memo[id(self)] = copy.copy(self)
+        for name, value in self.__dict__.items():
+            if name != '_used':
+                setattr(obj, name, copy.deepcopy(value, memo))
+        obj._used = dict((kind, weakref.WeakValueDictionary(copy.deepcopy(dict(self._used[kind]), memo)))
+                         for kind in self.kinds)
+        return obj
+
+    def bind(self, acl):
+        """Called by the ACL which owns the backend, it owns the created entities"""
+        self._owner = acl._ref
+
+    def _intern(self, kind, name):
+        names = self._names[kind]
+        i = names.find(name)
+        if i is None:
+            if len(names) >= 1 << self.id_bits:
+                raise OverflowError('Too many names, increase id_bits')
+            i = names.add(name)
+            self._present[kind].append(0)
+            self._counts[kind].append(0)
+        return i
+
+    def _get_id(self, kind, instance):
+        if getattr(instance, '_backend', None) is self:
+            return instance._id
+        return self._names[kind].find(instance.get_name())
+
+    def _add(self, kind, instance):
+        name = instance.get_name()
+        i = self._intern(kind, name)
+        self._present[kind][i] = 1
+        self._held[kind].pop(name, None)
+        self._used[kind].pop(name, None)
+        if type(instance) is getattr(self, kind + '_class') and getattr(instance, '_backend', None) is None:
+            instance._backend, instance._id = self, i
+        if (getattr(instance, '_backend', None) is self and getattr(instance, '_acl', None) is self._owner and
+                not getattr(instance, '_parents', None) and not getattr(instance, '_children', None)):
+            self._used[kind][name] = instance  # Can be created again
+        else:
+            self._held[kind][name] = instance
+
+    def _hold(self, instance):
+        """Keeps the instance, its links can't be created again"""
+        kind = 'role' if isinstance(instance, Role) else 'resource'
+        name = instance.get_name()
+        if self._used[kind].get(name) is instance:
+            self._held[kind][name] = instance
+            del self._used[kind][name]
+
+    def _get(self, kind, name):
+        instance = self._held[kind].get(name)
+        if instance is None:
+            instance = self._used[kind].get(name)
+            if instance is None:
+                i = self._names[kind].find(name)
+                if i is not None and self._present[kind][i]:
+                    instance = self._create(kind, i, name)
+        return instance
+
+    def _get_instance(self, kind, i):
+        name = self._names[kind].get_name(i)
+        instance = self._held[kind].get(name)
+        if instance is None:
+            instance = self._used[kind].get(name)
+            if instance is None:
+                instance = self._create(kind, i, name)
+        return instance
+
+    def _create(self, kind, i, name):
+        instance = self._used[kind][name] = getattr(self, kind + '_class')(name)
+        instance._backend, instance._id, instance._acl = self, i, self._owner
+        return instance
+
+    def _get_all(self, kind):
+        present = self._present[kind]
+        return [self._get_instance(kind, i) for i in range(len(present)) if present[i]]
+
+    def _remove(self, kind, instance):
+        """The id stays interned, it can be used by rules"""
+        name = instance.get_name()
+        i = self._names[kind].find(name)
+        if i is not None:
+            self._present[kind][i] = 0
+            self._held[kind].pop(name, None)
+            self._used[kind].pop(name, None)
+
+    def remove_role(self, instance):
+        """Removes role, but not its rules"""
+        self._remove('role', instance)
+
+    def remove_privilege(self, instance):
+        """Removes privilege, but not its rules"""
+        self._remove('privilege', instance)
+
+    def remove_resource(self, instance):
+        """Removes resource, but not its rules"""
+        self._remove('resource', instance)
+
+    def add_role(self, instance):
+        """Adds role"""
+        self._add('role', instance)
+
+    def get_role(self, name):
+        """Returns a role instance"""
+        instance = self._get('role', name)
+        if instance is None:
+            raise exceptions.MissingRole('Missing Role "{0}"'.format(name))
+        return instance
+
+    def get_roles(self):
+        """Returns all role instances"""
+        return self._get_all('role')
+
+    def add_privilege(self, instance):
+        """Adds privilege"""
+        self._add('privilege', instance)
+
+    def get_privilege(self, name):
+        """Returns a privilege instance"""
+        instance = self._get('privilege', name)
+        if instance is None:
+            raise exceptions.MissingPrivilege('Missing Privilege "{0}"'.format(name))
+        return instance
+
+    def get_privileges(self):
+        """Returns all privilege instances"""
+        return self._get_all('privilege')
+
+    def add_resource(self, instance):
+        """Adds resource"""
+        self._add('resource', instance)
+
+    def get_resource(self, name):
+        """Returns a resource instance"""
+        instance = self._get('resource', name)
+        if instance is None:
+            raise exceptions.MissingResource('Missing Resource "{0}"'.format(name))
+        return instance
+
+    def get_resources(self):
+        """Returns all resource instances"""
+        return self._get_all('resource')
+
+    def _get_key(self, role, privilege, resource):
+        """Returns the key of the rule, or None if some of the names has no id"""
+        resource_id = self._get_id('resource', resource)
+        role_id = self._get_id('role', role)
+        privilege_id = self._get_id('privilege', privilege)
+        if resource_id is None or role_id is None or privilege_id is None:
+            return None
+        bits = self.id_bits
+        return (((resource_id << bits) | role_id) << bits) | privilege_id
+
+    def _split_key(self, key):
+        mask = (1 << self.id_bits) - 1
+        return key >> (2 * self.id_bits), (key >> self.id_bits) & mask, key & mask
+
+    def add_rule(self, role, privilege, resource, allow=True):
+        """Adds rule to the ACL"""
+        self._intern('role', role.get_name())
+        self._intern('privilege', privilege.get_name())
+        self._intern('resource', resource.get_name())
+        key = self._get_key(role, privilege, resource)
+        current = self._rules.get(key)
+        if current is None:
+            self._count(key, 1)
+        elif self._values[current] == allow:
+            return self
         try:
-            return self._acl[resource][role][privilege]
-        except KeyError:
-            return undef
+            value_id = self._value_ids.setdefault((type(allow), allow), len(self._values))
+        except TypeError:
+            value_id = len(self._values)  # Unhashable value, store as is
+        if value_id == len(self._values):
+            self._values.append(allow)
+        self._rules.set(key, value_id)
+        self.version += 1
+        return self
+
+    def remove_rule(self, role, privilege, resource, allow=True):
+        """Removes rule from ACL"""
+        key = self._get_key(role, privilege, resource)
+        current = None if key is None else self._rules.get(key)
+        if current is not None and self._values[current] == allow:
+            self._rules.pop(key)
+            self._count(key, -1)
+            self.version += 1
+        return self
+
+    def _count(self, key, delta):
+        resource_id, role_id, privilege_id = self._split_key(key)
+        self._counts['role'][role_id] += delta
+        self._counts['resource'][resource_id] += delta
+
+    def has_rules(self, role=None, resource=None):
+        """Returns False if there are no rules for the role, the resource, or both of them.
+
+        Pairs are not indexed to save memory, so the answer for both
+        of them is True if each has some rules.
+        """
+        for kind, instance in (('role', role), ('resource', resource)):
+            if instance is not None:
+                i = self._get_id(kind, instance)
+                if i is None or not self._counts[kind][i]:
+                    return False
+        return True
+
+    def is_allowed(self, role, privilege, resource, undef=None):
+        """Returns True if role is allowed for given arguments"""
+        key = self._get_key(role, privilege, resource)
+        current = None if key is None else self._rules.get(key)
+        return undef if current is None else self._values[current]
+
+    def get_rules(self):
+        """Returns all (role, privilege, resource, allow) of registered entities"""
+        result = []
+        roles, privileges, resources = (self._present[kind] for kind in self.kinds)
+        for key, value_id in self._rules.items():
+            resource_id, role_id, privilege_id = self._split_key(key)
+            if roles[role_id] and privileges[privilege_id] and resources[resource_id]:
+                result.append((self._get_instance('role', role_id), self._get_instance('privilege', privilege_id),
+                               self._get_instance('resource', resource_id), self._values[value_id]))
+        return result
+
+    def _find_ids(self, kind, names):
+        ids = (self._names[kind].find(name) for name in names)
+        return set(i for i in ids if i is not None)
+
+    def get_rule_roles(self, resources, privileges):
+        """Returns the roles which have rules for any of given resources and privileges"""
+        resource_ids = self._find_ids('resource', resources)
+        privilege_ids = self._find_ids('privilege', privileges)
+        role_ids = set()
+        for key, value_id in self._rules.items():
+            resource_id, role_id, privilege_id = self._split_key(key)
+            if resource_id in resource_ids and privilege_id in privilege_ids:
+                role_ids.add(role_id)
+        return [self._get_instance('role', i) for i in role_ids if self._present['role'][i]]
+
+    def get_rule_resources(self, roles, privileges):
+        """Returns the resources which have rules for any of given roles and privileges"""
+        role_ids = self._find_ids('role', (i.get_name() for i in roles))
+        privilege_ids = self._find_ids('privilege', privileges)
+        resource_ids = set()
+        for key, value_id in self._rules.items():
+            resource_id, role_id, privilege_id = self._split_key(key)
+            if role_id in role_ids and privilege_id in privilege_ids:
+                resource_ids.add(resource_id)
+        return set(self._get_instance('resource', i) for i in resource_ids if self._present['resource'][i])
+
+
+class LazyRoleBackend(SimpleBackend):
+    """A storage which keeps per-user roles in a bounded cache.
+
+    Roles for which is_lazy() is true (by default "user_*") are loaded on
+    demand by loader(acl, name), which is expected to add the role with its
+    parents and rules through the ACL. Least recently used ones are evicted
+    beyond max_size, and ones older than ttl seconds are reloaded, with
+    their rules. Other roles are pinned.
+
+    Usage: Acl(backend_factory=partial(LazyRoleBackend, loader=load_user_role))
+    """
+    lazy_entities = True  # Child ACLs don't remember the roles they got from here
+    def __init__(self, loader=None, max_size=10000, ttl=None, prefix='user_', clock=None):
+        """Constructor."""
+        super(LazyRoleBackend, self).__init__()
+        self._loader = loader
+        self._max_size = max_size
+        self._ttl = ttl
+        self._prefix = prefix
+        self._clock = clock or getattr(time, 'monotonic', time.time)
+        self._lazy = OrderedDict()  # name -> time of loading, in order of use
+        self._lazy_rules = {}  # name -> set of (privilege, resource)
+        self._loading = set()
+        self._acl_ref = None
+
+    def bind(self, acl):
+        """Called by the ACL which owns the backend, the ACL is passed to the loader"""
+        self._acl_ref = weakref.ref(acl)
+
+    def is_lazy(self, name):
+        return name.startswith(self._prefix)
+
+    def add_role(self, instance):
+        """Adds role"""
+        name = instance.get_name()
+        super(LazyRoleBackend, self).add_role(instance)
+        if self.is_lazy(name):
+            self._lazy.pop(name, None)
+            self._lazy[name] = self._clock()
+            while len(self._lazy) > self._max_size:
+                self.evict(next(iter(self._lazy)))
+
+    def get_role(self, name):
+        """Returns a role instance, lazy roles are (re)loaded when needed"""
+        loaded = self._lazy.get(name)
+        if loaded is not None:
+            if self._ttl is None or self._clock() - loaded < self._ttl:
+                self._lazy[name] = self._lazy.pop(name)
+                return self._roles[name]
+            self.evict(name)
+        elif name in self._roles or not self.is_lazy(name):
+            return super(LazyRoleBackend, self).get_role(name)
+        acl = self._acl_ref and self._acl_ref()
+        if self._loader is not None and acl is not None and name not in self._loading:
+            self._loading.add(name)
+            try:
+                self._loader(acl, name)
+            finally:
+                self._loading.discard(name)
+        return super(LazyRoleBackend, self).get_role(name)
+
+    def evict(self, name):
+        """Forgets the lazy role and its rules.
+
+        It's not a change of the policy, so the version is kept. Caches
+        check entities by identity, and a reloaded role is a new instance.
+        """
+        if self._lazy.pop(name, None) is None:
+            return
+        role = self._roles.pop(name)
+        version = self.version
+        for privilege, resource in self._lazy_rules.pop(name, ()):
+            allow = super(LazyRoleBackend, self).is_allowed(role, privilege, resource)
+            super(LazyRoleBackend, self).remove_rule(role, privilege, resource, allow)
+        self.version = version
+
+    def add_rule(self, role, privilege, resource, allow=True):
+        """Adds rule to the ACL"""
+        super(LazyRoleBackend, self).add_rule(role, privilege, resource, allow)
+        if role.get_name() in self._lazy:
+            self._lazy_rules.setdefault(role.get_name(), set()).add((privilege, resource))
+        return self
+
+    def remove_rule(self, role, privilege, resource, allow=True):
+        """Removes rule from ACL"""
+        super(LazyRoleBackend, self).remove_rule(role, privilege, resource, allow)
+        rules = self._lazy_rules.get(role.get_name())
+        if rules is not None and super(LazyRoleBackend, self).is_allowed(role, privilege, resource) is None:
+            rules.discard((privilege, resource))
+        return self
 
 
 class Acl(interfaces.IAcl):
     """Access control list."""
-    def __init__(self, backend_factory=SimpleBackend, walker=None):
-        """Constructor."""
-        self.parent = None
+    def __init__(self, backend_factory=SimpleBackend, walker=None, compiled=False, cache_size=None,
+                 default_entities=True):
+        """Constructor.
+
+        With compiled=True the walks are flattened into lookup tables,
+        see simpleacl.walkers.CompiledAclWalker.
+        With cache_size the decisions of is_allowed() are kept in LRU cache,
+        excepting decisions which depend on callable rules.
+        With default_entities=False the "any" privilege and resource aren't
+        added, e.g. for a delta ACL which inherits them from its parent.
+        """
+        self._revision = 0
+        self._parent = None
+        self._decisions = utils.LRUCache(cache_size) if cache_size else None
+        self._decisions_revision = None
+        self._policy = None  # simpleacl.loader.Policy of the last reload()
+        self._policy_version = None
+        self._overlays = weakref.WeakSet()  # ACLs whose parent is this one
+        self._ref = weakref.ref(self)  # Owner of the entities registered here, see Entity._parents_changed()
+        self._inherited = None  # kind -> {name: instance or None} resolved by the parents
         self._backend = backend_factory()
+        if hasattr(self._backend, 'bind'):
+            self._backend.bind(self)
+        self._prefetches = hasattr(self._backend, 'prefetch_rules')
         self._walk = walker or walkers.default_acl_walker
-        self.add_privilege(ANY_PRIVILEGE)
-        self.add_resource(ANY_RESOURCE)
+        if compiled:
+            self._walk = walkers.CompiledAclWalker(self._walk)
+        if default_entities:
+            self.add_privilege(ANY_PRIVILEGE)
+            self.add_resource(ANY_RESOURCE)
+
+    @property
+    def parent(self):
+        return self._parent
+
+    @parent.setter
+    def parent(self, parent):
+        if parent is not self._parent:
+            if self._parent is not None:
+                self._parent._overlays.discard(self)
+            self._parent = parent
+            if parent is not None:
+                parent._overlays.add(self)
+            utils.mro_cache.invalidate(self)
+            self._changed()
 
     def add_role(self, name_or_instance, parents=()):
         """Adds a role to the ACL"""
@@ -216,7 +813,7 @@ class Acl(interfaces.IAcl):
                 instance = self._backend.role_class(name_or_instance)
         else:
             raise Exception('Unknown role type: {0}'.format(type(name_or_instance).__name__))
-        self._backend.add_role(instance)
+        instance = self._register(instance, self.get_role, self._backend.get_role, self._backend.add_role)
 
         # Parents support
         if type(parents) != dict:
@@ -225,12 +822,16 @@ class Acl(interfaces.IAcl):
             for parent in parent_list:
                 resource = self.get_resource(resource)
                 parent = self.add_role(parent)
-                instance.add_parent(parent, resource)
+                if parent not in instance.get_parents_map().get(resource, ()):
+                    instance = self._own(instance)
+                    instance.add_parent(self._own(parent), resource)
 
         # Hierarchical support
         if '.' in instance.get_name():
             parent = instance.get_name().rsplit('.', 1).pop(0)
             parent = self.add_role(parent)  # Recursive
+            if not self._is_inherited('get_role', instance):
+                self._own(parent).add_child(instance)
         return instance
 
     def get_role(self, name_or_instance):
@@ -241,9 +842,9 @@ class Acl(interfaces.IAcl):
             try:
                 instance = self._backend.get_role(name_or_instance)
             except exceptions.MissingRole:
-                if self.parent is None:
+                if self._parent is None:
                     raise
-                return self.parent.get_role(name_or_instance)
+                return self._get_inherited('role', name_or_instance, exceptions.MissingRole)
         return instance
 
     def get_bound_role(self, name_or_instance):
@@ -260,7 +861,7 @@ class Acl(interfaces.IAcl):
                 instance = self._backend.privilege_class(name_or_instance)
         else:
             raise Exception('Unknown privilege type: {0}'.format(type(name_or_instance).__name__))
-        self._backend.add_privilege(instance)
+        instance = self._register(instance, self.get_privilege, self._backend.get_privilege, self._backend.add_privilege)
 
         # Hierarchical support
         if '.' in instance.get_name():
@@ -275,9 +876,9 @@ class Acl(interfaces.IAcl):
         try:
             return self._backend.get_privilege(name_or_instance)
         except exceptions.MissingPrivilege:
-            if self.parent is None:
+            if self._parent is None:
                 raise
-            return self.parent.get_privilege(name_or_instance)
+            return self._get_inherited('privilege', name_or_instance, exceptions.MissingPrivilege)
 
     def add_resource(self, name_or_instance, parents=()):
         """Adds a privilege to the ACL"""
@@ -290,12 +891,14 @@ class Acl(interfaces.IAcl):
                 instance = self._backend.resource_class(name_or_instance)
         else:
             raise Exception('Unknown privilege type: {0}'.format(type(name_or_instance).__name__))
-        self._backend.add_resource(instance)
+        instance = self._register(instance, self.get_resource, self._backend.get_resource, self._backend.add_resource)
 
         # Parents support
         for parent in parents:
             parent = self.add_resource(parent)
-            instance.add_parent(parent)
+            if parent not in instance.get_parents():
+                instance = self._own(instance)
+                instance.add_parent(parent)
 
         # Hierarchical support
         if '.' in instance.get_name():
@@ -310,16 +913,54 @@ class Acl(interfaces.IAcl):
         try:
             return self._backend.get_resource(name_or_instance)
         except exceptions.MissingResource:
-            if self.parent is None:
+            if self._parent is None:
                 raise
-            return self.parent.get_resource(name_or_instance)
+            return self._get_inherited('resource', name_or_instance, exceptions.MissingResource)
+
+    def _get_inherited(self, kind, name, missing):
+        """Returns the entity of the parent ACLs.
+
+        The chain is flattened lazily: the answers of the parents (misses
+        too) are remembered until any ACL of the chain changes, so a lookup
+        costs one exception however long the chain is. Not done when some
+        backend of the chain loads entities on demand.
+        """
+        inherited = self._inherited
+        if inherited is None:
+            if any(getattr(acl._backend, 'lazy_entities', False) for acl in self._parent._get_chain()):
+                inherited = self._inherited = False
+            else:
+                inherited = self._inherited = {'role': {}, 'privilege': {}, 'resource': {}}
+        getter = getattr(self._parent, 'get_{0}'.format(kind))
+        if inherited is False:
+            return getter(name)
+        memo = inherited[kind]
+        try:
+            instance = memo[name]
+        except KeyError:
+            try:
+                instance = getter(name)
+            except missing:
+                instance = None
+            memo[name] = instance
+        if instance is None:
+            raise missing('Missing {0} "{1}"'.format(kind.capitalize(), name))
+        return instance
 
     def add_rule(self, role, privileges=ANY_PRIVILEGE, resource=ANY_RESOURCE, allow=True):
-        """Adds rule to the ACL"""
+        """Adds rule to the ACL.
+
+        allow can be a dotted path of callable(acl, role, privilege, resource),
+        it's resolved here once, see simpleacl.utils.DynamicRuleRegistry.
+        """
         if not utils.is_list(privileges):
             privileges = (privileges, )
+        if utils.is_dynamic_rule(allow):
+            utils.dynamic_rules.register(allow)
         for priv in privileges:
             self._backend.add_rule(self.get_role(role), self.get_privilege(priv), self.get_resource(resource), allow)
+        if getattr(self._backend, 'version', None) is None:
+            self._changed()
         return self
 
     def remove_rule(self, role, privileges=ANY_PRIVILEGE, resource=ANY_RESOURCE, allow=True):
@@ -328,8 +969,77 @@ class Acl(interfaces.IAcl):
             privileges = (privileges, )
         for priv in privileges:
             self._backend.remove_rule(self.get_role(role), self.get_privilege(priv), self.get_resource(resource), allow)
+        if getattr(self._backend, 'version', None) is None:
+            self._changed()
+        return self
+
+    def remove_role(self, name_or_instance):
+        """Removes the role of this ACL, its rules and its links to parents and children"""
+        self._remove_entities(roles=[self._backend.get_role(self._get_name(name_or_instance))])
+        return self
+
+    def remove_privilege(self, name_or_instance):
+        """Removes the privilege of this ACL and its rules"""
+        self._remove_entities(privileges=[self._backend.get_privilege(self._get_name(name_or_instance))])
         return self
 
+    def remove_resource(self, name_or_instance):
+        """Removes the resource of this ACL, its rules and links to it"""
+        self._remove_entities(resources=[self._backend.get_resource(self._get_name(name_or_instance))])
+        return self
+
+    @staticmethod
+    def _get_name(name_or_instance):
+        return name_or_instance if isinstance(name_or_instance, string_types) else name_or_instance.get_name()
+
+    def _is_inherited(self, getter, instance):
+        """Returns True if the instance is shared with the parent ACL"""
+        if self.parent is None:
+            return False
+        try:
+            return getattr(self.parent, getter)(instance.get_name()) is instance
+        except exceptions.AclEcxeption:
+            return False
+
+    def _remove_entities(self, roles=(), privileges=(), resources=()):
+        """Returns the names of the remaining roles and resources which have lost parents"""
+        roles, privileges, resources = set(roles), set(privileges), set(resources)
+        touched = set()
+        for role, privilege, resource, allow in self._backend.get_rules():
+            if role in roles or privilege in privileges or resource in resources:
+                self._backend.remove_rule(role, privilege, resource, allow)
+        for role in roles:
+            if not self._is_inherited('get_role', role):
+                for resource, parents in role.get_parents_map().items():
+                    for parent in parents:
+                        role.remove_parent(parent, resource)
+                for resource, children in role.get_children_map().items():
+                    for child in children:
+                        if resource is not None:
+                            child.remove_parent(role, resource)
+                            touched.add(child.get_name())
+            self._backend.remove_role(role)
+            utils.mro_cache.invalidate(role)
+        if resources:
+            for role in self._backend.get_roles():
+                for resource, parents in role.get_parents_map().items():
+                    if resource in resources:
+                        for parent in parents:
+                            role.remove_parent(parent, resource)
+                        touched.add(role.get_name())
+            for resource in self._backend.get_resources():
+                for parent in resource.get_parents():
+                    if parent in resources:
+                        resource.remove_parent(parent)
+                        touched.add(resource.get_name())
+        for resource in resources:
+            self._backend.remove_resource(resource)
+            utils.mro_cache.invalidate(resource)
+        for privilege in privileges:
+            self._backend.remove_privilege(privilege)
+        self._changed()
+        return touched
+
     def allow(self, role, privileges=ANY_PRIVILEGE, resource=ANY_RESOURCE):
         """Adds an "allow" rule to the ACL"""
         return self.add_rule(role, privileges, resource, True)
@@ -353,20 +1063,463 @@ class Acl(interfaces.IAcl):
         role = self.get_role(role)
         privilege = self.get_privilege(privilege)
         resource = self.get_resource(resource)
-        allow = self._walk(role, privilege, resource, self)
+        allow = self._is_allowed(role, privilege, resource)
         if allow is not None:
             return allow
         return undef
 
+    def get_decision(self, role, privilege, resource=ANY_RESOURCE, undef=False):
+        """Returns (allow, static), static is False if the decision depends on callable rules"""
+        if resource is None:
+            resource = ANY_RESOURCE
+        role = self.get_role(role)
+        privilege = self.get_privilege(privilege)
+        resource = self.get_resource(resource)
+        outer = getattr(_state, 'dynamic', False)
+        _state.dynamic = False
+        try:
+            allow = self._is_allowed(role, privilege, resource)
+            dynamic = _state.dynamic
+        finally:
+            _state.dynamic = outer or _state.dynamic
+        return (undef if allow is None else allow), not dynamic
+
+    def explain(self, role, privilege, resource=ANY_RESOURCE, undef=False):
+        """Returns Explanation of is_allowed() answer.
+
+        The steps are the probes of the walker in the order they are visited,
+        up to the matched one (its index is matched, None if nothing matched).
+        Seconds of a step include walking to the probe. The decision cache
+        is bypassed.
+        """
+        if resource is None:
+            resource = ANY_RESOURCE
+        role = self.get_role(role)
+        privilege = self.get_privilege(privilege)
+        resource = self.get_resource(resource)
+        steps = []
+        start = previous = walkers.timer()
+        for current_role, current_privilege, current_resource, current_acl in self._walk.expand(
+                role, privilege, resource, self):
+            rule = current_acl.get_plain_rule(current_role, current_privilege, current_resource)
+            result = None if rule is None else current_acl.is_plain_allowed(
+                current_role, current_privilege, current_resource
+            )
+            now = walkers.timer()
+            steps.append(ExplainStep(current_acl, current_role.get_name(), current_resource.get_name(),
+                                     current_privilege.get_name(), rule, result, now - previous))
+            previous = now
+            if result is not None:
+                return Explanation(result, len(steps) - 1, steps, now - start)
+        return Explanation(undef, None, steps, walkers.timer() - start)
+
+    def is_allowed_many(self, triples, undef=False):
+        """Returns the list of is_allowed() results for (role, privilege, resource) triples.
+
+        Each entity is resolved once per batch, and repeated triples are
+        walked once. Linearizations which do not depend on the resource
+        (acl chain, dotted roles, privileges) are shared through the MRO cache.
+        """
+        roles, privileges, resources, decisions = {}, {}, {}, {}
+        results = []
+        for role, privilege, resource in triples:
+            if resource is None:
+                resource = ANY_RESOURCE
+            role = self._resolve(roles, self.get_role, role)
+            privilege = self._resolve(privileges, self.get_privilege, privilege)
+            resource = self._resolve(resources, self.get_resource, resource)
+            key = (id(role), id(privilege), id(resource))
+            try:
+                allow = decisions[key]
+            except KeyError:
+                allow = decisions[key] = self._is_allowed(role, privilege, resource)
+            results.append(allow if allow is not None else undef)
+        return results
+
+    def filter_allowed(self, role, privilege, resources):
+        """Returns the resources for which the role is allowed the privilege"""
+        resources = list(resources)
+        allowed = self.is_allowed_many((role, privilege, resource) for resource in resources)
+        return [resource for resource, allow in zip(resources, allowed) if allow]
+
+    def allowed_resources(self, role, privilege, prefix=None):
+        """Returns the names of resources for which the role is allowed the privilege.
+
+        With prefix only the resource named prefix and its dotted
+        descendants are considered. A resource which has neither rules for
+        the reachable roles nor role parents bound to it, nor explicit parents,
+        shares the decision of its dotted parent (or of ANY_RESOURCE) unless
+        the dotted parent has explicit parents, so only the remaining
+        resources are walked.
+        """
+        role = self.get_role(role)
+        privilege = self.get_privilege(privilege)
+        chain = self._get_chain()
+
+        roles = self._get_reachable_roles(role)
+        privileges = self._get_privilege_names(privilege)
+
+        relevant = set()
+        for acl in chain:
+            try:
+                relevant.update(r.get_name() for r in acl._backend.get_rule_resources(roles, privileges))
+            except AttributeError:
+                relevant = None  # The backend has no index, walk everything
+                break
+        if relevant is not None:
+            for current in roles:
+                relevant.update(r.get_name() for r in current.get_parents_map())
+            relevant.discard(ANY_RESOURCE)
+
+        candidates = {}
+        for acl in reversed(chain):
+            for resource in acl._backend.get_resources():
+                name = resource.get_name()
+                if prefix is None or name == prefix or name.startswith(prefix + '.'):
+                    candidates[name] = resource
+
+        decisions = {ANY_RESOURCE: self._is_allowed(role, privilege, self.get_resource(ANY_RESOURCE))}
+        ancestors = {}
+
+        def decide(resource):
+            name = resource.get_name()
+            try:
+                return decisions[name]
+            except KeyError:
+                pass
+            if relevant is None or name in relevant:
+                allow = self._is_allowed(role, privilege, resource)
+            elif resource.get_parents():
+                if self._get_resource_ancestors(resource, ancestors) & relevant:
+                    allow = self._is_allowed(role, privilege, resource)
+                else:
+                    allow = decisions[ANY_RESOURCE]
+            elif '.' in name:
+                try:
+                    parent = self.get_resource(name.rsplit('.', 1).pop(0))
+                except exceptions.MissingResource:
+                    allow = self._is_allowed(role, privilege, resource)
+                else:
+                    if parent.get_parents():  # Its explicit parents aren't inherited by the dotted child
+                        allow = self._is_allowed(role, privilege, resource)
+                    else:
+                        allow = decide(parent)
+            else:
+                allow = decisions[ANY_RESOURCE]
+            decisions[name] = allow
+            return allow
+
+        return set(name for name, resource in candidates.items() if decide(resource))
+
+    def roles_with_access(self, privilege, resource=ANY_RESOURCE):
+        """Returns the names of roles which are allowed the privilege on the resource.
+
+        Only the roles having rules for the resource (or its ancestors) and
+        the privilege, and the roles inheriting from them, are checked.
+        """
+        if resource is None:
+            resource = ANY_RESOURCE
+        privilege = self.get_privilege(privilege)
+        resource = self.get_resource(resource)
+        privileges = self._get_privilege_names(privilege)
+        ancestors = {}
+        resources = (self._get_resource_ancestors(resource, ancestors) |
+                     self._get_resource_ancestors(self.get_resource(ANY_RESOURCE), ancestors))
+
+        chain = self._get_chain()
+        candidates = {}
+        stack = []
+        for acl in chain:
+            try:
+                stack.extend(acl._backend.get_rule_roles(resources, privileges))
+            except AttributeError:
+                stack.extend(acl._backend.get_roles())  # The backend has no index, check everything
+        while stack:
+            current = stack.pop()
+            if id(current) in candidates:
+                continue
+            candidates[id(current)] = current
+            for acl in chain:
+                # Children can be linked to the instance of the same name in another ACL of the chain
+                try:
+                    stack.append(acl._backend.get_role(current.get_name()))
+                except exceptions.MissingRole:
+                    pass
+            for bound_resource, children in current.get_children_map().items():
+                if bound_resource is None or bound_resource.get_name() in resources:
+                    stack.extend(children)
+
+        result = set()
+        for name in set(current.get_name() for current in candidates.values()):
+            try:
+                role = self.get_role(name)
+            except exceptions.MissingRole:
+                continue  # Belongs to another ACL which inherits from this one
+            if self._is_allowed(role, privilege, resource):
+                result.add(name)
+        return result
+
+    def _get_privilege_names(self, privilege):
+        """Returns the names of privileges which are walked for given one"""
+        result = set([ANY_PRIVILEGE])
+        name = privilege.get_name()
+        while True:
+            result.add(name)
+            if '.' not in name:
+                break
+            name = name.rsplit('.', 1).pop(0)
+        return result
+
+    def _get_chain(self):
+        chain = []
+        acl = self
+        while acl is not None:
+            chain.append(acl)
+            acl = acl.parent
+        return chain
+
+    def _get_reachable_roles(self, role):
+        """Returns the role and all roles it can inherit from on any resource"""
+        roles = set()
+        stack = [role]
+        while stack:
+            current = stack.pop()
+            if current in roles:
+                continue
+            roles.add(current)
+            for parents in current.get_parents_map().values():
+                stack.extend(parents)
+            if '.' in current.get_name():
+                stack.append(self.get_role(current.get_name().rsplit('.', 1).pop(0)))
+        return roles
+
+    def _get_resource_ancestors(self, resource, memo):
+        """Returns the names of the resource and of all its ancestors
+
+        Only finished closures are memoized: the resources of a cycle share
+        one set, which is stored once the whole cycle has been walked.
+        """
+        name = resource.get_name()
+        try:
+            return memo[name]
+        except KeyError:
+            pass
+        self._walk_resource_ancestors(resource, memo, {}, [], {})
+        return memo[name]
+
+    def _walk_resource_ancestors(self, resource, memo, index, stack, partial):
+        """Tarjan's walk of the resource parents, returns the lowest index reachable on the stack"""
+        name = resource.get_name()
+        index[name] = low = len(index)
+        stack.append(name)
+        partial[name] = result = set([name])
+        parents = list(resource.get_parents())
+        if '.' in name:
+            parent = name.rsplit('.', 1).pop(0)
+            try:
+                parents.append(self.get_resource(parent))
+            except exceptions.MissingResource:
+                result.add(parent)
+        for parent in parents:
+            parent_name = parent.get_name()
+            if parent_name in memo:
+                result |= memo[parent_name]
+            elif parent_name in index:  # Still on the stack, it's a cycle
+                low = min(low, index[parent_name])
+            else:
+                low = min(low, self._walk_resource_ancestors(parent, memo, index, stack, partial))
+                result |= memo[parent_name] if parent_name in memo else partial[parent_name]
+        if low == index[name]:
+            members = stack[stack.index(name):]
+            del stack[stack.index(name):]
+            for member in members:
+                result |= partial.pop(member)
+            for member in members:
+                memo[member] = result
+        return low
+
+    @staticmethod
+    def _resolve(memo, getter, name_or_instance):
+        key = name_or_instance if isinstance(name_or_instance, string_types) else id(name_or_instance)
+        try:
+            return memo[key][1]
+        except KeyError:
+            instance = getter(name_or_instance)
+            memo[key] = (name_or_instance, instance)  # Keeps the id alive
+            return instance
+
+    def _is_allowed(self, role, privilege, resource):
+        if self._decisions is None:
+            if self._prefetches or self._parent is not None:
+                self._prefetch(role, privilege, resource)
+            return self._walk(role, privilege, resource, self)
+        revision = self.get_revision()
+        if revision != self._decisions_revision:
+            self._decisions.clear()
+            self._decisions_revision = revision
+        key = (role, privilege, resource)
+        entry = self._decisions.get(key)
+        if entry is not None and entry[0] is role and entry[1] is privilege and entry[2] is resource:
+            return entry[3]
+        if self._prefetches or self._parent is not None:
+            self._prefetch(role, privilege, resource)
+        allow, dynamic = self._walk_tracked(role, privilege, resource)
+        if not dynamic and revision == self.get_revision():
+            self._decisions.set(key, (role, privilege, resource, allow))
+        return allow
+
+    def _prefetch(self, role, privilege, resource):
+        """Lets the backends with prefetch_rules() fetch all rules the walk can probe at once"""
+        names = None
+        for acl in self._get_chain():
+            if acl._prefetches:
+                if names is None:
+                    names = (set(i.get_name() for i in self._get_reachable_roles(role)),
+                             self._get_privilege_names(privilege),
+                             self._get_resource_ancestors(resource, {}) | set([ANY_RESOURCE]))
+                acl._backend.prefetch_rules(*names)
+
+    def _walk_tracked(self, role, privilege, resource):
+        """Returns the result of walking, and whether it depends on callable rules"""
+        outer = getattr(_state, 'dynamic', False)
+        _state.dynamic = False
+        try:
+            allow = self._walk(role, privilege, resource, self)
+            dynamic = _state.dynamic
+        finally:
+            _state.dynamic = outer or _state.dynamic
+        return allow, dynamic
+
+    def enable_instrumentation(self, sink, prefix='simpleacl'):
+        """Reports the metrics of decisions to the sink, see simpleacl.walkers.Instrumentation.
+
+        The walker is replaced by its instrumented copy, so the ACL without
+        instrumentation does not pay for it.
+        """
+        self.disable_instrumentation()
+        instrumentation = walkers.Instrumentation(sink, prefix)
+        self._plain_walk = self._walk
+        self._walk = walkers.InstrumentedAclWalker(
+            self._walk.instrumented(instrumentation), instrumentation, 'decision', decision=True
+        )
+        return instrumentation
+
+    def disable_instrumentation(self):
+        plain_walk = self.__dict__.pop('_plain_walk', None)
+        if plain_walk is not None:
+            self._walk = plain_walk
+
+    def get_cache_stats(self):
+        """Returns counters of the decision cache"""
+        if self._decisions is None:
+            return None
+        return {'hits': self._decisions.hits,
+                'misses': self._decisions.misses,
+                'size': len(self._decisions),
+                'max_size': self._decisions.max_size}
+
+    def has_plain_rules(self, role=None, resource=None):
+        """Returns False if the backend has no rules for the role, the resource, or both of them"""
+        has_rules = getattr(self._backend, 'has_rules', None)
+        return has_rules is None or has_rules(role, resource)
+
+    def get_plain_rule(self, role, privilege, resource):
+        """Returns the stored value of the rule, or None"""
+        return self._backend.is_allowed(role, privilege, resource, None)
+
     def is_plain_allowed(self, role, privilege, resource):
-        allow = self._backend.is_allowed(role, privilege, resource, None)
+        allow = self.get_plain_rule(role, privilege, resource)
         if allow is not None:
             if isinstance(allow, string_types) and '.' in allow:
-                allow = utils.resolve(allow)
-                if isinstance(allow, collections.Callable):
+                allow = utils.dynamic_rules.resolve(allow)
+                if callable(allow):
+                    _state.dynamic = True  # Never cache results of callable rules
                     allow = allow(self, role, privilege, resource)
         return allow
 
+    def copy(self):
+        """Returns a deep copy of the ACL.
+
+        The parent ACL, its entities and the walkers are shared with the copy.
+        """
+        memo = {id(self._walk): self._walk}
+        for acl in self._get_chain():
+            for role in acl._backend.get_roles():
+                memo[id(role._walk)] = role._walk
+            if acl is not self:
+                memo[id(acl)] = acl
+                for instance in (acl._backend.get_roles() +
+                                 acl._backend.get_privileges() +
+                                 acl._backend.get_resources()):
+                    memo[id(instance)] = instance
+        obj = copy.copy(self)
+        obj._overlays = weakref.WeakSet()
+        obj._ref = memo[id(self._ref)] = weakref.ref(obj)
+        obj._inherited = None
+        if obj._parent is not None:
+            obj._parent._overlays.add(obj)
+        obj._backend = copy.deepcopy(self._backend, memo)
+        if hasattr(obj._backend, 'bind'):
+            obj._backend.bind(obj)
+        if self._decisions is not None:
+            obj._decisions = utils.LRUCache(self._decisions.max_size)
+            obj._decisions_revision = None
+        return obj
+
+    def get_revision(self):
+        """Returns a token which changes on each change of the ACL or its parents"""
+        revision = ()
+        for acl in self._get_chain():
+            revision += (acl, acl._revision, getattr(acl._backend, 'version', None))
+        return revision
+
+    def _changed(self):
+        self._revision += 1
+        self._drop_inherited()
+
+    def _drop_inherited(self):
+        self._inherited = None
+        for overlay in list(self._overlays):
+            overlay._drop_inherited()
+
+    def _register(self, instance, getter, backend_getter, backend_setter):
+        """Adds instance to the backend unless it's there already, returns the instance"""
+        if getattr(instance, '_acl', None) is None:
+            instance._acl = self._ref
+        try:
+            if backend_getter(instance.get_name()) is instance:
+                return instance
+        except exceptions.AclEcxeption:
+            pass
+        try:
+            replaced = getter(instance.get_name())
+            if replaced is not instance:
+                utils.mro_cache.invalidate(replaced)
+        except exceptions.AclEcxeption:
+            utils.mro_cache.added(instance)  # Can be a skipped dotted ancestor of cached entities
+        backend_setter(instance)
+        self._changed()
+        return instance
+
+    def _own(self, instance):
+        """Returns the role or resource, or its copy if it's shared with the parent ACL.
+
+        Links are changed on the copy, so they don't leak into the parents.
+        """
+        is_role = isinstance(instance, Role)
+        if not self._is_inherited('get_role' if is_role else 'get_resource', instance):
+            return instance
+        obj = copy.copy(instance)
+        obj._acl = self._ref
+        if is_role:
+            obj._parents = dict((resource, list(parents)) for resource, parents in instance.get_parents_map().items())
+            obj._children = None
+        if getattr(obj, '_backend', None) is not None:
+            obj._backend = None  # The backend of the parent loads and saves the original
+        (self._backend.add_role if is_role else self._backend.add_resource)(obj)
+        self._changed()
+        return obj
+
     def bulk_load(self, json_or_dict, resource=ANY_RESOURCE):
         """You can store your roles, privileges and allow list (many to many)
         in a json encoded string and pass it into this method to build
@@ -405,15 +1558,217 @@ class Acl(interfaces.IAcl):
                     self.add_rule(role, privilege, resource, allow)
         return self
 
+    def fast_bulk_load(self, json_or_dict_or_file):
+        """Same as bulk_load(), but validates each entry once and puts rules
+        straight into the backend. File-like objects are parsed incrementally.
+        """
+        from simpleacl import loader
+        return loader.BulkLoader(self).load(json_or_dict_or_file)
+
+    def get_policy_version(self):
+        """Returns the hash of roles, privileges, resources and rules of the ACL and its parents.
+
+        ACLs with the same content have the same version, in any process.
+        It's recomputed on demand after changes.
+        """
+        from simpleacl import loader
+        revision = self.get_revision()
+        if self._policy_version is None or self._policy_version[0] != revision:
+            parent_version = None if self.parent is None else self.parent.get_policy_version()
+            self._policy_version = (revision, loader.hash_policy(self._get_live_policy(), parent_version))
+        return self._policy_version[1]
+
+    def _get_live_policy(self):
+        """Returns simpleacl.loader.Policy of the ACL content"""
+        from simpleacl import loader
+        backend = self._backend
+        return loader.Policy(
+            dict((role.get_name(), dict((resource.get_name(), tuple(i.get_name() for i in parents))
+                                        for resource, parents in role.get_parents_map().items()))
+                 for role in backend.get_roles()),
+            set(i.get_name() for i in backend.get_privileges()),
+            dict((i.get_name(), tuple(j.get_name() for j in i.get_parents())) for i in backend.get_resources()),
+            dict(((role.get_name(), privilege.get_name(), resource.get_name()), allow)
+                 for role, privilege, resource, allow in backend.get_rules()),
+        )
+
+    def reload(self, json_or_dict, previous=None):
+        """Brings the ACL to the given policy, changing only what differs.
+
+        The policy is compared with the previous one: given one (e.g. the
+        policy the ACL was created from), else the one of the last reload(),
+        else the whole content of the ACL (so entities and rules added at
+        runtime are removed). Cached decisions which can't be affected by
+        the changes are kept.
+        """
+        from simpleacl import loader
+        new = loader.normalize_policy(json_or_dict)
+        if previous is not None:
+            old = loader.normalize_policy(previous)
+        elif self._policy is not None:
+            old = self._policy
+        else:
+            old = self._get_live_policy()
+        self._check_policy(new)
+        before = self.get_revision()
+
+        for name in new.resources:
+            if name not in old.resources:
+                self.add_resource(name)
+        for name in new.privileges:
+            if name not in old.privileges:
+                self.add_privilege(name)
+        for name in new.roles:
+            if name not in old.roles:
+                self.add_role(name)
+
+        changed_resources = set()
+        for name, parents in new.resources.items():
+            if old.resources.get(name, ()) != parents:
+                resource = self.get_resource(name)
+                for parent in old.resources.get(name, ()):
+                    resource.remove_parent(parent)
+                for parent in parents:
+                    resource.add_parent(self.get_resource(parent))
+                changed_resources.add(name)
+
+        changed_roles = set()
+        for name, parents in new.roles.items():
+            old_parents = old.roles.get(name, {})
+            if old_parents != parents:
+                role = self.get_role(name)
+                for resource, current in role.get_parents_map().items():
+                    for parent in current:
+                        if parent.get_name() in old_parents.get(resource.get_name(), ()):
+                            role.remove_parent(parent, resource)
+                for resource, role_parents in parents.items():
+                    for parent in role_parents:
+                        role.add_parent(self.get_role(parent), self.get_resource(resource))
+                changed_roles.add(name)
+
+        changed_rules = set()
+        for key, allow in old.rules.items():
+            if key not in new.rules or new.rules[key] != allow:
+                try:
+                    self.remove_rule(key[0], key[1], key[2], allow)
+                except exceptions.AclEcxeption:
+                    pass
+                changed_rules.add(key)
+        for key, allow in new.rules.items():
+            if key not in old.rules or old.rules[key] != allow:
+                self.add_rule(key[0], key[1], key[2], allow)
+                changed_rules.add(key)
+
+        removed = {}
+        for kind, names, getter in (('roles', new.roles, self._backend.get_role),
+                                    ('privileges', new.privileges, self._backend.get_privilege),
+                                    ('resources', new.resources, self._backend.get_resource)):
+            removed[kind] = []
+            for name in getattr(old, kind):
+                if name not in names:
+                    try:
+                        removed[kind].append(getter(name))
+                    except exceptions.AclEcxeption:
+                        pass
+        touched = self._remove_entities(**removed)
+        self._policy = new
+
+        self._retain_decisions(
+            before,
+            changed_roles | touched | set(i.get_name() for i in removed['roles']),
+            set(i.get_name() for i in removed['privileges']),
+            changed_resources | touched | set(i.get_name() for i in removed['resources']),
+            changed_rules,
+        )
+        return self
+
+    def _check_policy(self, policy):
+        """Raises Missing* if the policy refers to unknown entities"""
+        def check(names, name, getter, exception):
+            if name not in names:
+                if self.parent is None:
+                    raise exception('Missing "{0}"'.format(name))
+                getattr(self.parent, getter)(name)
+
+        for role, privilege, resource in policy.rules:
+            check(policy.roles, role, 'get_role', exceptions.MissingRole)
+            check(policy.privileges, privilege, 'get_privilege', exceptions.MissingPrivilege)
+            check(policy.resources, resource, 'get_resource', exceptions.MissingResource)
+        for parents in policy.roles.values():
+            for resource in parents:
+                check(policy.resources, resource, 'get_resource', exceptions.MissingResource)
+
+    def _retain_decisions(self, before, roles, privileges, resources, rules):
+        """Moves the cached decisions which don't depend on the changes to the current revision"""
+        after = self.get_revision()
+        rules_by_role = {}
+        for role, privilege, resource in rules:
+            rules_by_role.setdefault(role, []).append((privilege, resource))
+        reachable_memo, ancestors_memo = {}, {}
+
+        def is_affected(role, privilege, resource):
+            if (role.get_name() in roles or privilege.get_name() in privileges or
+                    resource.get_name() in resources):
+                return True
+            try:
+                reachable = reachable_memo[role.get_name()]
+            except KeyError:
+                try:
+                    reachable = set(i.get_name() for i in self._get_reachable_roles(role))
+                except exceptions.AclEcxeption:
+                    return True
+                reachable_memo[role.get_name()] = reachable
+            if reachable & roles:
+                return True
+            ancestors = self._get_resource_ancestors(resource, ancestors_memo) | set([ANY_RESOURCE])
+            if ancestors & resources:
+                return True
+            names = self._get_privilege_names(privilege)
+            for current in reachable.intersection(rules_by_role):
+                for rule_privilege, rule_resource in rules_by_role[current]:
+                    if rule_privilege in names and rule_resource in ancestors:
+                        return True
+            return False
+
+        if self._decisions is not None and self._decisions_revision == before:
+            self._decisions.discard_if(lambda key, entry: is_affected(entry[0], entry[1], entry[2]))
+            self._decisions_revision = after
+        rebase = getattr(self._walk, 'rebase', None)
+        if rebase is not None:
+            rebase(self, before, after, is_affected)
+
+    def dump_snapshot(self, path):
+        """Writes the roles, privileges, resources and rules of the ACL
+        (but not of its parents) into a binary file, see simpleacl.snapshot
+        """
+        from simpleacl import snapshot
+        snapshot.dump(self._backend, path)
+        return self
+
     @classmethod
-    def create_instance(cls, json_or_dict):
+    def load_snapshot(cls, path, **kwargs):
+        """Returns the ACL reading the file written by dump_snapshot() through mmap.
+
+        Entities are created on first access, and changes of the ACL
+        are kept in memory without touching the file.
+        """
+        from simpleacl import snapshot
+        return cls(backend_factory=partial(snapshot.SnapshotBackend, path), **kwargs)
+
+    @classmethod
+    def create_instance(cls, json_or_dict, fast=False, **kwargs):
         """You can store your roles, privileges and allow list (many to many)
         in a json encoded string and pass it into this method to build
         the object without having to call add_role or add_privilege for each
         one.
+
+        Pass fast=True to load it with fast_bulk_load() instead of bulk_load().
         """
-        obj = cls()
-        obj.bulk_load(json_or_dict)
+        obj = cls(**kwargs)
+        if fast:
+            obj.fast_bulk_load(json_or_dict)
+        else:
+            obj.bulk_load(json_or_dict)
         return obj
 
 
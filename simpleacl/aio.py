@@ -0,0 +1,87 @@
+"""Permission checks for asyncio applications (Python 3.5+).
+
+Callable rules may return awaitables (e.g. be coroutine functions),
+they are awaited by AsyncAcl.is_allowed_async().
+"""
+from __future__ import absolute_import, unicode_literals
+import asyncio
+import inspect
+from simpleacl import utils
+from simpleacl.acl import Acl
+from simpleacl.constants import ANY_RESOURCE
+
+
+class AsyncAcl(Acl):
+    """Access control list with is_allowed_async().
+
+    The walk is the same as of is_allowed(), the probes are taken from
+    the walker's expand(). Concurrent checks of the same (role, privilege,
+    resource) share one in-flight evaluation.
+    """
+    def __init__(self, *args, **kwargs):
+        super(AsyncAcl, self).__init__(*args, **kwargs)
+        self._in_flight = {}
+
+    def copy(self):
+        obj = super(AsyncAcl, self).copy()
+        obj._in_flight = {}
+        return obj
+
+    async def is_allowed_async(self, role, privilege, resource=ANY_RESOURCE, undef=False):
+        """Returns True if role is allowed for given privilege in given given resource"""
+        if resource is None:
+            resource = ANY_RESOURCE
+        role = self.get_role(role)
+        privilege = self.get_privilege(privilege)
+        resource = self.get_resource(resource)
+        allow = await self._is_allowed_async(role, privilege, resource)
+        if allow is not None:
+            return allow
+        return undef
+
+    async def _is_allowed_async(self, role, privilege, resource):
+        revision = self.get_revision()
+        if self._decisions is not None:
+            if revision != self._decisions_revision:
+                self._decisions.clear()
+                self._decisions_revision = revision
+            entry = self._decisions.get((role, privilege, resource))
+            if entry is not None and entry[0] is role and entry[1] is privilege and entry[2] is resource:
+                return entry[3]
+        key = (role, privilege, resource, revision)
+        task = self._in_flight.get(key)
+        if task is None:
+            task = self._in_flight[key] = asyncio.ensure_future(self._evaluate(role, privilege, resource, revision))
+            task.add_done_callback(lambda t: self._in_flight.pop(key, None))
+        # A cancelled caller must not cancel the evaluation for others
+        return await asyncio.shield(task)
+
+    async def _evaluate(self, role, privilege, resource, revision):
+        allow, dynamic = None, False
+        for current_role, current_privilege, current_resource, current_acl in self._walk.expand(
+                role, privilege, resource, self):
+            allow = current_acl.get_plain_rule(current_role, current_privilege, current_resource)
+            if allow is None:
+                continue
+            if utils.is_dynamic_rule(allow):
+                allow = utils.dynamic_rules.resolve(allow)
+                if callable(allow):
+                    dynamic = True
+                    allow = allow(current_acl, current_role, current_privilege, current_resource)
+                    if inspect.isawaitable(allow):
+                        allow = await allow
+            if allow is not None:
+                break
+        if self._decisions is not None and not dynamic and revision == self.get_revision():
+            self._decisions.set((role, privilege, resource), (role, privilege, resource, allow))
+        return allow
+
+    def is_plain_allowed(self, role, privilege, resource):
+        allow = super(AsyncAcl, self).is_plain_allowed(role, privilege, resource)
+        if inspect.isawaitable(allow):
+            if inspect.iscoroutine(allow):
+                allow.close()
+            raise TypeError('Rule of {0} on {1} returns an awaitable, use is_allowed_async()'.format(
+                privilege.get_name(), resource.get_name()
+            ))
+        return allow
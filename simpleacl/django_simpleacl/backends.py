@@ -1,7 +1,8 @@
 # -*- mode: python; coding: utf-8; -*-
 from __future__ import absolute_import, unicode_literals
+from django.core.signals import request_finished, request_started
 from ..exceptions import MissingRole, MissingPrivilege, MissingResource
-from ..paste import get_acl
+from ..paste import end_request, get_decision_key, get_decision_store, get_policy_version, get_request_acl
 from .utils import get_role_name, get_privilege_name, get_resource_name
 
 try:
@@ -11,6 +12,99 @@ except ImportError:
     from django.contrib.auth.models import User
 
 
+def drop_request_acl(**kwargs):
+    """Roles of users and resources of objects live in the ACL of one request"""
+    end_request()
+
+request_started.connect(drop_request_acl, dispatch_uid='simpleacl_request_started')
+request_finished.connect(drop_request_acl, dispatch_uid='simpleacl_request_finished')
+
+
+def add_user_role(acl, user):
+    """Adds the role of the user, with its groups as parents"""
+    role = acl.add_role(get_role_name(user), user.groups.all().values_list('name', flat=True))
+    if hasattr(user, 'simpleacl'):
+        user.simpleacl(acl)
+    return role
+
+
+def load_user_role(acl, name):
+    """Loader of "user_{pk}" roles for simpleacl.LazyRoleBackend"""
+    try:
+        user = User.objects.get(pk=name.split('_', 1)[1])
+    except (User.DoesNotExist, ValueError, IndexError):
+        return
+    add_user_role(acl, user)
+
+
+def get_user_role(acl, user):
+    try:
+        return acl.get_role(get_role_name(user))
+    except MissingRole:
+        return add_user_role(acl, user)
+
+
+def prefetch_perms(user, perms, objs):
+    """Computes has_perm() of the user for every perm and object at once.
+
+    The hook of the model simpleacl_many(acl, user, perm, objs) is called
+    once per model and perm, obj.simpleacl(acl, user, perm) is called
+    for the models without it. The decisions are kept for has_perm() while
+    the ACL is unchanged, and every object gets simpleacl_perms dict keyed
+    by perm and by codename, e.g. {{ post.simpleacl_perms.change_post }}.
+    Returns {(perm, resource_name): allow}.
+    """
+    acl = get_request_acl()
+    role = get_user_role(acl, user)
+    objs = list(objs)
+    resources = [acl.add_resource(get_resource_name(obj)) for obj in objs]
+    models = {}
+    for obj in objs:
+        models.setdefault(type(obj), []).append(obj)
+
+    triples = []
+    for perm in perms:
+        privilege = acl.add_privilege(get_privilege_name(perm))
+        for model, model_objs in models.items():
+            if hasattr(model, 'simpleacl_many'):
+                model.simpleacl_many(acl, user, perm, model_objs)
+            elif hasattr(model, 'simpleacl'):
+                for obj in model_objs:
+                    obj.simpleacl(acl, user, perm)
+        triples.extend((role, privilege, resource) for resource in resources)
+
+    decisions = {}
+    for (role, privilege, resource), allow in zip(triples, acl.is_allowed_many(triples)):
+        decisions[(privilege.get_name(), resource.get_name())] = allow
+    result = {}
+    for perm in perms:
+        privilege_name = get_privilege_name(perm)
+        codename = perm.rsplit('.', 1).pop()
+        for obj, resource in zip(objs, resources):
+            allow = result[(perm, resource.get_name())] = decisions[(privilege_name, resource.get_name())]
+            obj_perms = getattr(obj, 'simpleacl_perms', None)
+            if obj_perms is None:
+                obj_perms = obj.simpleacl_perms = {}
+            obj_perms[perm] = obj_perms[codename] = allow
+
+    cache = getattr(user, '_simpleacl_perms', None)
+    revision = acl.get_revision()
+    if cache is None or cache[0] is not acl or cache[1] != revision:
+        cache = user._simpleacl_perms = (acl, revision, {})
+    cache[2].update(result)
+    return result
+
+
+def get_prefetched_perm(acl, user, perm, obj):
+    """Returns the decision of prefetch_perms(), or None"""
+    cache = getattr(user, '_simpleacl_perms', None)
+    if cache is None or obj is None:
+        return None
+    if cache[0] is not acl or cache[1] != acl.get_revision():
+        return None
+    return cache[2].get((perm, get_resource_name(obj)))
+
+
 class PermissionBackend(object):
     """Per object level permission backend."""
     supports_object_permissions = True
@@ -22,14 +116,12 @@ class PermissionBackend(object):
 
     def has_perm(self, user, perm, obj=None):
         """This method checks if the user_obj has perm on obj. Returns True or False"""
-        acl = get_acl()
+        acl = get_request_acl()
+        allow = get_prefetched_perm(acl, user, perm, obj)
+        if allow is not None:
+            return allow
 
-        try:
-            role = acl.get_role(get_role_name(user))
-        except MissingRole:
-            role = acl.add_role(get_role_name(user), user.groups.all().values_list('name', flat=True))
-            if hasattr(user, 'simpleacl'):
-                user.simpleacl(acl)
+        role = get_user_role(acl, user)
 
         privilege = acl.add_privilege(get_privilege_name(perm))
 
@@ -37,8 +129,22 @@ class PermissionBackend(object):
         if obj is not None and hasattr(obj, 'simpleacl'):
             obj.simpleacl(acl, user, perm)
 
+        # Rules added by the hooks aren't a part of the policy version
+        store = None
+        if not hasattr(user, 'simpleacl') and not hasattr(obj, 'simpleacl'):
+            store = get_decision_store()
+        if store is not None:
+            version = get_policy_version()
+            key = get_decision_key(role, privilege, resource)
+            allow = store.get(version, key)
+            if allow is not None:
+                return allow
+
         try:
-            return acl.is_allowed(role, privilege, resource)
+            allow, static = acl.get_decision(role, privilege, resource)
         except (MissingRole, MissingPrivilege, MissingResource):
             raise
             return False
+        if store is not None and static:
+            store.set(version, key, allow)
+        return allow
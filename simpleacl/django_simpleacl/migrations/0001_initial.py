@@ -0,0 +1,69 @@
+from __future__ import absolute_import, unicode_literals
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def entity(name):
+    return migrations.CreateModel(
+        name=name,
+        fields=[
+            ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ('name', models.CharField(max_length=255, unique=True)),
+        ],
+    )
+
+
+def foreign_key(to, related_name):
+    return models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name=related_name,
+                             to='django_simpleacl.{0}'.format(to))
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        entity('Role'),
+        entity('Privilege'),
+        entity('Resource'),
+        migrations.CreateModel(
+            name='RoleParent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(default=0)),
+                ('role', foreign_key('Role', 'parent_links')),
+                ('resource', foreign_key('Resource', '+')),
+                ('parent', foreign_key('Role', 'child_links')),
+            ],
+            options={'ordering': ('position',)},
+        ),
+        migrations.CreateModel(
+            name='ResourceParent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(default=0)),
+                ('resource', foreign_key('Resource', 'parent_links')),
+                ('parent', foreign_key('Resource', 'child_links')),
+            ],
+            options={'ordering': ('position',)},
+        ),
+        migrations.CreateModel(
+            name='Rule',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('allow', models.TextField()),
+                ('role', foreign_key('Role', 'rules')),
+                ('privilege', foreign_key('Privilege', 'rules')),
+                ('resource', foreign_key('Resource', 'rules')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(name='roleparent', unique_together=set([('role', 'resource', 'parent')])),
+        migrations.AlterUniqueTogether(name='resourceparent', unique_together=set([('resource', 'parent')])),
+        migrations.AlterUniqueTogether(name='rule', unique_together=set([('role', 'privilege', 'resource')])),
+        migrations.AddIndex(
+            model_name='rule',
+            index=models.Index(fields=['role', 'privilege'], name='simpleacl_rule_role_priv_idx'),
+        ),
+    ]
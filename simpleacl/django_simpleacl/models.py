@@ -0,0 +1,57 @@
+from __future__ import absolute_import, unicode_literals
+from django.db import models
+
+
+class Role(models.Model):
+    name = models.CharField(max_length=255, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
+class Privilege(models.Model):
+    name = models.CharField(max_length=255, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
+class Resource(models.Model):
+    name = models.CharField(max_length=255, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
+class RoleParent(models.Model):
+    """The role inherits rules of the parent on the resource"""
+    role = models.ForeignKey(Role, related_name='parent_links', on_delete=models.CASCADE)
+    resource = models.ForeignKey(Resource, related_name='+', on_delete=models.CASCADE)
+    parent = models.ForeignKey(Role, related_name='child_links', on_delete=models.CASCADE)
+    position = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = (('role', 'resource', 'parent'), )
+        ordering = ('position', )
+
+
+class ResourceParent(models.Model):
+    resource = models.ForeignKey(Resource, related_name='parent_links', on_delete=models.CASCADE)
+    parent = models.ForeignKey(Resource, related_name='child_links', on_delete=models.CASCADE)
+    position = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = (('resource', 'parent'), )
+        ordering = ('position', )
+
+
+class Rule(models.Model):
+    """allow is JSON: true, false, or a dotted path of callable rule"""
+    role = models.ForeignKey(Role, related_name='rules', on_delete=models.CASCADE)
+    privilege = models.ForeignKey(Privilege, related_name='rules', on_delete=models.CASCADE)
+    resource = models.ForeignKey(Resource, related_name='rules', on_delete=models.CASCADE)
+    allow = models.TextField()
+
+    class Meta:
+        unique_together = (('role', 'privilege', 'resource'), )
+        indexes = [models.Index(fields=['role', 'privilege'], name='simpleacl_rule_role_priv_idx')]
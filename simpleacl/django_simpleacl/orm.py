@@ -0,0 +1,407 @@
+"""IBackend on the models of simpleacl.django_simpleacl.
+
+Entities and rules are cached per thread until the next request starts.
+A role is fetched with the groups graph and the rules of every role
+it can inherit from, in three queries however deep the graph is.
+Resources are fetched in batches with their dotted ancestors and parents.
+"""
+from __future__ import absolute_import, unicode_literals
+import copy
+import weakref
+from threading import local
+from django.core.signals import request_started
+from django.db.models import Q
+from .. import exceptions, interfaces
+from ..acl import Privilege, Role, Resource
+from ..sql import SqlResource, SqlRole
+from . import models
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+MODELS = {
+    'role': models.Role,
+    'privilege': models.Privilege,
+    'resource': models.Resource,
+}
+
+_backends = weakref.WeakSet()
+
+
+def reset_request_caches(**kwargs):
+    """Drops the caches of all OrmBackend instances in the current thread"""
+    for backend in list(_backends):
+        backend.reset()
+
+request_started.connect(reset_request_caches, dispatch_uid='simpleacl_orm_reset')
+
+
+class RequestCache(object):
+    """Entities and rules of OrmBackend loaded in the current request"""
+
+    def __init__(self):
+        self.entities = dict((kind, {}) for kind in MODELS)  # name -> instance
+        self.ids = dict((kind, {}) for kind in MODELS)  # name -> pk
+        self.rules = {}  # (role, privilege, resource) names -> allow
+        self.missing = dict((kind, set()) for kind in MODELS)  # names which aren't in the database
+        self.complete = set()  # names of roles whose rules are all in self.rules
+        self.groups_loaded = False
+        self.privileges_loaded = False
+
+
+class OrmBackend(interfaces.IBackend):
+    """A storage in Django models.
+
+    Roles with prefix (the per-user roles) are loaded one by one, the other
+    roles (groups) are loaded all at once, with the first role of the request.
+
+    Usage: ACL_OPTIONS = {'backend_factory': OrmBackend}
+    """
+    role_class = SqlRole
+    privilege_class = Privilege
+    resource_class = SqlResource
+    lazy_entities = True
+
+    def __init__(self, prefix='user_'):
+        self._prefix = prefix
+        self._local = local()
+        self.version = 0
+        _backends.add(self)
+
+    def __deepcopy__(self, memo):
+        """The copy shares the database, entities are loaded again"""
+        obj = memo[id(self)] = copy.copy(self)
+        obj._local = local()
+        _backends.add(obj)
+        return obj
+
+    def reset(self):
+        """Drops the entities and rules cached in the current thread"""
+        if getattr(self._local, 'cache', None) is not None:
+            self._local.cache = None
+            self.version += 1
+
+    def _get_cache(self):
+        cache = getattr(self._local, 'cache', None)
+        if cache is None:
+            cache = self._local.cache = RequestCache()
+        return cache
+
+    def _get_id(self, kind, name, create=False):
+        ids = self._get_cache().ids[kind]
+        try:
+            return ids[name]
+        except KeyError:
+            pass
+        if create:
+            pk = MODELS[kind].objects.get_or_create(name=name)[0].pk
+        else:
+            pks = list(MODELS[kind].objects.filter(name=name).values_list('pk', flat=True)[:1])
+            if not pks:
+                return None
+            pk = pks[0]
+        ids[name] = pk
+        return pk
+
+    def _add(self, kind, instance):
+        cache = self._get_cache()
+        name = instance.get_name()
+        if name not in cache.ids[kind]:
+            obj, created = MODELS[kind].objects.get_or_create(name=name)
+            cache.ids[kind][name] = obj.pk
+            if created and kind == 'role':
+                cache.complete.add(name)
+        cache.entities[kind][name] = instance
+        cache.missing[kind].discard(name)
+        if kind == 'role' and isinstance(instance, SqlRole):
+            for resource, parents in instance.get_parents_map().items():
+                for parent in parents:
+                    self._add_parent('role', instance, parent, resource)
+            instance._backend = self
+        elif kind == 'resource' and isinstance(instance, SqlResource):
+            for parent in instance.get_parents():
+                self._add_parent('resource', instance, parent)
+            instance._backend = self
+        self.version += 1
+
+    def _add_parent(self, kind, instance, parent, resource=None):
+        pk = self._get_id(kind, instance.get_name(), create=True)
+        parent_pk = self._get_id(kind, parent.get_name(), create=True)
+        if kind == 'role':
+            resource_pk = self._get_id('resource', resource.get_name(), create=True)
+            links = models.RoleParent.objects.filter(role_id=pk, resource_id=resource_pk)
+            links.model.objects.get_or_create(role_id=pk, resource_id=resource_pk, parent_id=parent_pk,
+                                              defaults={'position': links.count()})
+        else:
+            links = models.ResourceParent.objects.filter(resource_id=pk)
+            links.model.objects.get_or_create(resource_id=pk, parent_id=parent_pk,
+                                              defaults={'position': links.count()})
+        self.version += 1
+
+    def _remove_parent(self, kind, instance, parent, resource=None):
+        if kind == 'role':
+            models.RoleParent.objects.filter(role__name=instance.get_name(), resource__name=resource.get_name(),
+                                             parent__name=parent.get_name()).delete()
+        else:
+            models.ResourceParent.objects.filter(resource__name=instance.get_name(),
+                                                 parent__name=parent.get_name()).delete()
+        self.version += 1
+
+    def _load_roles(self, name=None):
+        """Loads the role (all roles if name is None) with the groups and the rules they can inherit"""
+        cache = self._get_cache()
+        query = models.Role.objects.all()
+        if name is not None:
+            query = query.filter(Q(name=name) if cache.groups_loaded else
+                                 Q(name=name) | ~Q(name__startswith=self._prefix))
+        rows = list(query.order_by('pk').values_list('pk', 'name'))
+        if name is not None and name not in set(i[1] for i in rows):
+            raise exceptions.MissingRole('Missing Role "{0}"'.format(name))
+        cache.groups_loaded = True
+        new = dict((pk, role_name) for pk, role_name in rows if role_name not in cache.entities['role'])
+        for pk, role_name in new.items():
+            cache.ids['role'][role_name] = pk
+            cache.entities['role'][role_name] = self.role_class(role_name)
+        links = models.RoleParent.objects.filter(role_id__in=list(new)).order_by('role', 'position')
+        links = list(links.values_list('role_id', 'parent__name', 'resource__name'))
+        self._load_resources(set(resource_name for role_pk, parent_name, resource_name in links))
+        for role_pk, parent_name, resource_name in links:
+            Role.add_parent(cache.entities['role'][new[role_pk]], self.get_role(parent_name),
+                            self.get_resource(resource_name))
+        for role_name in new.values():
+            instance = cache.entities['role'][role_name]
+            if '.' in role_name:
+                parent = cache.entities['role'].get(role_name.rsplit('.', 1).pop(0))
+                if parent is not None:
+                    parent.add_child(instance)
+            instance._backend = self
+        self._load_rules(self._get_reachable(cache.entities['role'][name]) if name is not None else new.values())
+        return [cache.entities['role'][role_name] for pk, role_name in rows]
+
+    def _get_reachable(self, role):
+        names = set()
+        stack = [role]
+        while stack:
+            current = stack.pop()
+            if current.get_name() in names:
+                continue
+            names.add(current.get_name())
+            for parents in current.get_parents_map().values():
+                stack.extend(parents)
+            if '.' in current.get_name():
+                stack.append(self.get_role(current.get_name().rsplit('.', 1).pop(0)))
+        return names
+
+    def _load_rules(self, role_names):
+        cache = self._get_cache()
+        ids = [cache.ids['role'][i] for i in role_names if i not in cache.complete and i in cache.ids['role']]
+        if not ids:
+            return
+        rows = models.Rule.objects.filter(role_id__in=ids).values_list(
+            'role__name', 'privilege__name', 'resource__name', 'allow')
+        for role_name, privilege_name, resource_name, allow in rows:
+            cache.rules[(role_name, privilege_name, resource_name)] = json.loads(allow)
+        cache.complete.update(i for i in role_names if i in cache.ids['role'])
+
+    def _load_privileges(self):
+        cache = self._get_cache()
+        if not cache.privileges_loaded:
+            cache.privileges_loaded = True
+            for pk, name in models.Privilege.objects.values_list('pk', 'name'):
+                cache.ids['privilege'].setdefault(name, pk)
+                cache.entities['privilege'].setdefault(name, self.privilege_class(name))
+
+    def _load_resources(self, names=None):
+        """Loads the resources (all resources if names is None) with their dotted ancestors and parents.
+
+        Each level of parents costs two queries, however many resources are loaded.
+        Returns the resources of the first query.
+        """
+        cache = self._get_cache()
+        entities = cache.entities['resource']
+        pending = None if names is None else self._get_unknown_resources(names)
+        result = None
+        new = []
+        links = []
+        while pending is None or pending:
+            query = models.Resource.objects.all()
+            if pending is not None:
+                query = query.filter(name__in=list(pending))
+            rows = list(query.order_by('pk').values_list('pk', 'name'))
+            if pending is not None:
+                cache.missing['resource'].update(pending.difference(name for pk, name in rows))
+            if result is None:
+                result = [name for pk, name in rows]
+            loaded = dict((pk, name) for pk, name in rows if name not in entities)
+            for pk, name in loaded.items():
+                cache.ids['resource'][name] = pk
+                entities[name] = self.resource_class(name)
+                new.append(name)
+            query = models.ResourceParent.objects.filter(resource_id__in=list(loaded)).order_by('resource', 'position')
+            rows = [(loaded[pk], parent_name) for pk, parent_name in query.values_list('resource_id', 'parent__name')]
+            links.extend(rows)
+            pending = self._get_unknown_resources(parent_name for name, parent_name in rows)
+        for name, parent_name in links:
+            Resource.add_parent(entities[name], entities[parent_name])
+        for name in new:
+            entities[name]._backend = self
+        return [entities[name] for name in result or ()]
+
+    def _get_unknown_resources(self, names):
+        """Returns the names and their dotted ancestors which haven't been looked up yet"""
+        cache = self._get_cache()
+        result = set()
+        for name in names:
+            result.add(name)
+            while '.' in name:
+                name = name.rsplit('.', 1).pop(0)
+                result.add(name)
+        result.difference_update(cache.entities['resource'], cache.missing['resource'])
+        return result
+
+    def _load_children(self, role):
+        name = role.get_name()
+        names = set(models.RoleParent.objects.filter(parent__name=name).values_list('role__name', flat=True))
+        names.update(models.Role.objects.filter(name__startswith=name + '.').values_list('name', flat=True))
+        for child_name in names:
+            child = self.get_role(child_name)
+            if child_name.rsplit('.', 1).pop(0) == name:
+                role.add_child(child)
+
+    def _remove(self, kind, instance):
+        cache = self._get_cache()
+        name = instance.get_name()
+        MODELS[kind].objects.filter(name=name).delete()
+        cache.entities[kind].pop(name, None)
+        cache.ids[kind].pop(name, None)
+        self.version += 1
+
+    def add_role(self, instance):
+        """Adds role"""
+        self._add('role', instance)
+
+    def get_role(self, name):
+        """Returns a role instance"""
+        try:
+            return self._get_cache().entities['role'][name]
+        except KeyError:
+            self._load_roles(name)
+            return self._get_cache().entities['role'][name]
+
+    def get_roles(self):
+        """Returns all role instances"""
+        return self._load_roles()
+
+    def remove_role(self, instance):
+        """Removes role"""
+        self._remove('role', instance)
+
+    def add_privilege(self, instance):
+        """Adds privilege"""
+        self._add('privilege', instance)
+
+    def get_privilege(self, name):
+        """Returns a privilege instance"""
+        self._load_privileges()
+        try:
+            return self._get_cache().entities['privilege'][name]
+        except KeyError:
+            raise exceptions.MissingPrivilege('Missing Privilege "{0}"'.format(name))
+
+    def get_privileges(self):
+        """Returns all privilege instances"""
+        self._load_privileges()
+        return list(self._get_cache().entities['privilege'].values())
+
+    def remove_privilege(self, instance):
+        """Removes privilege"""
+        self._remove('privilege', instance)
+
+    def add_resource(self, instance):
+        """Adds resource"""
+        self._add('resource', instance)
+
+    def get_resource(self, name):
+        """Returns a resource instance"""
+        try:
+            return self._get_cache().entities['resource'][name]
+        except KeyError:
+            self._load_resources([name])
+        try:
+            return self._get_cache().entities['resource'][name]
+        except KeyError:
+            raise exceptions.MissingResource('Missing Resource "{0}"'.format(name))
+
+    def get_resources(self):
+        """Returns all resource instances"""
+        return self._load_resources()
+
+    def remove_resource(self, instance):
+        """Removes resource"""
+        self._remove('resource', instance)
+
+    def add_rule(self, role, privilege, resource, allow=True):
+        """Adds rule to the ACL"""
+        models.Rule.objects.update_or_create(
+            role_id=self._get_id('role', role.get_name(), create=True),
+            privilege_id=self._get_id('privilege', privilege.get_name(), create=True),
+            resource_id=self._get_id('resource', resource.get_name(), create=True),
+            defaults={'allow': json.dumps(allow)}
+        )
+        cache = self._get_cache()
+        if role.get_name() in cache.complete:
+            cache.rules[(role.get_name(), privilege.get_name(), resource.get_name())] = allow
+        self.version += 1
+        return self
+
+    def remove_rule(self, role, privilege, resource, allow=True):
+        """Removes rule from ACL"""
+        models.Rule.objects.filter(role__name=role.get_name(), privilege__name=privilege.get_name(),
+                                   resource__name=resource.get_name(), allow=json.dumps(allow)).delete()
+        key = (role.get_name(), privilege.get_name(), resource.get_name())
+        rules = self._get_cache().rules
+        if key in rules and rules[key] == allow:
+            del rules[key]
+        self.version += 1
+        return self
+
+    def is_allowed(self, role, privilege, resource, undef=None):
+        """Returns True if role is allowed for given arguments"""
+        cache = self._get_cache()
+        key = (role.get_name(), privilege.get_name(), resource.get_name())
+        try:
+            return cache.rules[key]
+        except KeyError:
+            pass
+        if key[0] not in cache.complete:
+            self._load_rules([key[0]])
+            if key[0] not in cache.complete:  # Not in the database
+                return undef
+        return cache.rules.get(key, undef)
+
+    def get_rules(self):
+        """Returns all (role, privilege, resource, allow)"""
+        rows = list(models.Rule.objects.values_list('role__name', 'privilege__name', 'resource__name', 'allow'))
+        self._load_resources(set(row[2] for row in rows))
+        return [(self.get_role(role), self.get_privilege(privilege), self.get_resource(resource), json.loads(allow))
+                for role, privilege, resource, allow in rows]
+
+    def get_rule_roles(self, resources, privileges):
+        """Returns the roles which have rules for any of given resources and privileges"""
+        names = models.Rule.objects.filter(
+            resource__name__in=[getattr(i, 'name', i) for i in resources],
+            privilege__name__in=[getattr(i, 'name', i) for i in privileges],
+        ).values_list('role__name', flat=True).distinct()
+        return [self.get_role(name) for name in names]
+
+    def get_rule_resources(self, roles, privileges):
+        """Returns the resources which have rules for any of given roles and privileges"""
+        names = models.Rule.objects.filter(
+            role__name__in=[getattr(i, 'name', i) for i in roles],
+            privilege__name__in=[getattr(i, 'name', i) for i in privileges],
+        ).values_list('resource__name', flat=True).distinct()
+        names = list(names)
+        self._load_resources(names)
+        return set(self.get_resource(name) for name in names)
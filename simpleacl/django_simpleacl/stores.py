@@ -0,0 +1,22 @@
+from __future__ import absolute_import, unicode_literals
+import hashlib
+from django.core.cache import caches
+from .. import interfaces
+
+
+class CacheDecisionStore(interfaces.IDecisionStore):
+    """Decisions in a Django cache (e.g. memcached or redis), shared by all hosts."""
+
+    def __init__(self, alias='default', timeout=None, prefix='simpleacl'):
+        self._alias = alias
+        self._timeout = timeout
+        self._prefix = prefix
+
+    def _key(self, version, key):
+        return '{0}:{1}'.format(self._prefix, hashlib.sha1('{0}\0{1}'.format(version, key).encode('utf-8')).hexdigest())
+
+    def get(self, version, key):
+        return caches[self._alias].get(self._key(version, key))
+
+    def set(self, version, key, allow):
+        caches[self._alias].set(self._key(version, key), bool(allow), self._timeout)
@@ -0,0 +1,108 @@
+from __future__ import absolute_import, unicode_literals
+from django.contrib.auth.models import Group, User
+from django.test import TestCase
+from .. import paste, settings
+from ..acl import Acl
+from .backends import PermissionBackend, prefetch_perms
+from .orm import OrmBackend
+
+POLICY = {
+    'roles': [
+        'authenticated',
+        'author',
+        ['user_900', {'any': ['authenticated'], 'blog.post.2': ['author']}],
+    ],
+    'privileges': ['view.blog.post', 'change.blog.post', 'delete.blog.post'],
+    'resources': ['blog.post.1', 'blog.post.2', 'blog.post.3', ['blog.draft.4', ['blog.post.2']]],
+    'acl': {
+        'any': {'authenticated': {'view': True}},
+        'blog.post': {'author': {'change': True}},
+        'blog.post.2': {'author': {'delete': True}},
+    },
+}
+
+
+class Post(object):
+    """Stands for an instance of blog.Post"""
+    class _meta:
+        app_label = 'blog'
+        module_name = 'post'
+
+    def __init__(self, pk):
+        self.pk = pk
+
+
+class TestPrefetchPerms(TestCase):
+
+    def setUp(self):
+        self.old_settings = settings.INITIAL_DATA, settings.SHARED_ACL
+        settings.INITIAL_DATA, settings.SHARED_ACL = POLICY, False
+        paste._ctx.__dict__.clear()
+        self.user = User.objects.create(username='writer')
+        self.user.groups.add(Group.objects.create(name='author'))
+        self.expected = Acl.create_instance(POLICY)
+        self.expected.add_role('user_{0}'.format(self.user.pk), ['author'])
+
+    def tearDown(self):
+        settings.INITIAL_DATA, settings.SHARED_ACL = self.old_settings
+        paste._ctx.__dict__.clear()
+
+    def test_prefetch_perms(self):
+        posts = [Post(i) for i in range(1, 4)]
+        perms = ['blog.change_post', 'blog.delete_post']
+        result = prefetch_perms(self.user, perms, posts)
+        role = 'user_{0}'.format(self.user.pk)
+        backend = PermissionBackend()
+        for perm, privilege in zip(perms, ('change.blog.post', 'delete.blog.post')):
+            for post in posts:
+                allow = self.expected.is_allowed(role, privilege, 'blog.post.{0}'.format(post.pk))
+                self.assertEqual(result[(perm, 'blog.post.{0}'.format(post.pk))], allow)
+                self.assertEqual(post.simpleacl_perms[perm], allow)
+                self.assertEqual(post.simpleacl_perms[perm.rsplit('.', 1).pop()], allow)
+                with self.assertNumQueries(0):
+                    self.assertEqual(backend.has_perm(self.user, perm, post), allow)
+
+    def test_acl_change(self):
+        post = Post(1)
+        prefetch_perms(self.user, ['blog.delete_post'], [post])
+        self.assertFalse(PermissionBackend().has_perm(self.user, 'blog.delete_post', post))
+        paste.update_acl(lambda acl: acl.allow('author', 'delete', 'blog.post.1'))
+        self.assertTrue(PermissionBackend().has_perm(self.user, 'blog.delete_post', post))
+        paste._policy['updated'] = False
+
+
+class TestOrmBackend(TestCase):
+
+    def setUp(self):
+        Acl.create_instance(POLICY, backend_factory=OrmBackend)
+        self.expected = Acl.create_instance(POLICY)
+
+    def test_same_answers(self):
+        acl = Acl(backend_factory=OrmBackend)
+        for role in ('authenticated', 'author', 'user_900'):
+            for privilege in POLICY['privileges']:
+                for resource in ('any', 'blog.post.1', 'blog.post.2', 'blog.post.3', 'blog.draft.4'):
+                    self.assertEqual(acl.is_allowed(role, privilege, resource),
+                                     self.expected.is_allowed(role, privilege, resource),
+                                     (role, privilege, resource))
+
+    def test_batched_resources(self):
+        acl = Acl(backend_factory=OrmBackend)
+        with self.assertNumQueries(4):  # Resources and parent links, then the parent and its links
+            resource = acl.get_resource('blog.draft.4')
+        self.assertEqual([i.get_name() for i in resource.get_parents()], ['blog.post.2'])
+        with self.assertNumQueries(0):
+            acl.get_resource('blog.draft')
+            acl.get_resource('blog')
+            acl.get_resource('blog.post')
+
+    def test_role_resources_in_one_batch(self):
+        acl = Acl(backend_factory=OrmBackend)
+        for i in range(5, 25):
+            acl.add_resource('blog.post.{0}'.format(i))
+            acl.add_role('user_{0}'.format(i), {'blog.post.{0}'.format(i): ['author']})
+        acl.add_role('user_901', dict(('blog.post.{0}'.format(i), ['author']) for i in range(5, 25)))
+        acl = Acl(backend_factory=OrmBackend)
+        with self.assertNumQueries(5):  # Roles, role links, resources, resource links, rules
+            role = acl.get_role('user_901')
+        self.assertEqual(len(role.get_parents_map()), 20)
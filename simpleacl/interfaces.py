@@ -1,5 +1,7 @@
 
 class IEntity(object):
+    __slots__ = ()
+
     def __eq__(self, other):
         """
         :type other: simpleacl.interfaces.IEntity
@@ -46,15 +48,15 @@ class IEntity(object):
 
 
 class IRole(IEntity):
-    pass
+    __slots__ = ()
 
 
 class IPrivilege(IEntity):
-    pass
+    __slots__ = ()
 
 
 class IResource(IEntity):
-    pass
+    __slots__ = ()
 
 
 class IBackend(object):
@@ -86,3 +88,34 @@ class IAclWalker(object):
         :rtype: bool or None
         """
         raise NotImplementedError
+
+    def expand(self, role, privilege, resource, acl):
+        """Yields (role, privilege, resource, acl) of each leaf call in order of walking.
+
+        :type role: simpleacl.interfaces.IRole
+        :type privilege: simpleacl.interfaces.IPrivilege
+        :type resource: simpleacl.interfaces.IResource
+        :type acl: simpleacl.interfaces.IAcl
+        :rtype: collections.Iterable[tuple]
+        """
+        raise NotImplementedError
+
+
+class IDecisionStore(object):
+    def get(self, version, key):
+        """Returns the stored decision, or None.
+
+        :type version: str
+        :type key: str
+        :rtype: bool or None
+        """
+        raise NotImplementedError
+
+    def set(self, version, key, allow):
+        """Stores the decision, the decisions of other versions can be dropped.
+
+        :type version: str
+        :type key: str
+        :type allow: bool
+        """
+        raise NotImplementedError
@@ -0,0 +1,362 @@
+from __future__ import absolute_import, unicode_literals
+import codecs
+import hashlib
+from collections import namedtuple
+from simpleacl import exceptions, utils
+from simpleacl.constants import ANY_PRIVILEGE, ANY_RESOURCE
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+try:
+    str = unicode  # Python 2.* compatible
+    string_types = (basestring,)
+    integer_types = (int, long)
+except NameError:
+    string_types = (str,)
+    integer_types = (int,)
+
+SECTIONS = ('resources', 'roles', 'privileges', 'acl')
+WHITESPACE = ' \t\n\r'
+
+# Names only: roles {name: {resource: parents}}, privileges set, resources {name: parents},
+# rules {(role, privilege, resource): allow}. Dotted ancestors are listed as entities.
+Policy = namedtuple('Policy', ('roles', 'privileges', 'resources', 'rules'))
+
+
+class JsonStreamReader(object):
+    """Reads JSON document from file-like object piece by piece."""
+
+    def __init__(self, fp, chunk_size=65536):
+        self._fp = fp
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = None
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self, size=None):
+        if self._eof:
+            return False
+        data = self._fp.read(size or self._chunk_size)
+        if isinstance(data, bytes):
+            if self._text_decoder is None:
+                self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+            data = self._text_decoder.decode(data, not data)
+        if not data:
+            self._eof = True
+            return False
+        self._buf = self._buf[self._pos:] + data
+        self._pos = 0
+        return True
+
+    def peek(self):
+        """Returns the next non-whitespace char, or '' at the end"""
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, chars):
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError('Expecting one of "{0}", got "{1}"'.format(chars, char))
+        self._pos += 1
+        return char
+
+    def value(self):
+        """Decodes the next JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except ValueError:
+                if not self._fill(max(self._chunk_size, len(self._buf))):
+                    raise
+                continue
+            # A number at the end of buffer can be incomplete
+            if end < len(self._buf) or not self._fill(max(self._chunk_size, len(self._buf))):
+                self._pos = end
+                return value
+
+    def items(self):
+        """Yields the values of JSON array"""
+        self.expect('[')
+        if self.peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(',]') == ']':
+                return
+
+    def pairs(self):
+        """Yields (key, reader) for members of JSON object, the reader is positioned on the value"""
+        self.expect('{')
+        if self.peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key, self
+            if self.expect(',}') == '}':
+                return
+
+
+def iter_policy(fp, chunk_size=65536):
+    """Yields (section, item) of the policy document without loading it at once.
+
+    Items of "acl" section are (resource, {role: {privilege: allow}}).
+    """
+    reader = JsonStreamReader(fp, chunk_size)
+    for key, reader in reader.pairs():
+        if key == 'acl':
+            for resource, reader in reader.pairs():
+                yield key, (resource, reader.value())
+        elif key in SECTIONS:
+            for item in reader.items():
+                yield key, item
+        else:
+            reader.value()
+
+
+def iter_items(json_or_dict):
+    """Yields (section, item) of the policy given as dict, json string, or file-like object"""
+    if hasattr(json_or_dict, 'read'):
+        return iter_policy(json_or_dict)
+    if isinstance(json_or_dict, bytes):
+        json_or_dict = json_or_dict.decode('utf-8')
+    if isinstance(json_or_dict, string_types):
+        json_or_dict = json.loads(json_or_dict)
+    return (
+        (section, item)
+        for section in SECTIONS
+        for item in (json_or_dict.get(section, {}).items() if section == 'acl' else json_or_dict.get(section, ()))
+    )
+
+
+def _with_ancestors(name):
+    result = [name]
+    while '.' in name:
+        name = name.rsplit('.', 1).pop(0)
+        result.append(name)
+    return result
+
+
+def normalize_policy(json_or_dict):
+    """Returns Policy of the policy given as dict, json string, or file-like object"""
+    policy = Policy({}, set([ANY_PRIVILEGE]), {ANY_RESOURCE: ()}, {})
+
+    def add_entity(entities, name, parents):
+        for ancestor in _with_ancestors(name):
+            entities.setdefault(ancestor, parents if ancestor == name else type(parents)())
+        if parents:
+            entities[name] = parents
+
+    for section, item in iter_items(json_or_dict):
+        if section == 'acl':
+            resource, rules = item
+            for role, role_rules in rules.items():
+                for privilege, allow in role_rules.items():
+                    policy.rules[(role, privilege, resource)] = allow
+        elif section == 'privileges':
+            policy.privileges.update(_with_ancestors(item))
+        else:
+            if utils.is_list(item):
+                name, parents = (tuple(item) + ((), ))[:2]
+            elif isinstance(item, dict):
+                name, parents = item['name_or_instance'], item.get('parents', ())
+            else:
+                name, parents = item, ()
+            if section == 'resources':
+                for parent in parents:
+                    add_entity(policy.resources, parent, ())
+                add_entity(policy.resources, name, tuple(parents))
+            else:
+                if type(parents) != dict:
+                    parents = {ANY_RESOURCE: parents}
+                parents = dict((resource, tuple(role_parents)) for resource, role_parents in parents.items()
+                               if role_parents)
+                for role_parents in parents.values():
+                    for parent in role_parents:
+                        add_entity(policy.roles, parent, {})
+                add_entity(policy.roles, name, parents)
+    return policy
+
+
+def hash_policy(policy, parent_version=None):
+    """Returns the hex digest of Policy content"""
+    data = [
+        sorted((name, sorted(parents.items())) for name, parents in policy.roles.items()),
+        sorted(policy.privileges),
+        sorted(policy.resources.items()),
+        sorted((key, allow if isinstance(allow, (bool, ) + string_types) else repr(allow))
+               for key, allow in policy.rules.items()),
+        parent_version,
+    ]
+    return hashlib.sha1(json.dumps(data, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+class BulkLoader(object):
+    """Fills an ACL like Acl.bulk_load(), but faster.
+
+    Every dotted ancestor is registered once, and rules are validated and
+    put straight into the backend.
+    """
+
+    def __init__(self, acl):
+        """
+        :type acl: simpleacl.acl.Acl
+        """
+        self._acl = acl
+        self._backend = acl._backend
+        self._roles = {}
+        self._privileges = {}
+        self._resources = {}
+        self._known = set(i.get_name() for getter in (acl._backend.get_roles,
+                                                      acl._backend.get_privileges,
+                                                      acl._backend.get_resources) for i in getter())
+
+    def load(self, json_or_dict):
+        """Loads a policy from dict, json string, or file-like object"""
+        return self.load_items(iter_items(json_or_dict))
+
+    def load_items(self, items):
+        """Loads (section, item) pairs.
+
+        Items are applied as they come. An item which refers to entities
+        of a later section is deferred to the end, with the items after it
+        of the same and following sections, so their order is kept.
+        """
+        missing = (exceptions.MissingRole, exceptions.MissingPrivilege, exceptions.MissingResource)
+        deferred = dict((section, []) for section in SECTIONS)
+        stage = len(SECTIONS)  # Items of this and following sections are deferred
+        for section, item in items:
+            if SECTIONS.index(section) >= stage:
+                deferred[section].append(item)
+                continue
+            try:
+                self.load_item(section, item)
+            except missing:
+                deferred[section].append(item)
+                stage = SECTIONS.index(section)
+        for section in SECTIONS:
+            for item in deferred[section]:
+                self.load_item(section, item)
+        self._acl._changed()
+        return self._acl
+
+    def load_item(self, section, item):
+        if section == 'acl':
+            self.add_rules(*item)
+        elif section == 'privileges':
+            self.add_privilege(item)
+        else:
+            method = self.add_resource if section == 'resources' else self.add_role
+            if utils.is_list(item):
+                method(*item)
+            elif isinstance(item, dict):
+                method(**item)
+            else:
+                method(item)
+
+    def add_resource(self, name_or_instance, parents=()):
+        instance, new = self._register(name_or_instance, self._resources, self._acl.get_resource,
+                                       self._backend.get_resource, self._backend.add_resource,
+                                       self._backend.resource_class, exceptions.MissingResource)
+        for parent in parents:
+            parent = self.add_resource(parent)
+            if parent not in instance.get_parents():
+                instance = self._own(instance, self._resources)
+                instance.add_parent(parent)
+        if new and '.' in instance.get_name():
+            self.add_resource(instance.get_name().rsplit('.', 1).pop(0))
+        return instance
+
+    def add_role(self, name_or_instance, parents=()):
+        instance, new = self._register(name_or_instance, self._roles, self._acl.get_role,
+                                       self._backend.get_role, self._backend.add_role,
+                                       self._backend.role_class, exceptions.MissingRole)
+        if type(parents) != dict:
+            parents = {ANY_RESOURCE: parents}
+        for resource, parent_list in parents.items():
+            for parent in parent_list:
+                resource = self._get(resource, self._resources, self._acl.get_resource)
+                parent = self.add_role(parent)
+                if parent not in instance.get_parents_map().get(resource, ()):
+                    instance = self._own(instance, self._roles)
+                    instance.add_parent(self._own(parent, self._roles), resource)
+        if new and '.' in instance.get_name():
+            parent = self.add_role(instance.get_name().rsplit('.', 1).pop(0))
+            if not self._acl._is_inherited('get_role', instance):
+                self._own(parent, self._roles).add_child(instance)
+        return instance
+
+    def add_privilege(self, name_or_instance):
+        instance, new = self._register(name_or_instance, self._privileges, self._acl.get_privilege,
+                                       self._backend.get_privilege, self._backend.add_privilege,
+                                       self._backend.privilege_class, exceptions.MissingPrivilege)
+        if new and '.' in instance.get_name():
+            self.add_privilege(instance.get_name().rsplit('.', 1).pop(0))
+        return instance
+
+    def add_rules(self, resource, rules):
+        """Adds {role: {privilege: allow}} rules of the resource"""
+        resource = self._get(resource, self._resources, self._acl.get_resource)
+        validated = []
+        for role, role_rules in rules.items():
+            role = self._get(role, self._roles, self._acl.get_role)
+            for privilege, allow in role_rules.items():
+                validated.append((role, self._get(privilege, self._privileges, self._acl.get_privilege), allow))
+                if utils.is_dynamic_rule(allow) and allow not in utils.dynamic_rules:
+                    utils.dynamic_rules.register(allow)
+        for role, privilege, allow in validated:
+            self._backend.add_rule(role, privilege, resource, allow)
+
+    def _get(self, name, memo, getter):
+        try:
+            return memo[name]
+        except KeyError:
+            instance = memo[name] = getter(name)
+            return instance
+
+    def _own(self, instance, memo):
+        """Returns the instance, or its copy if it's shared with the parent ACL, see Acl._own()"""
+        if self._acl.parent is None:
+            return instance
+        instance = memo[instance.get_name()] = self._acl._own(instance)
+        return instance
+
+    def _register(self, name_or_instance, memo, getter, backend_getter, backend_setter, factory, missing):
+        """Returns (instance, True) if the name is met first time"""
+        if isinstance(name_or_instance, factory):
+            instance = name_or_instance
+        elif isinstance(name_or_instance, string_types):
+            try:
+                return memo[name_or_instance], False
+            except KeyError:
+                pass
+            if self._acl.parent is None and name_or_instance not in self._known:
+                # Neither this ACL nor its parents can have it, no lookups needed
+                instance = memo[name_or_instance] = factory(name_or_instance)
+                instance._acl = self._acl._ref
+                utils.mro_cache.added(instance)
+                backend_setter(instance)
+                return instance, True
+            try:
+                instance = getter(name_or_instance)
+            except missing:
+                instance = factory(name_or_instance)
+        else:
+            raise Exception('Unknown type: {0}'.format(type(name_or_instance).__name__))
+        instance = self._acl._register(instance, getter, backend_getter, backend_setter)
+        new = instance.get_name() not in memo
+        memo[instance.get_name()] = instance
+        return instance, new
@@ -1,7 +1,9 @@
 from __future__ import absolute_import, unicode_literals
+import hashlib
 import inspect
-from threading import local
-from simpleacl import acl, settings, utils
+import os
+from threading import local, RLock
+from simpleacl import acl, settings, utils, walkers
 from simpleacl.constants import ANY_RESOURCE
 
 try:
@@ -12,6 +14,11 @@ except NameError:
     string_types = (str,)
     integer_types = (int,)
 
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
 """
 Example of usage.
 
@@ -72,6 +79,71 @@ _ctx = local()
 _dummy = DummyCtx()
 
 
+class SharedAcl(object):
+    """Process-wide ACL snapshot.
+
+    Readers take the current snapshot without locking. Writers change
+    a copy of the snapshot and swap it in, so a snapshot never changes
+    once it is published.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._snapshot = None
+        self._lock = RLock()
+
+    def get(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = self._factory()
+                snapshot = self._snapshot
+        return snapshot
+
+    def update(self, func):
+        """Applies func(acl) to a copy of the snapshot, and publishes the copy"""
+        with self._lock:
+            snapshot = self.get().copy()
+            func(snapshot)
+            self._snapshot = snapshot
+        return snapshot
+
+    def reset(self):
+        with self._lock:
+            self._snapshot = None
+
+    def is_loaded(self):
+        return self._snapshot is not None
+
+
+def get_acl_options():
+    options = {}
+    if settings.SHARED_ACL:
+        options['compiled'] = True
+    options.update(settings.ACL_OPTIONS)
+    return options
+
+
+def create_acl(**options):
+    """Returns a new ACL built from settings.INITIAL_SNAPSHOT or settings.INITIAL_DATA"""
+    if settings.INITIAL_SNAPSHOT:
+        return acl.Acl.load_snapshot(settings.INITIAL_SNAPSHOT, **options)
+    return acl.Acl.create_instance(settings.INITIAL_DATA, **options)
+
+def get_overlay_options():
+    """Returns the options of the ACLs whose parent is the shared snapshot.
+
+    They ask the parent with its own walker, and use its "any" entities,
+    so the compiled tables and the caches of the parent serve them all.
+    """
+    options = dict({'walker': walkers.overlay_acl_walker}, **settings.ACL_OPTIONS)
+    options.update(compiled=False, default_entities=False)
+    return options
+
+shared_acl = SharedAcl(lambda: create_acl(**get_acl_options()))
+
+
 def user_has_perm(user, perm, obj=None):
     for checker in register._registry:
         if checker(user, perm, obj):
@@ -80,12 +152,135 @@ def user_has_perm(user, perm, obj=None):
 
 
 def get_acl(thread_safe=True):
+    """Returns the ACL of the current thread (or of the process if not thread_safe).
+
+    With settings.SHARED_ACL it is a small overlay whose parent is the
+    shared snapshot. The overlay holds roles and resources created
+    at runtime, and is dropped when a new snapshot is published.
+    """
     ctx = thread_safe and _ctx or _dummy
+    if settings.SHARED_ACL:
+        snapshot = shared_acl.get()
+        overlay = getattr(ctx, 'acl', None)
+        if overlay is None or overlay.parent is not snapshot:
+            overlay = acl.Acl(**get_overlay_options())
+            overlay.parent = snapshot
+            ctx.acl = overlay
+        return overlay
     try:
-        return ctx.acl
+        current = ctx.acl
     except AttributeError:
-        ctx.acl = acl.Acl.create_instance(settings.INITIAL_DATA)
-    return ctx.acl
+        current = ctx.acl = create_acl(**settings.ACL_OPTIONS)
+        ctx.policy = (_policy['generation'], None if settings.INITIAL_SNAPSHOT else settings.INITIAL_DATA)
+    if ctx.policy[0] != _policy['generation']:
+        current.reload(settings.INITIAL_DATA, ctx.policy[1])
+        ctx.policy = (_policy['generation'], settings.INITIAL_DATA)
+    return current
+
+
+def get_request_acl(thread_safe=True):
+    """Returns the ACL of the current request.
+
+    It's an overlay whose parent is get_acl(), for the roles of users and
+    the resources of objects, until end_request(). So the ACL of the thread
+    doesn't grow, and the groups of a user are read again in each request.
+    """
+    ctx = thread_safe and _ctx or _dummy
+    base = get_acl(thread_safe)
+    current = getattr(ctx, 'request_acl', None)
+    if current is None or current.parent is not base:
+        current = ctx.request_acl = acl.Acl(walker=walkers.overlay_acl_walker, default_entities=False)
+        current.parent = base
+    return current
+
+
+def end_request(thread_safe=True):
+    """Drops the ACL of the current request"""
+    ctx = thread_safe and _ctx or _dummy
+    ctx.request_acl = None
+
+
+def update_acl(func):
+    """Applies func(acl) to the policy.
+
+    With settings.SHARED_ACL the change is made on a copy of the shared
+    snapshot, which is published afterwards.
+    """
+    _policy['updated'] = True
+    if settings.SHARED_ACL:
+        return shared_acl.update(func)
+    current = get_acl()
+    func(current)
+    return current
+
+def reload_policy(data):
+    """Replaces settings.INITIAL_DATA, the ACLs are changed incrementally by Acl.reload().
+
+    The ACL of each thread is reloaded on its next get_acl(). Roles and
+    rules added at runtime, which are not in the policy, are kept.
+    """
+    old_data = None if settings.INITIAL_SNAPSHOT else settings.INITIAL_DATA
+    settings.INITIAL_DATA = data
+    settings.INITIAL_SNAPSHOT = None
+    _policy['source'] = None
+    _policy['generation'] += 1
+    if settings.SHARED_ACL and shared_acl.is_loaded():
+        shared_acl.update(lambda current: current.reload(data, old_data))
+
+_policy = {'source': None, 'hash': None, 'updated': False, 'generation': 0}
+_decision_stores = {}
+
+
+def get_policy_version():
+    """Returns the hash of settings.INITIAL_SNAPSHOT or settings.INITIAL_DATA.
+
+    It's the same in all processes with the same policy. After update_acl()
+    it's the hash of the content of the ACL, see Acl.get_policy_version().
+    """
+    if _policy['updated']:
+        return (shared_acl.get() if settings.SHARED_ACL else get_acl()).get_policy_version()
+    if settings.INITIAL_SNAPSHOT:
+        stat = os.stat(settings.INITIAL_SNAPSHOT)
+        source = (settings.INITIAL_SNAPSHOT, stat.st_size, stat.st_mtime)
+    else:
+        source = id(settings.INITIAL_DATA)
+    if source != _policy['source']:
+        digest = hashlib.sha1()
+        if settings.INITIAL_SNAPSHOT:
+            with open(settings.INITIAL_SNAPSHOT, 'rb') as f:
+                for chunk in iter(lambda: f.read(65536), b''):
+                    digest.update(chunk)
+        else:
+            data = settings.INITIAL_DATA
+            if not isinstance(data, (string_types, bytes)):
+                data = json.dumps(data, sort_keys=True, separators=(',', ':'))
+            digest.update(data if isinstance(data, bytes) else data.encode('utf-8'))
+        _policy['source'], _policy['hash'] = source, digest.hexdigest()
+    return _policy['hash']
+
+
+def get_decision_key(role, privilege, resource):
+    """Returns the key of the decision in the decision store.
+
+    The key has the parents of the role, so the decisions of a user aren't
+    used once the groups of the user have changed.
+    """
+    parents = sorted('{0}:{1}'.format(parents_resource.get_name(), ','.join(sorted(i.get_name() for i in parents)))
+                     for parents_resource, parents in role.get_parents_map().items())
+    return '\0'.join([role.get_name(), privilege.get_name(), resource.get_name()] + parents)
+
+
+def get_decision_store():
+    """Returns the instance of settings.DECISION_STORE, or None"""
+    if not settings.DECISION_STORE:
+        return None
+    try:
+        return _decision_stores[settings.DECISION_STORE]
+    except KeyError:
+        store = _decision_stores[settings.DECISION_STORE] = utils.resolve(settings.DECISION_STORE)(
+            **settings.DECISION_STORE_OPTIONS
+        )
+        return store
 
 
 def get_role_name(user):
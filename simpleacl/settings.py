@@ -5,6 +5,21 @@ INITIAL_DATA = {}
 
 ACL_GETTER = 'simpleacl.paste.get_acl'
 
+# Keyword arguments of simpleacl.Acl, for example {'compiled': True, 'cache_size': 10000}
+ACL_OPTIONS = {}
+
+# Path of a file written by Acl.dump_snapshot(), it's loaded through mmap instead of INITIAL_DATA
+INITIAL_SNAPSHOT = None
+
+# One compiled snapshot per process instead of one ACL per thread, see simpleacl.paste.SharedAcl
+SHARED_ACL = False
+
+# Class of simpleacl.interfaces.IDecisionStore shared by workers, used by PermissionBackend,
+# e.g. 'simpleacl.stores.SqliteDecisionStore' or 'simpleacl.django_simpleacl.stores.CacheDecisionStore'
+DECISION_STORE = None
+
+DECISION_STORE_OPTIONS = {}  # For example {'path': '/var/tmp/simpleacl.sqlite'}
+
 try:
     m = __import__(os.getenv('SIMPLEACL_SETTINGS', 'simpleacl_settings'))
 except ImportError:
@@ -0,0 +1,586 @@
+"""Binary snapshot of an ACL backend, read through mmap.
+
+The file consists of a header and a set of little-endian sections:
+
+- a table of all names, sorted, so a name is found by binary search;
+- for each kind of entity, the ids of its names in the registration
+  order, and (id, index) pairs sorted by id;
+- parents and children of roles, and parents of resources, as offset
+  arrays into flat lists of entity indexes;
+- the rules (resource, role, privilege, value) sorted in this order,
+  a permutation of them sorted by (role, privilege, resource),
+  and an open addressing hash table for lookups of a single rule;
+- the distinct values of rules encoded with JSON.
+
+Nothing is decoded up front, entities are created on first access.
+"""
+from __future__ import absolute_import, unicode_literals
+import copy
+import mmap
+import os
+import struct
+import sys
+from array import array
+from threading import RLock
+from simpleacl import exceptions, utils
+from simpleacl.acl import Role, SimpleBackend
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+try:
+    str = unicode  # Python 2.* compatible
+    string_types = (basestring,)
+    integer_types = (int, long)
+except NameError:
+    string_types = (str,)
+    integer_types = (int,)
+
+MAGIC = b'SACLSNAP'
+VERSION = 1
+NONE = 0xFFFFFFFF  # Resource of children with dotted names
+
+KINDS = ('role', 'privilege', 'resource')
+LISTS = ('role_parents', 'role_child_of', 'role_children', 'resource_parents')
+SECTIONS = (
+    ('string_offsets', 'strings') +
+    tuple(kind + suffix for kind in KINDS for suffix in ('_ids', '_index')) +
+    tuple(name + suffix for name in LISTS for suffix in ('_offsets', '')) +
+    ('rules', 'rules_by_role', 'rules_hash', 'values')
+)
+
+_header = struct.Struct('<8sII')
+_section = struct.Struct('<QQ')
+_uint = struct.Struct('<I')
+_pair = struct.Struct('<II')
+_rule = struct.Struct('<IIII')
+
+MISSING = object()
+
+
+def _hash(resource, role, privilege):
+    return ((resource * 0x9E3779B1) ^ (role * 0x85EBCA77) ^ (privilege * 0xC2B2AE3D)) & 0xFFFFFFFF
+
+
+def _pack(values):
+    result = array(str('I'), values)
+    if result.itemsize != 4:
+        result = array(str('L'), values)
+    if sys.byteorder == 'big':
+        result.byteswap()
+    return result.tobytes() if hasattr(result, 'tobytes') else result.tostring()
+
+
+def dump(backend, path):
+    """Writes the entities and rules of the backend to the file.
+
+    The file is replaced atomically, so processes which have mapped
+    the old file keep reading it.
+    """
+    entities = {
+        'role': backend.get_roles(),
+        'privilege': backend.get_privileges(),
+        'resource': backend.get_resources(),
+    }
+    indexes = dict((kind, dict((instance.get_name(), i) for i, instance in enumerate(entities[kind])))
+                   for kind in KINDS)
+
+    def index(kind, instance):
+        try:
+            return indexes[kind][instance.get_name()]
+        except KeyError:
+            raise ValueError('{0} "{1}" is not registered in the ACL, '
+                             'the snapshot must be self-contained'.format(kind.capitalize(), instance.get_name()))
+
+    names = sorted(set(name for kind in KINDS for name in indexes[kind]))
+    name_ids = dict((name, i) for i, name in enumerate(names))
+    encoded = [name.encode('utf-8') for name in names]
+    string_offsets = [0]
+    for name in encoded:
+        string_offsets.append(string_offsets[-1] + len(name))
+    data = {'string_offsets': _pack(string_offsets), 'strings': b''.join(encoded)}
+    for kind in KINDS:
+        ids = [name_ids[i.get_name()] for i in entities[kind]]
+        data[kind + '_ids'] = _pack(ids)
+        data[kind + '_index'] = _pack(j for pair in sorted((sid, i) for i, sid in enumerate(ids)) for j in pair)
+
+    lists = dict((name, []) for name in LISTS)
+    child_of = [[] for i in entities['role']]
+    for i, role in enumerate(entities['role']):
+        lists['role_parents'].append([j for resource, parents in role.get_parents_map().items()
+                                      for parent in parents
+                                      for j in (index('resource', resource), index('role', parent))])
+        children = []
+        for resource, items in role.get_children_map().items():
+            for child in items:
+                if indexes['role'].get(child.get_name()) is None:
+                    continue  # Belongs to another ACL which inherits from this one
+                key = NONE if resource is None else index('resource', resource)
+                children.extend((key, index('role', child)))
+                child_of[index('role', child)].extend((key, i))
+        lists['role_children'].append(children)
+    lists['role_child_of'] = child_of
+    lists['resource_parents'] = [[index('resource', parent) for parent in resource.get_parents()]
+                                 for resource in entities['resource']]
+    for name in LISTS:
+        offsets = [0]
+        for values in lists[name]:
+            offsets.append(offsets[-1] + len(values))
+        data[name + '_offsets'] = _pack(offsets)
+        data[name] = _pack(j for values in lists[name] for j in values)
+
+    values, value_ids, rules = [], {}, []
+    for role, privilege, resource, allow in backend.get_rules():
+        key = json.dumps(allow, sort_keys=True)
+        if key not in value_ids:
+            value_ids[key] = len(values)
+            values.append(allow)
+        rules.append((index('resource', resource), index('role', role),
+                      index('privilege', privilege), value_ids[key]))
+    rules.sort()
+    size = 1
+    while size < 2 * len(rules):
+        size <<= 1
+    table = [0] * size
+    for row, (resource, role, privilege, value) in enumerate(rules):
+        slot = _hash(resource, role, privilege) & (size - 1)
+        while table[slot]:
+            slot = (slot + 1) & (size - 1)
+        table[slot] = row + 1
+    data['rules'] = _pack(j for rule in rules for j in rule)
+    data['rules_by_role'] = _pack(sorted(range(len(rules)), key=lambda i: (rules[i][1], rules[i][2], rules[i][0])))
+    data['rules_hash'] = _pack(table)
+    data['values'] = json.dumps(values).encode('utf-8')
+
+    offset = _header.size + _section.size * len(SECTIONS)
+    layout = []
+    for section in SECTIONS:
+        offset += -offset % 8
+        layout.append((offset, len(data[section])))
+        offset += len(data[section])
+
+    tmp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        f.write(_header.pack(MAGIC, VERSION, len(SECTIONS)))
+        for item in layout:
+            f.write(_section.pack(*item))
+        for section, (offset, size) in zip(SECTIONS, layout):
+            f.write(b'\0' * (offset - f.tell()))
+            f.write(data[section])
+    getattr(os, 'replace', os.rename)(tmp_path, path)
+
+
+class Snapshot(object):
+    """Read-only view of a snapshot file."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = _header.unpack_from(self._buf, 0)
+        if magic != MAGIC or version != VERSION or count != len(SECTIONS):
+            raise ValueError('"{0}" is not a snapshot of version {1}'.format(path, VERSION))
+        self._offsets = {}
+        self._sizes = {}
+        for i, section in enumerate(SECTIONS):
+            self._offsets[section], self._sizes[section] = _section.unpack_from(
+                self._buf, _header.size + _section.size * i
+            )
+        self._string_count = self._sizes['string_offsets'] // 4 - 1
+        self._rule_count = self._sizes['rules'] // _rule.size
+        self._hash_mask = self._sizes['rules_hash'] // 4 - 1
+        self.values = json.loads(self._read('values').decode('utf-8'))
+
+    def _read(self, section):
+        offset = self._offsets[section]
+        return self._buf[offset:offset + self._sizes[section]]
+
+    def _get(self, section, i):
+        return _uint.unpack_from(self._buf, self._offsets[section] + 4 * i)[0]
+
+    def _get_string(self, sid):
+        start, end = _pair.unpack_from(self._buf, self._offsets['string_offsets'] + 4 * sid)
+        offset = self._offsets['strings']
+        return self._buf[offset + start:offset + end]
+
+    def count(self, kind):
+        return self._sizes[kind + '_ids'] // 4
+
+    def get_name(self, kind, i):
+        return self._get_string(self._get(kind + '_ids', i)).decode('utf-8')
+
+    def find(self, kind, name):
+        """Returns the index of entity, or None"""
+        encoded = name.encode('utf-8')
+        lo, hi = 0, self._string_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._get_string(mid) < encoded:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == self._string_count or self._get_string(lo) != encoded:
+            return None
+        sid, section = lo, kind + '_index'
+        lo, hi = 0, self.count(kind)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._get(section, 2 * mid) < sid:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == self.count(kind) or self._get(section, 2 * lo) != sid:
+            return None
+        return self._get(section, 2 * lo + 1)
+
+    def get_list(self, name, i):
+        """Returns the i-th item of the list section"""
+        start, end = _pair.unpack_from(self._buf, self._offsets[name + '_offsets'] + 4 * i)
+        return struct.unpack_from('<{0}I'.format(end - start), self._buf, self._offsets[name] + 4 * start)
+
+    def get_rule(self, resource, role, privilege):
+        """Returns the value of the rule, or MISSING"""
+        if not self._rule_count:
+            return MISSING
+        slot = _hash(resource, role, privilege) & self._hash_mask
+        while True:
+            row = self._get('rules_hash', slot)
+            if not row:
+                return MISSING
+            rule = _rule.unpack_from(self._buf, self._offsets['rules'] + _rule.size * (row - 1))
+            if rule[0] == resource and rule[1] == role and rule[2] == privilege:
+                return self.values[rule[3]]
+            slot = (slot + 1) & self._hash_mask
+
+    def _get_rule(self, row):
+        return _rule.unpack_from(self._buf, self._offsets['rules'] + _rule.size * row)
+
+    def get_rules(self):
+        """Yields (resource, role, privilege, value) indexes"""
+        for row in range(self._rule_count):
+            yield self._get_rule(row)
+
+    def get_resource_rules(self, resource):
+        """Yields (resource, role, privilege, value) of the resource"""
+        lo, hi = 0, self._rule_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._get_rule(mid)[0] < resource:
+                lo = mid + 1
+            else:
+                hi = mid
+        while lo < self._rule_count:
+            rule = self._get_rule(lo)
+            if rule[0] != resource:
+                break
+            yield rule
+            lo += 1
+
+    def has_rules(self, resource, role=None):
+        """Returns True if there are rules for the resource (and the role)"""
+        key = (resource, ) if role is None else (resource, role)
+        lo, hi = 0, self._rule_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._get_rule(mid)[:len(key)] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo < self._rule_count and self._get_rule(lo)[:len(key)] == key
+
+    def has_role_rules(self, role):
+        """Returns True if there are rules for the role"""
+        lo, hi = 0, self._rule_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._get_rule(self._get('rules_by_role', mid))[1] < role:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo < self._rule_count and self._get_rule(self._get('rules_by_role', lo))[1] == role
+
+    def get_role_rules(self, role, privilege):
+        """Yields (resource, role, privilege, value) of the role and the privilege"""
+        def get(i):
+            return self._get_rule(self._get('rules_by_role', i))
+
+        lo, hi = 0, self._rule_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if get(mid)[1:3] < (role, privilege):
+                lo = mid + 1
+            else:
+                hi = mid
+        while lo < self._rule_count:
+            rule = get(lo)
+            if rule[1:3] != (role, privilege):
+                break
+            yield rule
+            lo += 1
+
+
+class SnapshotRole(Role):
+    """Role of a snapshot, its children are loaded on demand.
+
+    Other threads wait on the lock of the backend until all children are loaded.
+    """
+    __slots__ = ('_backend', )
+
+    def get_children_map(self):
+        backend = getattr(self, '_backend', None)
+        if backend is not None:
+            with backend._lock:
+                if self._backend is not None:
+                    backend._load_children(self)
+                    self._backend = None  # Only once they are all linked
+        return super(SnapshotRole, self).get_children_map()
+
+
+class SnapshotBackend(SimpleBackend):
+    """A storage backed by a snapshot file written by dump().
+
+    Entities are created on first access and kept in the dicts of
+    SimpleBackend, which also hold the entities and rules added later.
+    Rules removed after loading are shadowed by REMOVED.
+    """
+    REMOVED = object()
+
+    def __init__(self, path, missing_cache_size=10000):
+        """Constructor."""
+        super(SnapshotBackend, self).__init__()
+        self._snapshot = Snapshot(path)
+        self._ids = dict((kind, {}) for kind in KINDS)  # name -> index
+        self._missing = utils.LRUCache(missing_cache_size)  # (kind, name) of names which are not in the snapshot
+        self._removed = set()  # (kind, name) of entities removed after loading
+        self._lock = RLock()
+        self._building = {}  # (kind, name) -> entity being loaded by the thread holding the lock
+
+    def __deepcopy__(self, memo):
+        obj = memo[id(self)] = self.__class__.__new__(self.__class__)
+        for key, value in self.__dict__.items():
+            if key == '_missing':
+                value = utils.LRUCache(value.max_size)
+            elif key == '_lock':
+                value = RLock()
+            elif key != '_snapshot':
+                value = copy.deepcopy(value, memo)
+            setattr(obj, key, value)
+        return obj
+
+    def _find(self, kind, name):
+        """Returns the index of entity in the snapshot, or None"""
+        try:
+            return self._ids[kind][name]
+        except KeyError:
+            pass
+        if (kind, name) in self._missing or (kind, name) in self._removed:
+            return None
+        i = self._snapshot.find(kind, name)
+        if i is None:
+            self._missing.set((kind, name), True)
+        else:
+            self._ids[kind][name] = i
+        return i
+
+    def _load(self, kind, i):
+        """Returns the i-th entity of the snapshot.
+
+        Entities are built under the lock, and published in the dicts of
+        SimpleBackend only once they are complete with their parents, so
+        other threads never see (nor linearize) a half-built one.
+        """
+        name = self._snapshot.get_name(kind, i)
+        instances = getattr(self, '_{0}s'.format(kind))
+        try:
+            return instances[name]
+        except KeyError:
+            pass
+        with self._lock:
+            try:
+                return instances[name]  # Loaded by another thread meanwhile
+            except KeyError:
+                pass
+            try:
+                return self._building[(kind, name)]  # Parents referring back to it
+            except KeyError:
+                pass
+            outermost = not self._building
+            try:
+                instance = self._build(kind, i, name)
+                if outermost:
+                    for (built_kind, built_name), built in self._building.items():
+                        getattr(self, '_{0}s'.format(built_kind))[built_name] = built
+            finally:
+                if outermost:
+                    self._building.clear()
+        return instance
+
+    def _build(self, kind, i, name):
+        self._ids[kind][name] = i
+        if kind == 'role':
+            instance = self._building[(kind, name)] = SnapshotRole(name)
+            instance._backend = self
+            parents = self._snapshot.get_list('role_parents', i)
+            for resource, parent in zip(parents[::2], parents[1::2]):
+                instance._parents.setdefault(self._load('resource', resource), []).append(self._load('role', parent))
+            child_of = self._snapshot.get_list('role_child_of', i)
+            for resource, parent in zip(child_of[::2], child_of[1::2]):
+                resource = None if resource == NONE else self._load('resource', resource)
+                self._load('role', parent).add_child(instance, resource)
+        elif kind == 'resource':
+            instance = self._building[(kind, name)] = self.resource_class(name)
+            instance._parents = tuple(self._load('resource', parent)
+                                      for parent in self._snapshot.get_list('resource_parents', i))
+        else:
+            instance = self._building[(kind, name)] = self.privilege_class(name)
+        return instance
+
+    def _load_children(self, role):
+        i = self._find('role', role.get_name())
+        if i is not None:
+            children = self._snapshot.get_list('role_children', i)
+            for child in children[1::2]:
+                self._load('role', child)
+
+    def _get_entity(self, kind, name, exception):
+        try:
+            return getattr(self, '_{0}s'.format(kind))[name]
+        except KeyError:
+            pass
+        i = self._find(kind, name)
+        if i is None:
+            raise exception('Missing {0} "{1}"'.format(kind.capitalize(), name))
+        return self._load(kind, i)
+
+    def _get_entities(self, kind):
+        instances = getattr(self, '_{0}s'.format(kind))
+        result = [self._load(kind, i) for i in range(self._snapshot.count(kind))
+                  if (kind, self._snapshot.get_name(kind, i)) not in self._removed]
+        names = set(i.get_name() for i in result)
+        return result + [i for name, i in instances.items() if name not in names]
+
+    def get_role(self, name):
+        """Returns a role instance"""
+        return self._get_entity('role', name, exceptions.MissingRole)
+
+    def get_roles(self):
+        """Returns all role instances"""
+        return self._get_entities('role')
+
+    def _remove_entity(self, kind, instance):
+        getattr(self, '_{0}s'.format(kind)).pop(instance.get_name(), None)
+        self._ids[kind].pop(instance.get_name(), None)
+        self._removed.add((kind, instance.get_name()))
+
+    def remove_role(self, instance):
+        """Removes role, but not its rules"""
+        self._remove_entity('role', instance)
+
+    def get_privilege(self, name):
+        """Returns a privilege instance"""
+        return self._get_entity('privilege', name, exceptions.MissingPrivilege)
+
+    def remove_privilege(self, instance):
+        """Removes privilege, but not its rules"""
+        self._remove_entity('privilege', instance)
+
+    def get_privileges(self):
+        """Returns all privilege instances"""
+        return self._get_entities('privilege')
+
+    def get_resource(self, name):
+        """Returns a resource instance"""
+        return self._get_entity('resource', name, exceptions.MissingResource)
+
+    def remove_resource(self, instance):
+        """Removes resource, but not its rules"""
+        self._remove_entity('resource', instance)
+
+    def get_resources(self):
+        """Returns all resource instances"""
+        return self._get_entities('resource')
+
+    def _get_snapshot_rule(self, role, privilege, resource):
+        resource = self._find('resource', resource.get_name())
+        role = self._find('role', role.get_name())
+        privilege = self._find('privilege', privilege.get_name())
+        if resource is None or role is None or privilege is None:
+            return MISSING
+        return self._snapshot.get_rule(resource, role, privilege)
+
+    def is_allowed(self, role, privilege, resource, undef=None):
+        """Returns True if role is allowed for given arguments"""
+        allow = self._acl.get(resource, {}).get(role, {}).get(privilege, MISSING) if self._acl else MISSING
+        if allow is MISSING:
+            allow = self._get_snapshot_rule(role, privilege, resource)
+        if allow is MISSING or allow is self.REMOVED:
+            return undef
+        return allow
+
+    def add_rule(self, role, privilege, resource, allow=True):
+        """Adds rule to the ACL"""
+        if self.is_allowed(role, privilege, resource, MISSING) != allow:
+            super(SnapshotBackend, self).add_rule(role, privilege, resource, allow)
+        return self
+
+    def remove_rule(self, role, privilege, resource, allow=True):
+        """Removes rule from ACL"""
+        if self.is_allowed(role, privilege, resource, MISSING) == allow:
+            super(SnapshotBackend, self).remove_rule(role, privilege, resource, allow)
+            if self._get_snapshot_rule(role, privilege, resource) is not MISSING:
+                super(SnapshotBackend, self).add_rule(role, privilege, resource, self.REMOVED)
+        return self
+
+    def has_rules(self, role=None, resource=None):
+        """Returns False if there are no rules for the role, the resource, or both of them"""
+        if super(SnapshotBackend, self).has_rules(role, resource):
+            return True
+        role_id = None if role is None else self._find('role', role.get_name())
+        resource_id = None if resource is None else self._find('resource', resource.get_name())
+        if (role is not None and role_id is None) or (resource is not None and resource_id is None):
+            return False
+        if resource is None:
+            return self._snapshot.has_role_rules(role_id)
+        return self._snapshot.has_rules(resource_id, role_id)
+
+    def get_rules(self):
+        """Returns all (role, privilege, resource, allow)"""
+        result = []
+        for resource, role, privilege, value in self._snapshot.get_rules():
+            if self._removed and any((kind, self._snapshot.get_name(kind, i)) in self._removed
+                                     for kind, i in (('role', role), ('privilege', privilege),
+                                                     ('resource', resource))):
+                continue
+            role, privilege, resource = (self._load('role', role), self._load('privilege', privilege),
+                                         self._load('resource', resource))
+            if self._acl.get(resource, {}).get(role, {}).get(privilege, MISSING) is MISSING:
+                result.append((role, privilege, resource, self._snapshot.values[value]))
+        for role, privilege, resource, allow in super(SnapshotBackend, self).get_rules():
+            if allow is not self.REMOVED:
+                result.append((role, privilege, resource, allow))
+        return result
+
+    def get_rule_roles(self, resources, privileges):
+        """Returns the roles which have rules for any of given resources and privileges"""
+        result = super(SnapshotBackend, self).get_rule_roles(resources, privileges)
+        privilege_ids = set(self._find('privilege', i) for i in privileges)
+        for resource in resources:
+            i = self._find('resource', resource)
+            if i is not None:
+                for rule in self._snapshot.get_resource_rules(i):
+                    if rule[2] in privilege_ids:
+                        result.append(self._load('role', rule[1]))
+        return result
+
+    def get_rule_resources(self, roles, privileges):
+        """Returns the resources which have rules for any of given roles and privileges"""
+        result = super(SnapshotBackend, self).get_rule_resources(roles, privileges)
+        privilege_ids = [i for i in (self._find('privilege', j) for j in privileges) if i is not None]
+        for role in roles:
+            i = self._find('role', role.get_name())
+            if i is not None:
+                for privilege in privilege_ids:
+                    for rule in self._snapshot.get_role_rules(i, privilege):
+                        result.add(self._load('resource', rule[0]))
+        return result
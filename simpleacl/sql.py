@@ -0,0 +1,522 @@
+"""A backend which keeps the ACL in SQL tables.
+
+Entities are loaded on first access and kept in memory; changes of
+entities, parents and rules are written through. Before each walk
+Acl asks the backend to prefetch_rules() for all candidate roles,
+privileges and resources, so a decision costs one query.
+
+The SQL is written for SQLite, pass a connection factory of another
+DB-API driver with the "qmark" paramstyle to use it.
+"""
+from __future__ import absolute_import, unicode_literals
+import copy
+import sqlite3
+from contextlib import contextmanager
+from functools import partial
+from threading import RLock, local
+from simpleacl import exceptions, interfaces
+from simpleacl.acl import Privilege, Resource, Role
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue  # Python 2.*
+
+try:
+    str = unicode  # Python 2.* compatible
+    string_types = (basestring,)
+except NameError:
+    string_types = (str,)
+
+KINDS = ('role', 'privilege', 'resource')
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS simpleacl_entity ('
+    'id INTEGER PRIMARY KEY, kind VARCHAR(16) NOT NULL, name VARCHAR(255) NOT NULL, UNIQUE (kind, name))',
+    'CREATE TABLE IF NOT EXISTS simpleacl_role_parent ('
+    'role_id INTEGER NOT NULL, resource_id INTEGER NOT NULL, parent_id INTEGER NOT NULL, '
+    'position INTEGER NOT NULL, PRIMARY KEY (role_id, resource_id, parent_id))',
+    'CREATE INDEX IF NOT EXISTS simpleacl_role_parent_parent ON simpleacl_role_parent (parent_id)',
+    'CREATE TABLE IF NOT EXISTS simpleacl_resource_parent ('
+    'resource_id INTEGER NOT NULL, parent_id INTEGER NOT NULL, position INTEGER NOT NULL, '
+    'PRIMARY KEY (resource_id, parent_id))',
+    'CREATE TABLE IF NOT EXISTS simpleacl_rule ('
+    'role_id INTEGER NOT NULL, privilege_id INTEGER NOT NULL, resource_id INTEGER NOT NULL, '
+    'allow TEXT NOT NULL, PRIMARY KEY (resource_id, role_id, privilege_id))',
+    'CREATE INDEX IF NOT EXISTS simpleacl_rule_role ON simpleacl_rule (role_id, privilege_id)',
+)
+
+MAX_PARAMS = 900  # Default SQLITE_MAX_VARIABLE_NUMBER of old versions is 999
+
+
+class ConnectionPool(object):
+    """Keeps up to size idle connections made by connect()"""
+
+    def __init__(self, connect, size=5):
+        self._connect = connect
+        self._idle = queue.Queue(size)
+
+    @contextmanager
+    def connection(self):
+        try:
+            connection = self._idle.get_nowait()
+        except queue.Empty:
+            connection = self._connect()
+        try:
+            yield connection
+        except Exception:
+            connection.rollback()
+            raise
+        try:
+            self._idle.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class SqlRole(Role):
+    """Role of SqlBackend, changes of its parents are saved, children are loaded on demand"""
+    __slots__ = ('_backend', '_children_loaded')
+
+    def add_parent(self, parent, resource):
+        new = parent not in self._parents.get(resource, ())
+        super(SqlRole, self).add_parent(parent, resource)
+        backend = getattr(self, '_backend', None)
+        if new and backend is not None:
+            backend._add_parent('role', self, parent, resource)
+
+    def remove_parent(self, parent, resource):
+        old = parent in self._parents.get(resource, ())
+        super(SqlRole, self).remove_parent(parent, resource)
+        backend = getattr(self, '_backend', None)
+        if old and backend is not None:
+            backend._remove_parent('role', self, parent, resource)
+
+    def get_children_map(self):
+        backend = getattr(self, '_backend', None)
+        if backend is not None and not getattr(self, '_children_loaded', False):
+            with backend._lock:
+                if not getattr(self, '_children_loaded', False):
+                    backend._load_children(self)
+                    self._children_loaded = True  # Only once they are all linked
+        return super(SqlRole, self).get_children_map()
+
+
+class SqlResource(Resource):
+    """Resource of SqlBackend, changes of its parents are saved"""
+    __slots__ = ('_backend', )
+
+    def add_parent(self, parent):
+        new = parent not in self._parents
+        super(SqlResource, self).add_parent(parent)
+        backend = getattr(self, '_backend', None)
+        if new and backend is not None:
+            backend._add_parent('resource', self, parent)
+
+    def remove_parent(self, parent):
+        old = parent in self._parents
+        super(SqlResource, self).remove_parent(parent)
+        backend = getattr(self, '_backend', None)
+        if old and backend is not None:
+            backend._remove_parent('resource', self, parent)
+
+
+class SqlBackend(interfaces.IBackend):
+    """A storage in SQL tables.
+
+    Usage: Acl(backend_factory=partial(SqlBackend, '/var/lib/acl.sqlite'))
+
+    Changes made by other processes are seen for entities not loaded yet,
+    and for rules on the next prefetch.
+    """
+    role_class = SqlRole
+    privilege_class = Privilege
+    resource_class = SqlResource
+    lazy_entities = True
+
+    def __init__(self, connect, pool_size=5, create_tables=True):
+        """Constructor.
+
+        connect is a path of SQLite database, or a factory of DB-API connections.
+        """
+        if isinstance(connect, string_types):
+            connect = partial(sqlite3.connect, connect, check_same_thread=False)
+        self._pool = ConnectionPool(connect, pool_size)
+        self._entities = dict((kind, {}) for kind in KINDS)  # name -> instance
+        self._ids = dict((kind, {}) for kind in KINDS)  # name -> id
+        self._names = {}  # id -> name
+        self._missing = set()  # (kind, name) not in the database, since the last change
+        self._local = local()  # window of prefetched rules
+        self._lock = RLock()
+        self._building = {}  # (kind, name) -> entity being loaded by the thread holding the lock
+        self.version = 0
+        if create_tables:
+            self._write([(statement, ()) for statement in SCHEMA])
+
+    def __deepcopy__(self, memo):
+        """The copy shares the database, entities are loaded again"""
+        obj = memo[id(self)] = copy.copy(self)
+        obj._entities = dict((kind, {}) for kind in KINDS)
+        obj._missing = set()
+        obj._local = local()
+        obj._lock = RLock()
+        obj._building = {}
+        return obj
+
+    def _query(self, sql, params=()):
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def _write(self, statements):
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            for sql, params in statements:
+                cursor.execute(sql, params)
+            connection.commit()
+        self._changed()
+
+    def _changed(self):
+        self.version += 1
+        self._missing = set()
+        self._local.window = None
+
+    def _get_id(self, kind, name, create=False):
+        try:
+            return self._ids[kind][name]
+        except KeyError:
+            pass
+        if (kind, name) not in self._missing or create:
+            if create:
+                self._write([('INSERT OR IGNORE INTO simpleacl_entity (kind, name) VALUES (?, ?)', (kind, name))])
+            rows = self._query('SELECT id FROM simpleacl_entity WHERE kind = ? AND name = ?', (kind, name))
+            if rows:
+                self._ids[kind][name] = rows[0][0]
+                self._names[rows[0][0]] = name
+                return rows[0][0]
+            self._missing.add((kind, name))
+        return None
+
+    def _resolve_ids(self, kind, names):
+        """Returns {id: name} of the names which are in the database, in one query"""
+        ids = self._ids[kind]
+        unknown = [name for name in names if name not in ids and (kind, name) not in self._missing]
+        for i in range(0, len(unknown), MAX_PARAMS):
+            chunk = unknown[i:i + MAX_PARAMS]
+            rows = self._query('SELECT id, name FROM simpleacl_entity WHERE kind = ? AND name IN ({0})'.format(
+                ', '.join('?' * len(chunk))), [kind] + chunk)
+            for pk, name in rows:
+                ids[name] = pk
+                self._names[pk] = name
+            self._missing.update((kind, name) for name in set(chunk) - set(name for pk, name in rows))
+        return dict((ids[name], name) for name in names if name in ids)
+
+    def _add(self, kind, instance):
+        name = instance.get_name()
+        self._get_id(kind, name, create=True)
+        self._entities[kind][name] = instance
+        if kind == 'role' and isinstance(instance, SqlRole):
+            for resource, parents in instance.get_parents_map().items():
+                for parent in parents:
+                    self._add_parent('role', instance, parent, resource)
+            instance._backend = self
+        elif kind == 'resource' and isinstance(instance, SqlResource):
+            for parent in instance.get_parents():
+                self._add_parent('resource', instance, parent)
+            instance._backend = self
+
+    def _get(self, kind, name, exception):
+        try:
+            return self._entities[kind][name]
+        except KeyError:
+            pass
+        if self._get_id(kind, name) is None:
+            raise exception('Missing {0} "{1}"'.format(kind.capitalize(), name))
+        return self._load(kind, name)
+
+    def _load(self, kind, name):
+        """Returns the entity loaded from the database.
+
+        Entities are built under the lock, and published in _entities only
+        once they are linked to their parents, so other threads never see a
+        half-built one.
+        """
+        with self._lock:
+            try:
+                return self._entities[kind][name]  # Loaded by another thread meanwhile
+            except KeyError:
+                pass
+            try:
+                return self._building[(kind, name)]  # Parents referring back to it
+            except KeyError:
+                pass
+            outermost = not self._building
+            try:
+                instance = self._build(kind, name)
+                if outermost:
+                    for (built_kind, built_name), built in self._building.items():
+                        self._entities[built_kind][built_name] = built
+            finally:
+                if outermost:
+                    self._building.clear()
+        return instance
+
+    def _build(self, kind, name):
+        pk = self._ids[kind][name]
+        instance = self._building[(kind, name)] = getattr(self, '{0}_class'.format(kind))(name)
+        if kind == 'role':
+            rows = self._query(
+                'SELECT resource.name, parent.name FROM simpleacl_role_parent rp '
+                'JOIN simpleacl_entity resource ON resource.id = rp.resource_id '
+                'JOIN simpleacl_entity parent ON parent.id = rp.parent_id '
+                'WHERE rp.role_id = ? ORDER BY rp.position', (pk, ))
+            for resource, parent in rows:
+                Role.add_parent(instance, self.get_role(parent), self.get_resource(resource))
+            instance._backend = self
+            if '.' in name:
+                parent = self._entities['role'].get(name.rsplit('.', 1).pop(0))
+                if parent is not None:
+                    parent.add_child(instance)
+        elif kind == 'resource':
+            rows = self._query(
+                'SELECT parent.name FROM simpleacl_resource_parent rp '
+                'JOIN simpleacl_entity parent ON parent.id = rp.parent_id '
+                'WHERE rp.resource_id = ? ORDER BY rp.position', (pk, ))
+            for parent, in rows:
+                Resource.add_parent(instance, self.get_resource(parent))
+            instance._backend = self
+        return instance
+
+    def _load_children(self, role):
+        pk = self._get_id('role', role.get_name())
+        if pk is None:
+            return
+        rows = self._query(
+            'SELECT child.name FROM simpleacl_role_parent rp '
+            'JOIN simpleacl_entity child ON child.id = rp.role_id WHERE rp.parent_id = ?', (pk, ))
+        prefix = role.get_name() + '.'
+        rows += self._query("SELECT name FROM simpleacl_entity WHERE kind = 'role' AND substr(name, 1, ?) = ?",
+                            (len(prefix), prefix))
+        for name, in rows:
+            child = self.get_role(name)
+            if name.startswith(prefix) and '.' not in name[len(prefix):]:
+                role.add_child(child)
+
+    def _get_all(self, kind):
+        rows = self._query('SELECT name FROM simpleacl_entity WHERE kind = ? ORDER BY id', (kind, ))
+        return [self._get(kind, name, exceptions.AclEcxeption) for name, in rows]
+
+    def _remove(self, kind, instance):
+        pk = self._get_id(kind, instance.get_name())
+        if pk is None:
+            return
+        statements = [('DELETE FROM simpleacl_entity WHERE id = ?', (pk, ))]
+        if kind == 'role':
+            statements.append(('DELETE FROM simpleacl_role_parent WHERE role_id = ? OR parent_id = ?', (pk, pk)))
+        elif kind == 'resource':
+            statements += [
+                ('DELETE FROM simpleacl_role_parent WHERE resource_id = ?', (pk, )),
+                ('DELETE FROM simpleacl_resource_parent WHERE resource_id = ? OR parent_id = ?', (pk, pk)),
+            ]
+        self._write(statements)
+        self._entities[kind].pop(instance.get_name(), None)
+        del self._ids[kind][instance.get_name()]
+        del self._names[pk]
+
+    def _add_parent(self, kind, instance, parent, resource=None):
+        pk = self._get_id(kind, instance.get_name(), create=True)
+        parent_pk = self._get_id(kind, parent.get_name(), create=True)
+        if kind == 'role':
+            resource_pk = self._get_id('resource', resource.get_name(), create=True)
+            self._write([(
+                'INSERT OR IGNORE INTO simpleacl_role_parent (role_id, resource_id, parent_id, position) '
+                'SELECT ?, ?, ?, COUNT(*) FROM simpleacl_role_parent WHERE role_id = ? AND resource_id = ?',
+                (pk, resource_pk, parent_pk, pk, resource_pk)
+            )])
+        else:
+            self._write([(
+                'INSERT OR IGNORE INTO simpleacl_resource_parent (resource_id, parent_id, position) '
+                'SELECT ?, ?, COUNT(*) FROM simpleacl_resource_parent WHERE resource_id = ?',
+                (pk, parent_pk, pk)
+            )])
+
+    def _remove_parent(self, kind, instance, parent, resource=None):
+        pk = self._get_id(kind, instance.get_name())
+        parent_pk = self._get_id(kind, parent.get_name())
+        if kind == 'role':
+            self._write([('DELETE FROM simpleacl_role_parent WHERE role_id = ? AND resource_id = ? AND parent_id = ?',
+                          (pk, self._get_id('resource', resource.get_name()), parent_pk))])
+        else:
+            self._write([('DELETE FROM simpleacl_resource_parent WHERE resource_id = ? AND parent_id = ?',
+                          (pk, parent_pk))])
+
+    def add_role(self, instance):
+        """Adds role"""
+        self._add('role', instance)
+
+    def get_role(self, name):
+        """Returns a role instance"""
+        return self._get('role', name, exceptions.MissingRole)
+
+    def get_roles(self):
+        """Returns all role instances"""
+        return self._get_all('role')
+
+    def remove_role(self, instance):
+        """Removes role, but not its rules"""
+        self._remove('role', instance)
+
+    def add_privilege(self, instance):
+        """Adds privilege"""
+        self._add('privilege', instance)
+
+    def get_privilege(self, name):
+        """Returns a privilege instance"""
+        return self._get('privilege', name, exceptions.MissingPrivilege)
+
+    def get_privileges(self):
+        """Returns all privilege instances"""
+        return self._get_all('privilege')
+
+    def remove_privilege(self, instance):
+        """Removes privilege, but not its rules"""
+        self._remove('privilege', instance)
+
+    def add_resource(self, instance):
+        """Adds resource"""
+        self._add('resource', instance)
+
+    def get_resource(self, name):
+        """Returns a resource instance"""
+        return self._get('resource', name, exceptions.MissingResource)
+
+    def get_resources(self):
+        """Returns all resource instances"""
+        return self._get_all('resource')
+
+    def remove_resource(self, instance):
+        """Removes resource, but not its rules"""
+        self._remove('resource', instance)
+
+    def _get_rule_ids(self, role, privilege, resource, create=False):
+        return (self._get_id('role', role.get_name(), create),
+                self._get_id('privilege', privilege.get_name(), create),
+                self._get_id('resource', resource.get_name(), create))
+
+    def add_rule(self, role, privilege, resource, allow=True):
+        """Adds rule to the ACL"""
+        role_pk, privilege_pk, resource_pk = self._get_rule_ids(role, privilege, resource, create=True)
+        self._write([('INSERT OR REPLACE INTO simpleacl_rule (role_id, privilege_id, resource_id, allow) '
+                      'VALUES (?, ?, ?, ?)', (role_pk, privilege_pk, resource_pk, json.dumps(allow)))])
+        return self
+
+    def remove_rule(self, role, privilege, resource, allow=True):
+        """Removes rule from ACL"""
+        ids = self._get_rule_ids(role, privilege, resource)
+        if None not in ids:
+            self._write([('DELETE FROM simpleacl_rule WHERE role_id = ? AND privilege_id = ? AND resource_id = ? '
+                          'AND allow = ?', ids + (json.dumps(allow), ))])
+        return self
+
+    def prefetch_rules(self, roles, privileges, resources):
+        """Fetches the rules for all combinations of given names at once.
+
+        is_allowed() answers from them, until the next prefetch or change.
+        """
+        role_ids = self._resolve_ids('role', roles)
+        privilege_ids = self._resolve_ids('privilege', privileges)
+        resource_ids = self._resolve_ids('resource', resources)
+        rules = {}
+        if role_ids and privilege_ids and resource_ids:
+            role_list = list(role_ids)
+            step = max(1, MAX_PARAMS - len(privilege_ids) - len(resource_ids))
+            for i in range(0, len(role_list), step):
+                chunk = role_list[i:i + step]
+                rows = self._query(
+                    'SELECT role_id, privilege_id, resource_id, allow FROM simpleacl_rule '
+                    'WHERE role_id IN ({0}) AND privilege_id IN ({1}) AND resource_id IN ({2})'.format(
+                        ', '.join('?' * len(chunk)), ', '.join('?' * len(privilege_ids)),
+                        ', '.join('?' * len(resource_ids))
+                    ), chunk + list(privilege_ids) + list(resource_ids))
+                for role_pk, privilege_pk, resource_pk, allow in rows:
+                    rules[(role_ids[role_pk], privilege_ids[privilege_pk], resource_ids[resource_pk])] = json.loads(allow)
+        self._local.window = (self.version, set(roles), set(privileges), set(resources), rules)
+
+    def is_allowed(self, role, privilege, resource, undef=None):
+        """Returns True if role is allowed for given arguments"""
+        key = (role.get_name(), privilege.get_name(), resource.get_name())
+        window = getattr(self._local, 'window', None)
+        if (window is not None and window[0] == self.version and
+                key[0] in window[1] and key[1] in window[2] and key[2] in window[3]):
+            return window[4].get(key, undef)
+        ids = self._get_rule_ids(role, privilege, resource)
+        if None in ids:
+            return undef
+        rows = self._query('SELECT allow FROM simpleacl_rule WHERE role_id = ? AND privilege_id = ? '
+                           'AND resource_id = ?', ids)
+        return json.loads(rows[0][0]) if rows else undef
+
+    def get_rules(self):
+        """Returns all (role, privilege, resource, allow)"""
+        rows = self._query(
+            'SELECT role.name, privilege.name, resource.name, rule.allow FROM simpleacl_rule rule '
+            'JOIN simpleacl_entity role ON role.id = rule.role_id '
+            'JOIN simpleacl_entity privilege ON privilege.id = rule.privilege_id '
+            'JOIN simpleacl_entity resource ON resource.id = rule.resource_id')
+        return [(self.get_role(role), self.get_privilege(privilege), self.get_resource(resource), json.loads(allow))
+                for role, privilege, resource, allow in rows]
+
+    def _get_rule_column(self, column, kind, filters):
+        """Returns the entities of column of the rules matching {column: names} filters.
+
+        The longest list of ids is chunked to keep each query within MAX_PARAMS.
+        """
+        columns, id_lists = [], []
+        for filter_column, filter_kind, names in filters:
+            ids = list(self._resolve_ids(filter_kind, [getattr(i, 'name', i) for i in names]))
+            if not ids:
+                return []
+            columns.append(filter_column)
+            id_lists.append(ids)
+        longest = max(range(len(id_lists)), key=lambda i: len(id_lists[i]))
+        step = max(1, MAX_PARAMS - sum(len(ids) for ids in id_lists) + len(id_lists[longest]))
+        found, seen = [], set()
+        for i in range(0, len(id_lists[longest]), step):
+            chunks = list(id_lists)
+            chunks[longest] = id_lists[longest][i:i + step]
+            rows = self._query('SELECT DISTINCT entity.name FROM simpleacl_rule '
+                               'JOIN simpleacl_entity entity ON entity.id = simpleacl_rule.{0} WHERE {1}'.format(
+                                   column, ' AND '.join('{0} IN ({1})'.format(filter_column, ', '.join('?' * len(ids)))
+                                                        for filter_column, ids in zip(columns, chunks))),
+                               sum(chunks, []))
+            for name, in rows:
+                if name not in seen:
+                    seen.add(name)
+                    found.append(name)
+        getter = getattr(self, 'get_{0}'.format(kind))
+        return [getter(name) for name in found]
+
+    def get_rule_roles(self, resources, privileges):
+        """Returns the roles which have rules for any of given resources and privileges"""
+        return self._get_rule_column('role_id', 'role', (('resource_id', 'resource', resources),
+                                                         ('privilege_id', 'privilege', privileges)))
+
+    def get_rule_resources(self, roles, privileges):
+        """Returns the resources which have rules for any of given roles and privileges"""
+        return set(self._get_rule_column('resource_id', 'resource', (('role_id', 'role', roles),
+                                                                    ('privilege_id', 'privilege', privileges))))
+
+    def close(self):
+        self._pool.close()
@@ -0,0 +1,70 @@
+"""Decision stores shared by processes, see simpleacl.interfaces.IDecisionStore."""
+from __future__ import absolute_import, unicode_literals
+import sqlite3
+from threading import local
+from simpleacl import interfaces
+
+
+class SqliteDecisionStore(interfaces.IDecisionStore):
+    """Decisions in a local SQLite file, shared by all processes of the host.
+
+    Only decisions of the latest version are kept. Errors of the database
+    (e.g. it's locked for longer than timeout) are treated as misses.
+    """
+    def __init__(self, path, max_size=1000000, timeout=0.1):
+        self._path = path
+        self._max_size = max_size
+        self._timeout = timeout
+        self._local = local()
+        self._version = None
+        self._sets = 0
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = sqlite3.connect(
+                self._path, timeout=self._timeout, isolation_level=None, check_same_thread=False
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS simpleacl_decision '
+                               '(key TEXT PRIMARY KEY, version TEXT NOT NULL, allow INTEGER NOT NULL)')
+        return connection
+
+    def get(self, version, key):
+        try:
+            row = self._connect().execute('SELECT allow FROM simpleacl_decision WHERE key = ? AND version = ?',
+                                          (key, version)).fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return None if row is None else bool(row[0])
+
+    def set(self, version, key, allow):
+        try:
+            connection = self._connect()
+            if version != self._version:
+                connection.execute('DELETE FROM simpleacl_decision WHERE version != ?', (version, ))
+                self._version = version
+            connection.execute('INSERT OR REPLACE INTO simpleacl_decision (key, version, allow) VALUES (?, ?, ?)',
+                               (key, version, int(bool(allow))))
+            self._sets += 1
+            if self._sets % 1000 == 0:
+                self.trim()
+        except sqlite3.OperationalError:
+            pass
+
+    def trim(self):
+        """Drops the oldest decisions beyond max_size"""
+        self._connect().execute(
+            'DELETE FROM simpleacl_decision WHERE rowid <= '
+            '(SELECT MAX(rowid) FROM simpleacl_decision) - ?', (self._max_size, )
+        )
+
+    def clear(self):
+        self._connect().execute('DELETE FROM simpleacl_decision')
+
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
@@ -0,0 +1,160 @@
+"""ACLs of many tenants over one shared base policy.
+
+    registry = TenantRegistry(base_policy, load_tenant, memory_budget=256 * 1024 * 1024)
+    registry.get(tenant_id).is_allowed('user_15', 'edit', 'blog.post.15')
+"""
+from __future__ import absolute_import, unicode_literals
+import sys
+import types
+import weakref
+from collections import OrderedDict
+from functools import partial
+from threading import RLock
+from simpleacl import interfaces, walkers
+from simpleacl.acl import Acl
+
+NOT_OWNED = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType, partial,
+             interfaces.IAcl, interfaces.IAclWalker, interfaces.IRoleParentsWalker)
+WEAK = (weakref.ref, weakref.WeakValueDictionary, weakref.WeakKeyDictionary, weakref.WeakSet)
+
+
+def get_size(acl, shared=frozenset()):
+    """Returns the estimated bytes held by the ACL.
+
+    Objects with ids in shared, other ACLs (e.g. the parent), walkers and
+    functions are not counted. Referents of weak containers aren't either.
+    """
+    total = 0
+    seen = set(shared)
+    stack = [acl]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or (obj is not acl and isinstance(obj, NOT_OWNED)):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj, 0)
+        if isinstance(obj, WEAK):
+            continue
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        else:
+            stack.extend(getattr(obj, '__dict__', {}).values())
+            for cls in type(obj).__mro__:
+                for slot in getattr(cls, '__slots__', ()):
+                    if slot not in ('__dict__', '__weakref__'):
+                        stack.append(getattr(obj, slot, None))
+    return total
+
+
+class TenantRegistry(object):
+    """ACLs of tenants over one shared base ACL.
+
+    The base holds the roles, resources and rules common to all tenants,
+    it's compiled by default. The ACL of a tenant is a small delta whose
+    parent is the base, filled by loader(acl, tenant) on first get().
+    Least recently used tenants are dropped while the estimated size of
+    all deltas exceeds memory_budget bytes.
+    """
+
+    def __init__(self, base, loader, memory_budget=64 * 1024 * 1024, **options):
+        """Constructor.
+
+        base is an Acl, or a policy for Acl.create_instance(base, compiled=True).
+        options are keyword arguments of the tenant ACLs, e.g. cache_size.
+        """
+        if not isinstance(base, Acl):
+            base = Acl.create_instance(base, compiled=True)
+        self.base = base
+        self._loader = loader
+        self._memory_budget = memory_budget
+        # Checks of all tenants pass the same instances of "any", so they share the tables of the base
+        self._options = dict({'walker': walkers.overlay_acl_walker}, **options)
+        self._options['default_entities'] = False
+        self._tenants = OrderedDict()  # tenant -> [acl, size, revision of the measure], in order of use
+        self._size = 0
+        self._shared = None  # (revision of the base, ids of its entities)
+        self._lock = RLock()
+        self.loads = 0
+        self.evictions = 0
+
+    def get(self, tenant):
+        """Returns the ACL of the tenant, it's loaded when needed"""
+        with self._lock:
+            entry = self._tenants.pop(tenant, None)
+            if entry is not None:
+                self._tenants[tenant] = entry
+                if self._measure(entry):
+                    self._evict()
+                return entry[0]
+        acl = self._create()
+        self._loader(acl, tenant)
+        with self._lock:
+            entry = self._tenants.get(tenant)
+            if entry is not None:  # Loaded by another thread meanwhile
+                return entry[0]
+            entry = self._tenants[tenant] = [acl, 0, None]
+            self.loads += 1
+            self._measure(entry)
+            self._evict()
+        return acl
+
+    def evict(self, tenant):
+        """Drops the ACL of the tenant, it's loaded again by the next get()"""
+        with self._lock:
+            entry = self._tenants.pop(tenant, None)
+            if entry is not None:
+                self._size -= entry[1]
+
+    def memory_usage(self):
+        """Returns {tenant: estimated bytes} of the loaded tenants"""
+        with self._lock:
+            for entry in self._tenants.values():
+                self._measure(entry)
+            return dict((tenant, entry[1]) for tenant, entry in self._tenants.items())
+
+    def get_stats(self):
+        """Returns counters of the registry"""
+        with self._lock:
+            return {
+                'tenants': len(self._tenants),
+                'bytes': self._size,
+                'memory_budget': self._memory_budget,
+                'loads': self.loads,
+                'evictions': self.evictions,
+            }
+
+    def _create(self):
+        acl = Acl(**self._options)
+        acl.parent = self.base
+        return acl
+
+    def _measure(self, entry):
+        """Updates the size of the tenant if its ACL has changed, returns True if it has"""
+        acl = entry[0]
+        revision = (acl._revision, getattr(acl._backend, 'version', None))
+        if revision == entry[2]:
+            return False
+        size = get_size(acl, self._get_shared())
+        self._size += size - entry[1]
+        entry[1], entry[2] = size, revision
+        return True
+
+    def _get_shared(self):
+        revision = self.base.get_revision()
+        if self._shared is None or self._shared[0] != revision:
+            ids = set()
+            for acl in self.base._get_chain():
+                for getter in (acl._backend.get_roles, acl._backend.get_privileges, acl._backend.get_resources):
+                    ids.update(id(i) for i in getter())
+            self._shared = (revision, frozenset(ids))
+        return self._shared[1]
+
+    def _evict(self):
+        """Drops least recently used tenants, but not the last one, until the budget is met"""
+        while self._size > self._memory_budget and len(self._tenants) > 1:
+            tenant, entry = self._tenants.popitem(last=False)
+            self._size -= entry[1]
+            self.evictions += 1
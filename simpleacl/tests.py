@@ -1,8 +1,18 @@
 from __future__ import absolute_import, unicode_literals
+import copy
+import gc
+import io
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
 import unittest
+import weakref
+from functools import partial
 
 if __name__ == '__main__':
-    import os
     import sys
     sys.path.insert(0, os.path.dirname(
         os.path.dirname(os.path.abspath(__file__))
@@ -10,7 +20,72 @@ if __name__ == '__main__':
 
 import simpleacl
 from simpleacl.exceptions import MissingRole, MissingPrivilege
-from simpleacl import json
+from simpleacl import json, loader, paste, settings, snapshot, sql, stores, tenants, utils, walkers
+
+try:
+    import asyncio
+    from simpleacl import aio
+except (ImportError, SyntaxError):
+    aio = None  # Python 2.*
+
+POLICY = {
+    'roles': [
+        'moderator',
+        'author',
+        'authenticated',
+        'staff.editor',
+        ['user_1', {'any': ['authenticated'],
+                    'blog': ['moderator']}],
+        ['user_2', {'any': ['authenticated'],
+                    'blog.post.2': ['author']}],
+        ['user_3', {'any': ['authenticated', 'staff.editor'],
+                    'blog.post.2': ['moderator']}],
+    ],
+    'privileges': [
+        'browse.blog.post',
+        'view.blog.post',
+        'add.blog.post',
+        'edit.blog.post',
+        'delete.blog.post',
+    ],
+    'resources': ['blog.post.1', 'blog.post.2', 'blog.post.3', 'board.message.3',
+                  ['board.draft.4', ['blog.post.2']]],
+    'acl': {
+        'any': {
+            'authenticated': {'browse.blog.post': True},
+            'staff': {'view': True},
+        },
+        'blog.post': {
+            'moderator': {'browse': True,
+                          'view': True,
+                          'edit': True},
+            'author': {'browse.blog.post': True,
+                       'view.blog.post': True,
+                       'edit.blog.post': True},
+        },
+        'blog.post.3': {
+            'moderator': {'edit': False},
+        },
+    }
+}
+
+
+def iter_questions(acl):
+    for role in sorted(acl._backend._roles):
+        for privilege in sorted(acl._backend._privileges):
+            for resource in sorted(acl._backend._resources):
+                yield role, privilege, resource
+
+DYNAMIC = {'allow': True}
+
+
+def dynamic_rule(acl, role, privilege, resource):
+    return DYNAMIC['allow']
+
+
+def async_rule(acl, role, privilege, resource):
+    DYNAMIC.setdefault('calls', []).append(role.get_name())
+    return asyncio.sleep(0.01, result=DYNAMIC['allow'])
 
 
 class TestSimpleAcl(unittest.TestCase):
@@ -229,5 +304,1180 @@ class TestSimpleAcl(unittest.TestCase):
         self.assertFalse(acl.is_allowed('user_3', 'edit.blog.post', 'blog.post'))
         self.assertFalse(acl.is_allowed('user_3', 'edit.blog.post', 'blog'))
 
+
+class TestCompiledAcl(unittest.TestCase):
+
+    def setUp(self):
+        self.acl = simpleacl.Acl.create_instance(POLICY)
+        self.compiled = simpleacl.Acl.create_instance(POLICY, compiled=True)
+
+    def test_same_answers(self):
+        for question in iter_questions(self.acl):
+            self.assertEqual(self.acl.is_allowed(*question),
+                             self.compiled.is_allowed(*question), question)
+
+    def test_mutation_rebuilds_tables(self):
+        self.assertFalse(self.compiled.is_allowed('user_2', 'delete.blog.post', 'blog.post.2'))
+        self.compiled.allow('author', 'delete', 'blog.post')
+        self.assertTrue(self.compiled.is_allowed('user_2', 'delete.blog.post', 'blog.post.2'))
+        self.compiled.add_role('user_4', ['author'])
+        self.compiled.add_resource('blog.post.5')
+        self.assertTrue(self.compiled.is_allowed('user_4', 'delete.blog.post', 'blog.post.5'))
+        self.compiled.remove_allow('author', 'delete', 'blog.post')
+        self.assertFalse(self.compiled.is_allowed('user_4', 'delete.blog.post', 'blog.post.5'))
+
+    def test_parent_acl(self):
+        subacl = simpleacl.Acl(compiled=True)
+        subacl.parent = self.compiled
+        subacl.add_role('user_5', ['moderator'])
+        self.assertTrue(subacl.is_allowed('user_5', 'edit.blog.post', 'blog.post.1'))
+        self.assertFalse(subacl.is_allowed('user_5', 'edit.blog.post', 'blog.post.3'))
+        self.compiled.deny('moderator', 'edit', 'blog.post.1')
+        self.assertFalse(subacl.is_allowed('user_5', 'edit.blog.post', 'blog.post.1'))
+
+
+class TestMroCache(unittest.TestCase):
+
+    def setUp(self):
+        self.acl = simpleacl.Acl.create_instance(POLICY)
+
+    def test_cache_hit(self):
+        self.acl.is_allowed('user_2', 'edit.blog.post', 'blog.post.2')
+        generation = utils.mro_cache.generation
+        entries = len(utils.mro_cache._entries)
+        self.acl.is_allowed('user_2', 'edit.blog.post', 'blog.post.2')
+        self.assertEqual(utils.mro_cache.generation, generation)
+        self.assertEqual(len(utils.mro_cache._entries), entries)
+
+    def test_new_role_keeps_cache(self):
+        self.acl.is_allowed('user_2', 'edit.blog.post', 'blog.post.2')
+        generation = utils.mro_cache.generation
+        self.acl.add_role('user_9', ['author'])
+        self.acl.add_resource('blog.post.9')
+        self.assertEqual(utils.mro_cache.generation, generation)
+
+    def test_parent_change_drops_cache(self):
+        for acl in (self.acl, simpleacl.Acl.create_instance(POLICY, compiled=True)):
+            self.assertFalse(acl.is_allowed('user_2', 'edit.blog.post', 'blog.post.1'))
+            generation = utils.mro_cache.generation
+            acl.get_role('user_2').add_parent(acl.get_role('moderator'), acl.get_resource('blog.post.1'))
+            self.assertNotEqual(utils.mro_cache.generation, generation)
+            self.assertTrue(acl.is_allowed('user_2', 'edit.blog.post', 'blog.post.1'))
+
+    def test_concurrent_clear_isnt_stored(self):
+        cache = utils.MroCache()
+        role = simpleacl.Role('user_9')
+
+        def bases_getter(current):
+            thread = threading.Thread(target=cache.clear)  # Another thread changes parents meanwhile
+            thread.start()
+            thread.join()
+            return []
+
+        self.assertEqual(cache.get_mro((role, ), role, bases_getter), [role])
+        self.assertEqual(cache._entries, {})
+        self.assertEqual(cache.get_mro((role, ), role, lambda current: []), [role])
+        self.assertEqual(len(cache._entries), 1)
+
+    def test_dotted_ancestor_added_later(self):
+        base = simpleacl.Acl()
+        base.add_role('staff')
+        base.add_privilege('edit')
+        base.add_resource('a')
+        base.allow('staff', 'edit', 'a')
+        overlay = simpleacl.Acl()
+        overlay.parent = base
+        overlay.add_resource('a.b.c')
+        self.assertTrue(overlay.is_allowed('staff', 'edit', 'a.b.c'))
+        base.add_resource('a.b')
+        base.deny('staff', 'edit', 'a.b')
+        self.assertFalse(overlay.is_allowed('staff', 'edit', 'a.b.c'))
+
+    def test_overlay_keeps_cache(self):
+        other = simpleacl.Acl.create_instance(POLICY, compiled=True)
+        self.acl.is_allowed('user_2', 'edit.blog.post', 'blog.post.2')
+        other.is_allowed('user_2', 'edit.blog.post', 'blog.post.2')
+        generation = utils.mro_cache.generation
+        revision = other.get_revision()
+        for i in range(3):
+            overlay = simpleacl.Acl()
+            overlay.parent = self.acl
+            overlay.add_role('user_9', ['author'])
+            overlay.add_resource('blog.post.9')
+            self.assertTrue(overlay.is_allowed('user_9', 'edit.blog.post', 'blog.post.9'))
+        self.assertEqual(utils.mro_cache.generation, generation)
+        self.assertEqual(other.get_revision(), revision)
+        self.assertFalse(overlay.is_allowed('user_2', 'edit.blog.post', 'blog.post.1'))
+        self.acl.get_role('user_2').add_parent(self.acl.get_role('moderator'), self.acl.get_resource('blog.post.1'))
+        self.assertEqual(other.get_revision(), revision)
+        self.assertTrue(overlay.is_allowed('user_2', 'edit.blog.post', 'blog.post.1'))
+
+
+class TestDecisionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.acl = simpleacl.Acl.create_instance(POLICY, cache_size=3)
+
+    def test_hits_and_eviction(self):
+        self.assertTrue(self.acl.is_allowed('user_2', 'edit.blog.post', 'blog.post.2'))
+        self.assertTrue(self.acl.is_allowed('user_2', 'edit.blog.post', 'blog.post.2'))
+        self.assertEqual(self.acl.get_cache_stats()['hits'], 1)
+        for resource in ('blog.post.1', 'blog.post.3', 'board.message.3'):
+            self.acl.is_allowed('user_1', 'edit.blog.post', resource)
+        self.assertEqual(self.acl.get_cache_stats()['size'], 3)
+        self.assertTrue(self.acl.is_allowed('user_2', 'edit.blog.post', 'blog.post.2'))
+        self.assertEqual(self.acl.get_cache_stats()['hits'], 1)
+
+    def test_backend_change_invalidates(self):
+        self.assertFalse(self.acl.is_allowed('user_2', 'delete.blog.post', 'blog.post.2'))
+        self.acl._backend.add_rule(self.acl.get_role('user_2'),
+                                   self.acl.get_privilege('delete'),
+                                   self.acl.get_resource('blog.post.2'))
+        self.assertTrue(self.acl.is_allowed('user_2', 'delete.blog.post', 'blog.post.2'))
+        self.acl.add_role('user_2', {'blog.post.3': ['moderator']})
+        self.assertTrue(self.acl.is_allowed('user_2', 'view.blog.post', 'blog.post.3'))
+
+    def test_repeated_registration_keeps_cache(self):
+        self.acl.is_allowed('user_2', 'edit.blog.post', 'blog.post.2')
+        self.acl.add_privilege('edit.blog.post')
+        self.acl.add_resource('blog.post.2')
+        self.acl.allow('author', 'edit.blog.post', 'blog.post')
+        self.acl.is_allowed('user_2', 'edit.blog.post', 'blog.post.2')
+        self.assertEqual(self.acl.get_cache_stats()['hits'], 1)
+
+    def test_callable_rules_are_not_cached(self):
+        self.acl.allow('user_3', 'delete', 'blog.post.3')
+        self.acl.add_rule('user_3', 'delete', 'blog.post.3', 'simpleacl.tests.dynamic_rule')
+        self.assertTrue(self.acl.is_allowed('user_3', 'delete.blog.post', 'blog.post.3'))
+        DYNAMIC['allow'] = False
+        try:
+            self.assertFalse(self.acl.is_allowed('user_3', 'delete.blog.post', 'blog.post.3'))
+        finally:
+            DYNAMIC['allow'] = True
+        self.assertEqual(self.acl.get_cache_stats()['size'], 0)
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.acl = simpleacl.Acl.create_instance(POLICY)
+
+    def test_same_answers(self):
+        questions = list(iter_questions(self.acl))
+        self.assertEqual(self.acl.is_allowed_many(questions),
+                         [self.acl.is_allowed(*question) for question in questions])
+
+    def test_filter_allowed(self):
+        resources = ['blog.post.1', 'blog.post.2', 'blog.post.3', 'board.message.3', None]
+        self.assertEqual(self.acl.filter_allowed('user_2', 'edit.blog.post', resources),
+                         ['blog.post.2'])
+        self.assertEqual(self.acl.get_bound_role('user_1').filter_allowed('edit.blog.post', resources),
+                         ['blog.post.1', 'blog.post.2'])
+
+
+class TestAllowedResources(unittest.TestCase):
+
+    def setUp(self):
+        self.acl = simpleacl.Acl.create_instance(POLICY)
+
+    def brute_force(self, acl, role, privilege, prefix=None):
+        return set(name for name in acl._backend._resources
+                   if (prefix is None or name == prefix or name.startswith(prefix + '.')) and
+                   acl.is_allowed(role, privilege, name))
+
+    def test_same_answers(self):
+        for role in self.acl._backend._roles:
+            for privilege in self.acl._backend._privileges:
+                self.assertEqual(self.acl.allowed_resources(role, privilege),
+                                 self.brute_force(self.acl, role, privilege))
+
+    def test_prefix(self):
+        self.assertEqual(self.acl.allowed_resources('user_1', 'edit.blog.post', 'blog.post'),
+                         set(['blog.post', 'blog.post.1', 'blog.post.2']))
+        self.assertEqual(self.acl.allowed_resources('user_3', 'view', 'blog'),
+                         self.brute_force(self.acl, 'user_3', 'view', 'blog'))
+
+    def test_parent_acl(self):
+        subacl = simpleacl.Acl()
+        subacl.parent = self.acl
+        subacl.add_role('user_5', {'blog.post.1': ['author']})
+        subacl.add_resource('blog.post.6')
+        subacl.allow('user_5', 'delete', 'blog.post.6')
+        self.assertEqual(subacl.allowed_resources('user_5', 'delete.blog.post'), set(['blog.post.6']))
+        self.assertEqual(subacl.allowed_resources('user_5', 'edit.blog.post'), set(['blog.post.1']))
+
+    def test_dotted_parent_with_explicit_parents(self):
+        self.acl.add_resource('blog.post', ['shop'])
+        self.acl.add_resource('blog.post.9')
+        self.acl.allow('user_2', 'edit', 'shop')
+        self.assertFalse(self.acl.is_allowed('user_2', 'edit.blog.post', 'blog.post.9'))
+        for privilege in ('edit', 'edit.blog.post'):
+            self.assertEqual(self.acl.allowed_resources('user_2', privilege),
+                             self.brute_force(self.acl, 'user_2', privilege))
+
+    def test_cyclic_resources(self):
+        for allowed in ('a', 'a.b', 'a.b.c', 'c', 'c.b'):
+            acl = simpleacl.Acl()
+            acl.add_role('user')
+            acl.add_privilege('view')
+            for name in ('a', 'a.b', 'a.b.c', 'a.b.c.c', 'c', 'c.b'):
+                acl.add_resource(name)
+            # a.b.c.c -> a.b.c -> a.b -> c.b -> c -> a.b.c.c by dotted names and explicit parents
+            acl.add_resource('a.b', ['c.b'])
+            acl.add_resource('c', ['a.b.c.c'])
+            acl.allow('user', 'view', allowed)
+            self.assertEqual(acl.allowed_resources('user', 'view'), self.brute_force(acl, 'user', 'view'))
+
+
+class TestRolesWithAccess(unittest.TestCase):
+
+    def setUp(self):
+        self.acl = simpleacl.Acl.create_instance(POLICY)
+
+    def brute_force(self, acl, privilege, resource):
+        return set(name for name in acl._backend._roles if acl.is_allowed(name, privilege, resource))
+
+    def test_same_answers(self):
+        for privilege in self.acl._backend._privileges:
+            for resource in self.acl._backend._resources:
+                self.assertEqual(self.acl.roles_with_access(privilege, resource),
+                                 self.brute_force(self.acl, privilege, resource))
+
+    def test_children_index(self):
+        moderator = self.acl.get_role('moderator')
+        children = moderator.get_children_map()
+        self.assertEqual([i.get_name() for i in children[self.acl.get_resource('blog')]], ['user_1'])
+        self.assertEqual([i.get_name() for i in self.acl.get_role('staff').get_children_map()[None]],
+                         ['staff.editor'])
+
+    def test_parent_acl(self):
+        subacl = simpleacl.Acl()
+        subacl.parent = self.acl
+        subacl.add_role('user_5', ['moderator'])
+        self.assertEqual(subacl.roles_with_access('edit.blog.post', 'blog.post.1'),
+                         set(['author', 'moderator', 'user_1', 'user_5']))
+        self.assertEqual(self.acl.roles_with_access('edit.blog.post', 'blog.post.1'),
+                         set(['author', 'moderator', 'user_1']))
+
+    def test_chain(self):
+        middle = simpleacl.Acl()
+        middle.parent = self.acl
+        child = simpleacl.Acl()
+        child.parent = middle
+        child.add_role('r1.a.b')
+        child.add_role('user_6', ['r2'])
+        child.add_privilege('edit.blog.post.title')
+        middle.add_role('r1.a')
+        middle.allow('r1.a', 'edit', 'blog.post.2')
+        middle.add_role('r2', ['author'])
+        self.acl.add_role('r1')
+        self.acl.deny('r1', 'edit', 'blog.post.3')
+        names = set(name for acl in child._get_chain() for name in acl._backend._roles)
+        for privilege in ('edit', 'edit.blog.post', 'edit.blog.post.title'):
+            for resource in ('blog.post.1', 'blog.post.2', 'blog.post.3'):
+                self.assertEqual(child.roles_with_access(privilege, resource),
+                                 set(name for name in names if child.is_allowed(name, privilege, resource)),
+                                 (privilege, resource))
+
+
+class TestCompactBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.acl = simpleacl.Acl.create_instance(POLICY)
+        self.compact = simpleacl.Acl(simpleacl.CompactBackend)
+        self.compact.bulk_load(POLICY)
+
+    def test_same_answers(self):
+        for question in iter_questions(self.acl):
+            self.assertEqual(self.acl.is_allowed(*question),
+                             self.compact.is_allowed(*question), question)
+
+    def test_reverse_queries(self):
+        self.assertEqual(self.compact.allowed_resources('user_1', 'edit.blog.post'),
+                         self.acl.allowed_resources('user_1', 'edit.blog.post'))
+        self.assertEqual(self.compact.roles_with_access('edit.blog.post', 'blog.post.2'),
+                         self.acl.roles_with_access('edit.blog.post', 'blog.post.2'))
+
+    def test_remove_rule(self):
+        self.compact.remove_allow('author', 'edit.blog.post', 'blog.post')
+        self.assertFalse(self.compact.is_allowed('user_2', 'edit.blog.post', 'blog.post.2'))
+
+    def test_slots(self):
+        for entity in (simpleacl.Role('a'), simpleacl.Privilege('b'), simpleacl.Resource('c'),
+                       simpleacl.CompactRole('a'), simpleacl.CompactPrivilege('b'), simpleacl.CompactResource('c')):
+            self.assertFalse(hasattr(entity, '__dict__'))
+
+    def test_entities_on_demand(self):
+        resource = weakref.ref(self.compact.get_resource('blog.post.3'))
+        gc.collect()
+        self.assertTrue(resource() is None)
+        resource = self.compact.get_resource('blog.post.3')
+        self.assertEqual(resource, 'blog.post.3')
+        self.assertTrue(resource._acl() is self.compact)
+        self.assertTrue(self.compact.get_resource('blog.post.3') is resource)
+
+        self.compact.add_role('late')
+        self.compact.add_resource('blog.post.5')
+        self.compact.add_role('later', {'blog.post.5': ['late']})
+        self.compact.add_resource('blog.post.5', ['blog.post.3'])
+        gc.collect()
+        self.assertEqual(self.compact.get_role('late').get_children_map(),
+                         {self.compact.get_resource('blog.post.5'): ['later']})
+        self.assertEqual(self.compact.get_resource('blog.post.5').get_parents(), ('blog.post.3',))
+
+    def test_dotted_children_kept(self):
+        acl = simpleacl.Acl(simpleacl.CompactBackend)
+        acl.add_role('staff.editor')
+        acl.add_privilege('view')
+        acl.allow('staff', 'view')
+        gc.collect()
+        self.assertEqual(acl.roles_with_access('view'), set(['staff', 'staff.editor']))
+        self.assertEqual(self.compact.roles_with_access('view.blog.post', 'blog.post.1'),
+                         self.acl.roles_with_access('view.blog.post', 'blog.post.1'))
+
+    def test_copy(self):
+        copied = self.compact.copy()
+        copied.allow('user_2', 'delete', 'blog.post.2')
+        self.assertTrue(copied.is_allowed('user_2', 'delete.blog.post', 'blog.post.2'))
+        self.assertFalse(self.compact.is_allowed('user_2', 'delete.blog.post', 'blog.post.2'))
+        for question in iter_questions(self.acl):
+            self.assertEqual(self.acl.is_allowed(*question), self.compact.is_allowed(*question), question)
+
+
+class TestLazyRoleBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.acl = simpleacl.Acl.create_instance(POLICY)
+        self.acl.allow('user_1', 'delete.blog.post', 'blog.post.1')
+        self.users = dict(i for i in POLICY['roles'] if utils.is_list(i))
+        self.loads = []
+        self.now = [0]
+        policy = dict(POLICY, roles=[i for i in POLICY['roles'] if not utils.is_list(i)])
+        self.lazy = simpleacl.Acl.create_instance(policy, backend_factory=partial(
+            simpleacl.LazyRoleBackend, loader=self.load, max_size=2, ttl=60, clock=lambda: self.now[0]
+        ))
+
+    def load(self, acl, name):
+        self.loads.append(name)
+        if name in self.users:
+            acl.add_role(name, self.users[name])
+            if name == 'user_1':
+                acl.allow(name, 'delete.blog.post', 'blog.post.1')
+
+    def test_same_answers(self):
+        for question in iter_questions(self.acl):
+            self.assertEqual(self.acl.is_allowed(*question), self.lazy.is_allowed(*question), question)
+        self.assertEqual(self.loads, ['user_1', 'user_2', 'user_3'])
+
+    def test_eviction(self):
+        backend = self.lazy._backend
+        self.assertTrue(self.lazy.is_allowed('user_1', 'delete.blog.post', 'blog.post.1'))
+        version = backend.version
+        self.lazy.get_role('user_2')
+        self.lazy.get_role('user_3')
+        self.assertEqual(sorted(i.get_name() for i in backend.get_roles() if i.get_name().startswith('user_')),
+                         ['user_2', 'user_3'])
+        self.assertFalse(backend.has_rules(simpleacl.Role('user_1')))
+        self.assertEqual(backend.version, version)
+        self.assertTrue(self.lazy.is_allowed('user_1', 'delete.blog.post', 'blog.post.1'))
+        self.assertEqual(self.loads, ['user_1', 'user_2', 'user_3', 'user_1'])
+        self.assertEqual(self.lazy.get_role('staff.editor').get_name(), 'staff.editor')
+        self.assertRaises(MissingRole, self.lazy.get_role, 'user_4')
+
+    def test_ttl(self):
+        role = self.lazy.get_role('user_1')
+        self.now[0] = 30
+        self.assertTrue(self.lazy.get_role('user_1') is role)
+        self.now[0] = 61
+        self.assertFalse(self.lazy.get_role('user_1') is role)
+        self.assertEqual(self.loads, ['user_1', 'user_1'])
+
+
+class TestSharedAcl(unittest.TestCase):
+
+    def setUp(self):
+        self.old_settings = settings.INITIAL_DATA, settings.SHARED_ACL
+        settings.INITIAL_DATA, settings.SHARED_ACL = POLICY, True
+        paste.shared_acl.reset()
+        paste._ctx.__dict__.clear()
+
+    def tearDown(self):
+        settings.INITIAL_DATA, settings.SHARED_ACL = self.old_settings
+        paste.shared_acl.reset()
+        paste._ctx.__dict__.clear()
+        paste._policy['updated'] = False
+
+    def test_copy(self):
+        acl = simpleacl.Acl.create_instance(POLICY)
+        copied = acl.copy()
+        copied.allow('user_2', 'delete', 'blog.post.2')
+        self.assertTrue(copied.is_allowed('user_2', 'delete.blog.post', 'blog.post.2'))
+        self.assertFalse(acl.is_allowed('user_2', 'delete.blog.post', 'blog.post.2'))
+
+    def test_copy_on_write(self):
+        shared = paste.SharedAcl(lambda: simpleacl.Acl.create_instance(POLICY))
+        snapshot = shared.get()
+        self.assertTrue(shared.get() is snapshot)
+        shared.update(lambda acl: acl.allow('user_2', 'delete', 'blog.post.2'))
+        self.assertFalse(snapshot.is_allowed('user_2', 'delete.blog.post', 'blog.post.2'))
+        self.assertTrue(shared.get().is_allowed('user_2', 'delete.blog.post', 'blog.post.2'))
+
+    def test_get_acl(self):
+        acl = paste.get_acl()
+        self.assertTrue(acl is paste.get_acl())
+        self.assertTrue(acl.parent is paste.shared_acl.get())
+        acl.add_role('user_7', ['moderator'])
+        acl.add_resource('blog.post.7')
+        acl.add_privilege('edit.blog.post.title')
+        self.assertTrue(acl.is_allowed('user_7', 'edit.blog.post.title', 'blog.post.7'))
+        self.assertRaises(MissingRole, paste.shared_acl.get().get_role, 'user_7')
+
+        paste.update_acl(lambda acl: acl.deny('moderator', 'edit', 'blog.post'))
+        acl = paste.get_acl()
+        acl.add_role('user_7', ['moderator'])
+        self.assertFalse(acl.is_allowed('user_7', 'edit.blog.post', 'blog.post.1'))
+
+    def test_overlays_share_tables(self):
+        snapshot = paste.shared_acl.get()
+        acl = paste.get_acl()
+        other = paste.get_acl(thread_safe=False)
+        self.assertTrue(acl is not other)
+        self.assertFalse(isinstance(acl._walk, walkers.CompiledAclWalker))
+        self.assertTrue(acl.get_resource('any') is snapshot.get_resource('any'))
+        self.assertTrue(acl.is_allowed('moderator', 'edit.blog.post', 'blog.post.1'))
+        table = snapshot._walk._tables[snapshot]
+        self.assertTrue(other.is_allowed('moderator', 'edit.blog.post', 'blog.post.1'))
+        self.assertTrue(snapshot._walk._tables[snapshot] is table)
+        self.assertEqual(len(table[1]), 1)
+        paste._dummy.__dict__.clear()
+
+    def test_overlay_keeps_base_roles(self):
+        snapshot = paste.shared_acl.get()
+        moderator = snapshot.get_role('moderator')
+        children = moderator.get_children_map()
+        with_access = snapshot.roles_with_access('edit.blog.post', 'blog.post.1')
+        acl = paste.get_acl()
+        acl.add_role('user_7', ['moderator'])
+        acl.add_role('moderator', {'blog.post.3': ['reviewer']})
+        acl.add_role('moderator.junior')
+        acl.add_resource('blog.post.1', ['board.message.3'])
+        self.assertEqual(moderator.get_children_map(), children)
+        self.assertEqual(moderator.get_parents_map(), {})
+        self.assertEqual(snapshot.get_resource('blog.post.1').get_parents(), ())
+        self.assertTrue(acl.get_role('moderator') is not moderator)
+        self.assertEqual(acl.roles_with_access('edit.blog.post', 'blog.post.1'),
+                         with_access | set(['moderator.junior', 'user_7']))
+        self.assertEqual(snapshot.roles_with_access('edit.blog.post', 'blog.post.1'), with_access)
+
+    def test_request_acl(self):
+        for shared in (True, False):
+            settings.SHARED_ACL = shared
+            acl = paste.get_request_acl()
+            self.assertTrue(acl is paste.get_request_acl())
+            self.assertTrue(acl.parent is paste.get_acl())
+            acl.add_role('user_7', ['moderator'])
+            acl.add_resource('blog.post.7')
+            self.assertTrue(acl.is_allowed('user_7', 'edit.blog.post', 'blog.post.7'))
+            paste.end_request()
+            self.assertTrue(paste.get_request_acl() is not acl)
+            self.assertRaises(MissingRole, paste.get_request_acl().get_role, 'user_7')
+            self.assertRaises(MissingRole, paste.get_acl().get_role, 'user_7')
+            paste._ctx.__dict__.clear()
+
+    def test_request_acl_collected(self):
+        for shared in (True, False):
+            settings.SHARED_ACL = shared
+            acl = paste.get_request_acl()
+            acl.add_role('user_7', ['moderator'])
+            acl.add_resource('blog.post.7', ['blog.post.1'])
+            self.assertTrue(acl.is_allowed('user_7', 'edit.blog.post', 'blog.post.7'))
+            refs = [weakref.ref(acl), weakref.ref(acl.get_role('user_7')), weakref.ref(acl.get_resource('blog.post.7'))]
+            del acl
+            paste.end_request()
+            gc.collect()
+            self.assertEqual([ref() for ref in refs], [None, None, None])
+            paste._ctx.__dict__.clear()
+
+    def test_child_only_dotted_parents(self):
+        base = simpleacl.Acl()
+        base.add_role('staff')
+        base.add_resource('blog')
+        base.add_privilege('edit')
+        base.allow('staff', 'edit', 'blog')
+        subacl = simpleacl.Acl()
+        subacl.parent = base
+        subacl.add_role('user_1', ['staff'])
+        subacl.add_resource('blog.post.15')
+        subacl.add_privilege('edit.blog.post')
+        self.assertTrue(subacl.is_allowed('user_1', 'edit.blog.post', 'blog.post.15'))
+
+
+def dump_acl(acl):
+    """Returns the ACL structure as names, in the backend order"""
+    backend = acl._backend
+    return {
+        'roles': [(role.get_name(),
+                   sorted((resource.get_name(), [i.get_name() for i in parents])
+                          for resource, parents in role.get_parents_map().items()),
+                   sorted((resource and resource.get_name(), sorted(i.get_name() for i in children))
+                          for resource, children in role.get_children_map().items()))
+                  for role in backend.get_roles()],
+        'privileges': [i.get_name() for i in backend.get_privileges()],
+        'resources': [(i.get_name(), [j.get_name() for j in i.get_parents()]) for i in backend.get_resources()],
+        'acl': sorted((resource.get_name(), role.get_name(), privilege.get_name(), allow)
+                      for role, privilege, resource, allow in backend.get_rules()),
+    }
+
+
+class TestBulkLoader(unittest.TestCase):
+
+    def setUp(self):
+        self.acl = simpleacl.Acl()
+        self.acl.bulk_load(POLICY)
+        self.expected = dump_acl(self.acl)
+
+    def test_dict(self):
+        self.assertEqual(dump_acl(simpleacl.Acl().fast_bulk_load(POLICY)), self.expected)
+
+    def test_json(self):
+        self.assertEqual(dump_acl(simpleacl.Acl().fast_bulk_load(json.dumps(POLICY))), self.expected)
+
+    def test_create_instance(self):
+        for data in (POLICY, json.dumps(POLICY)):
+            self.assertEqual(dump_acl(simpleacl.Acl.create_instance(data)), self.expected)
+            self.assertEqual(dump_acl(simpleacl.Acl.create_instance(data, fast=True)), self.expected)
+
+    def test_stream(self):
+        data = json.dumps(POLICY, indent=2)
+        for fp in (io.StringIO(data), io.BytesIO(data.encode('utf-8'))):
+            acl = simpleacl.Acl()
+            loader.BulkLoader(acl).load_items(loader.iter_policy(fp, chunk_size=7))
+            self.assertEqual(dump_acl(acl), self.expected)
+        acl = simpleacl.Acl().fast_bulk_load(io.StringIO(data))
+        for question in iter_questions(self.acl):
+            self.assertEqual(acl.is_allowed(*question), self.acl.is_allowed(*question), question)
+
+    def test_sections_order(self):
+        data = '{"acl": %s, "unknown": [1.5, {"a": null}], "privileges": %s, "roles": %s, "resources": %s}' % tuple(
+            json.dumps(POLICY[i]) for i in ('acl', 'privileges', 'roles', 'resources')
+        )
+        acl = simpleacl.Acl()
+        loader.BulkLoader(acl).load_items(loader.iter_policy(io.StringIO(data), chunk_size=3))
+        self.assertEqual(dump_acl(acl), self.expected)
+
+    def test_missing_section(self):
+        policy = dict((i, POLICY[i]) for i in ('resources', 'roles'))
+        policy['acl'] = {'blog.post': {'author': {'any': True}}, 'any': {'moderator': {'any': True}}}
+        expected = simpleacl.Acl.create_instance(policy)
+        acl = simpleacl.Acl()
+        bulk_loader = loader.BulkLoader(acl)
+        applied = []
+
+        def load_item(section, item):
+            applied.append(section)
+            return loader.BulkLoader.load_item(bulk_loader, section, item)
+        bulk_loader.load_item = load_item
+
+        def items():
+            for section, item in loader.iter_items(policy):
+                yield section, item
+                self.assertEqual(applied[-1], section)  # Not buffered until privileges
+        bulk_loader.load_items(items())
+        self.assertEqual(dump_acl(acl), dump_acl(expected))
+
+    def test_missing_role(self):
+        acl = simpleacl.Acl()
+        self.assertRaises(MissingRole, acl.fast_bulk_load, {'acl': {'any': {'nobody': {'any': True}}}})
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'acl.snapshot')
+        self.acl = simpleacl.Acl.create_instance(POLICY)
+        self.acl.dump_snapshot(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_same_answers(self):
+        loaded = simpleacl.Acl.load_snapshot(self.path)
+        self.assertFalse(loaded._backend._roles)
+        for question in iter_questions(self.acl):
+            self.assertEqual(self.acl.is_allowed(*question), loaded.is_allowed(*question), question)
+        self.assertEqual(dump_acl(loaded), dump_acl(self.acl))
+
+    def test_reverse_queries(self):
+        self.assertEqual(simpleacl.Acl.load_snapshot(self.path).roles_with_access('edit.blog.post', 'blog.post.2'),
+                         self.acl.roles_with_access('edit.blog.post', 'blog.post.2'))
+        self.assertEqual(simpleacl.Acl.load_snapshot(self.path).allowed_resources('user_1', 'edit.blog.post'),
+                         self.acl.allowed_resources('user_1', 'edit.blog.post'))
+
+    def test_published_when_complete(self):
+        backend = simpleacl.Acl.load_snapshot(self.path)._backend
+        get_list = backend._snapshot.get_list
+        published = []
+
+        def spy(name, i):
+            published.append('user_3' in backend._roles)
+            return get_list(name, i)
+        backend._snapshot.get_list = spy
+        role = backend.get_role('user_3')
+        self.assertTrue(published and not any(published))
+        self.assertTrue(backend.get_role('user_3') is role)
+        self.assertEqual(set(i.get_name() for i in role.get_parents_map()[backend.get_resource('blog.post.2')]),
+                         set(['moderator']))
+        self.assertFalse(backend._building)
+
+    def test_children_published_when_complete(self):
+        backend = simpleacl.Acl.load_snapshot(self.path)._backend
+        role = backend.get_role('moderator')
+        get_list = backend._snapshot.get_list
+        seen = []
+
+        def get_children_map():
+            seen.append(dict((resource.get_name(), sorted(i.get_name() for i in children))
+                             for resource, children in role.get_children_map().items()))
+
+        def spy(name, i):
+            if not threads:  # Another thread asks while the children are being loaded
+                thread = threading.Thread(target=get_children_map)
+                thread.start()
+                thread.join(0.05)
+                threads.append(thread)
+            return get_list(name, i)
+        threads = []
+        backend._snapshot.get_list = spy
+        expected = dict((resource.get_name(), sorted(i.get_name() for i in children))
+                        for resource, children in self.acl.get_role('moderator').get_children_map().items())
+        self.assertTrue(expected)
+        self.assertEqual(dict((resource.get_name(), sorted(i.get_name() for i in children))
+                              for resource, children in role.get_children_map().items()), expected)
+        for thread in threads:
+            thread.join()
+        self.assertEqual(seen, [expected])
+
+    def test_changes(self):
+        loaded = simpleacl.Acl.load_snapshot(self.path, compiled=True)
+        loaded.remove_allow('author', 'edit.blog.post', 'blog.post')
+        self.assertFalse(loaded.is_allowed('user_2', 'edit.blog.post', 'blog.post.2'))
+        loaded.add_role('user_9', ['moderator'])
+        loaded.add_resource('blog.post.9')
+        self.assertTrue(loaded.is_allowed('user_9', 'edit.blog.post', 'blog.post.9'))
+
+        copied = loaded.copy()
+        copied.deny('user_9', 'edit', 'blog.post.9')
+        self.assertFalse(copied.is_allowed('user_9', 'edit.blog.post', 'blog.post.9'))
+        self.assertTrue(loaded.is_allowed('user_9', 'edit.blog.post', 'blog.post.9'))
+
+        loaded.dump_snapshot(self.path)
+        reloaded = simpleacl.Acl.load_snapshot(self.path)
+        self.assertEqual(dump_acl(reloaded), dump_acl(loaded))
+
+    def test_self_contained(self):
+        subacl = simpleacl.Acl()
+        subacl.parent = self.acl
+        subacl.add_role('user_9', ['moderator'])
+        subacl.allow('user_9', 'edit.blog.post', 'blog.post.2')
+        self.assertRaises(ValueError, subacl.dump_snapshot, self.path)
+
+    def test_paste(self):
+        old_settings = settings.INITIAL_SNAPSHOT
+        settings.INITIAL_SNAPSHOT = self.path
+        try:
+            acl = paste.create_acl()
+        finally:
+            settings.INITIAL_SNAPSHOT = old_settings
+        self.assertTrue(isinstance(acl._backend, snapshot.SnapshotBackend))
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        self.acl = simpleacl.Acl.create_instance(POLICY)
+
+    def test_same_answers(self):
+        for compiled in (False, True):
+            acl = simpleacl.Acl.create_instance(POLICY, compiled=compiled)
+            expected = [acl.is_allowed(*question) for question in iter_questions(acl)]
+            collector = utils.StatsCollector()
+            acl.enable_instrumentation(collector)
+            self.assertEqual([acl.is_allowed(*question) for question in iter_questions(acl)], expected)
+            stats = collector.get_stats()
+            self.assertEqual(stats['counters']['simpleacl.decisions'], len(expected))
+            self.assertEqual(stats['histograms']['simpleacl.decision.lookups']['sum'],
+                             stats['counters']['simpleacl.lookups'])
+
+    def test_counters(self):
+        collector = utils.StatsCollector()
+        self.acl.enable_instrumentation(collector)
+        self.acl.is_allowed('user_3', 'edit.blog.post', 'blog.post.2')
+        stats = collector.get_stats()
+        self.assertEqual(stats['counters']['simpleacl.walker.0_hierarchical_acl.calls'], 1)
+        self.assertTrue(stats['counters']['simpleacl.get_mro'] > 0)
+        self.assertTrue(stats['counters']['simpleacl.walker.10_call.calls'] > 0)
+        self.assertEqual(stats['timings']['simpleacl.decision']['count'], 1)
+        self.assertTrue(stats['histograms']['simpleacl.walker.1_hierarchical_role.bases']['max'] > 1)
+
+    def test_callable_rules(self):
+        events = []
+        self.acl.enable_instrumentation(utils.CallbackSink(lambda *args: events.append(args)), prefix='acl')
+        self.acl.add_rule('author', 'delete', 'blog.post', 'simpleacl.tests.dynamic_rule')
+        self.assertTrue(self.acl.is_allowed('user_2', 'delete.blog.post', 'blog.post.2'))
+        self.assertTrue(('incr', 'acl.callable_rules', 1) in events)
+        self.assertTrue(('histogram', 'acl.decision.callable_rules', 1) in events)
+
+    def test_disable(self):
+        walker = self.acl._walk
+        self.acl.enable_instrumentation(utils.StatsCollector())
+        self.assertFalse(self.acl._walk is walker)
+        self.acl.disable_instrumentation()
+        self.assertTrue(self.acl._walk is walker)
+
+
+class TestExplain(unittest.TestCase):
+
+    def setUp(self):
+        self.acl = simpleacl.Acl.create_instance(POLICY)
+
+    def test_same_answers(self):
+        for question in iter_questions(self.acl):
+            self.assertEqual(self.acl.explain(*question).allow, self.acl.is_allowed(*question), question)
+
+    def test_steps(self):
+        explanation = self.acl.explain('user_3', 'edit.blog.post', 'blog.post.2')
+        self.assertTrue(explanation.allow)
+        self.assertEqual(explanation.matched, len(explanation.steps) - 1)
+        matched = explanation.steps[explanation.matched]
+        self.assertEqual((matched.acl, matched.role, matched.resource, matched.privilege, matched.rule),
+                         (self.acl, 'moderator', 'blog.post', 'edit', True))
+        # Subtrees without rules are skipped
+        self.assertFalse([step for step in explanation.steps if step.role == 'user_3'])
+        self.assertTrue(all(step.result is None for step in explanation.steps[:-1]))
+        self.assertTrue(explanation.seconds >= sum(step.seconds for step in explanation.steps) * 0.99)
+
+    def test_not_matched(self):
+        explanation = self.acl.explain('moderator', 'delete.blog.post', 'board.message.3', undef='undef')
+        self.assertEqual(explanation.allow, 'undef')
+        self.assertEqual(explanation.matched, None)
+        self.assertTrue(all(step.result is None for step in explanation.steps))
+
+
+class TestPresenceIndex(unittest.TestCase):
+
+    def test_has_rules(self):
+        for backend in (simpleacl.SimpleBackend, simpleacl.CompactBackend):
+            acl = simpleacl.Acl(backend)
+            acl.bulk_load(POLICY)
+            self.assertTrue(acl.has_plain_rules(role=acl.get_role('moderator')))
+            self.assertFalse(acl.has_plain_rules(role=acl.get_role('user_1')))
+            self.assertTrue(acl.has_plain_rules(acl.get_role('author'), acl.get_resource('blog.post')))
+            self.assertFalse(acl.has_plain_rules(acl.get_role('author'), acl.get_resource('blog.post.2')))
+            acl.remove_allow('author', 'browse.blog.post', 'blog.post')
+            acl.remove_allow('author', 'view.blog.post', 'blog.post')
+            acl.remove_allow('author', 'edit.blog.post', 'blog.post')
+            self.assertFalse(acl.has_plain_rules(role=acl.get_role('author')))
+            acl.deny('user_1', 'view', 'board.message.3')
+            self.assertTrue(acl.has_plain_rules(acl.get_role('user_1'), acl.get_resource('board.message.3')))
+
+    def test_guards_skip(self):
+        class UnindexedBackend(simpleacl.SimpleBackend):
+            has_rules = None
+
+        lookups = []
+        for backend in (simpleacl.SimpleBackend, UnindexedBackend):
+            acl = simpleacl.Acl(backend).fast_bulk_load(POLICY)
+            collector = utils.StatsCollector()
+            acl.enable_instrumentation(collector)
+            self.assertFalse(acl.is_allowed('user_1', 'delete.blog.post', 'board.message.3'))
+            lookups.append(collector.get_stats()['counters']['simpleacl.lookups'])
+        self.assertTrue(lookups[0] < lookups[1] / 4)
+
+
+class TestDynamicRules(unittest.TestCase):
+
+    def setUp(self):
+        utils.dynamic_rules.clear()
+        self.acl = simpleacl.Acl.create_instance(POLICY)
+        self.old_resolve = utils.resolve
+
+    def tearDown(self):
+        utils.resolve = self.old_resolve
+        utils.dynamic_rules.clear()
+
+    def test_resolved_once(self):
+        self.acl.add_rule('author', 'delete', 'blog.post', 'simpleacl.tests.dynamic_rule')
+        self.assertTrue('simpleacl.tests.dynamic_rule' in utils.dynamic_rules)
+
+        def fail(path):
+            raise AssertionError('Resolved again')
+
+        utils.resolve = fail
+        self.assertTrue(self.acl.is_allowed('user_2', 'delete.blog.post', 'blog.post.2'))
+        self.assertEqual(self.acl.get_plain_rule(self.acl.get_role('author'), self.acl.get_privilege('delete'),
+                                                 self.acl.get_resource('blog.post')), 'simpleacl.tests.dynamic_rule')
+
+    def test_bulk_load(self):
+        acl = simpleacl.Acl().fast_bulk_load({'roles': ['author'], 'privileges': ['delete'],
+                                              'acl': {'any': {'author': {'delete': 'simpleacl.tests.dynamic_rule'}}}})
+        self.assertTrue('simpleacl.tests.dynamic_rule' in utils.dynamic_rules)
+        self.assertTrue(acl.is_allowed('author', 'delete'))
+
+    def test_lazy(self):
+        self.acl.add_rule('author', 'delete', 'blog.post', 'simpleacl.missing_module.rule')
+        self.assertFalse('simpleacl.missing_module.rule' in utils.dynamic_rules)
+        self.assertRaises(ImportError, self.acl.is_allowed, 'user_2', 'delete.blog.post', 'blog.post.2')
+
+
+@unittest.skipIf(aio is None, 'asyncio is not available')
+class TestAsyncAcl(unittest.TestCase):
+
+    def setUp(self):
+        self.acl = aio.AsyncAcl.create_instance(POLICY, cache_size=100)
+        self.acl.add_rule('author', 'delete', 'blog.post', 'simpleacl.tests.async_rule')
+        DYNAMIC['calls'] = []
+
+    def tearDown(self):
+        DYNAMIC['allow'] = True
+        DYNAMIC.pop('calls', None)
+
+    def run_async(self, factory):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            return loop.run_until_complete(factory())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+    def gather(self, questions):
+        return self.run_async(lambda: asyncio.gather(*[self.acl.is_allowed_async(*i) for i in questions]))
+
+    def test_same_answers(self):
+        acl = simpleacl.Acl.create_instance(POLICY)
+        acl.add_rule('author', 'delete', 'blog.post', 'simpleacl.tests.dynamic_rule')
+        questions = list(iter_questions(acl))
+        for question, allow in zip(questions, self.gather(questions)):
+            self.assertEqual(allow, acl.is_allowed(*question), question)
+
+    def test_async_rule(self):
+        question = ('user_2', 'delete.blog.post', 'blog.post.2')
+        self.assertEqual(self.gather([question]), [True])
+        DYNAMIC['allow'] = False
+        self.assertEqual(self.gather([question]), [False])
+        self.assertEqual(DYNAMIC['calls'], ['author', 'author'])
+        self.assertRaises(TypeError, self.acl.is_allowed, 'user_2', 'delete.blog.post', 'blog.post.2')
+
+    def test_coalescing(self):
+        questions = [('user_2', 'delete.blog.post', 'blog.post.2')] * 5 + [('user_2', 'delete.blog.post', 'blog.post')]
+        self.assertEqual(self.gather(questions), [True] * 5 + [False])
+        self.assertEqual(DYNAMIC['calls'], ['author'])
+        self.assertFalse(self.acl._in_flight)
+
+
+class TestDecisionStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'decisions.sqlite')
+        self.stores = [stores.SqliteDecisionStore(self.path), stores.SqliteDecisionStore(self.path)]
+
+    def tearDown(self):
+        for store in self.stores:
+            store.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_shared(self):
+        first, second = self.stores
+        self.assertEqual(second.get('v1', 'user_1\0edit\0blog'), None)
+        first.set('v1', 'user_1\0edit\0blog', True)
+        first.set('v1', 'user_2\0edit\0blog', False)
+        self.assertEqual(second.get('v1', 'user_1\0edit\0blog'), True)
+        self.assertEqual(second.get('v1', 'user_2\0edit\0blog'), False)
+        self.assertEqual(second.get('v2', 'user_1\0edit\0blog'), None)
+        second.set('v2', 'user_3\0edit\0blog', True)
+        self.assertEqual(first.get('v1', 'user_1\0edit\0blog'), None)
+
+    def test_get_decision(self):
+        acl = simpleacl.Acl.create_instance(POLICY)
+        self.assertEqual(acl.get_decision('user_2', 'edit.blog.post', 'blog.post.2'), (True, True))
+        self.assertEqual(acl.get_decision('user_2', 'delete.blog.post', 'blog.post.2'), (False, True))
+        acl.add_rule('author', 'delete', 'blog.post', 'simpleacl.tests.dynamic_rule')
+        self.assertEqual(acl.get_decision('user_2', 'delete.blog.post', 'blog.post.2'), (True, False))
+
+    def test_policy_version(self):
+        old_settings = settings.INITIAL_DATA, settings.INITIAL_SNAPSHOT
+        try:
+            settings.INITIAL_SNAPSHOT = None
+            settings.INITIAL_DATA = dict(POLICY)
+            version = paste.get_policy_version()
+            settings.INITIAL_DATA = json.loads(json.dumps(POLICY))
+            self.assertEqual(paste.get_policy_version(), version)
+            settings.INITIAL_DATA['acl'] = {}
+            settings.INITIAL_DATA = dict(settings.INITIAL_DATA)
+            self.assertNotEqual(paste.get_policy_version(), version)
+        finally:
+            settings.INITIAL_DATA, settings.INITIAL_SNAPSHOT = old_settings
+
+    def test_policy_version_after_update(self):
+        old_settings = settings.INITIAL_DATA, settings.INITIAL_SNAPSHOT, settings.SHARED_ACL
+        try:
+            settings.INITIAL_DATA, settings.INITIAL_SNAPSHOT = POLICY, None
+            for settings.SHARED_ACL in (False, True):
+                paste._ctx.__dict__.clear()
+                paste.shared_acl.reset()
+                version = paste.get_policy_version()
+                paste.update_acl(lambda acl: acl.allow('user_1', 'edit', 'board.message.3'))
+                expected = simpleacl.Acl.create_instance(POLICY)
+                expected.allow('user_1', 'edit', 'board.message.3')
+                self.assertNotEqual(paste.get_policy_version(), version)
+                self.assertEqual(paste.get_policy_version(), expected.get_policy_version())
+                paste._policy['updated'] = False
+        finally:
+            settings.INITIAL_DATA, settings.INITIAL_SNAPSHOT, settings.SHARED_ACL = old_settings
+            paste._policy['updated'] = False
+            paste._ctx.__dict__.clear()
+            paste.shared_acl.reset()
+
+    def test_decision_key(self):
+        base = simpleacl.Acl.create_instance(POLICY)
+        keys = set()
+        for groups in ((), ('author', ), ('author', 'moderator')):
+            acl = simpleacl.Acl()
+            acl.parent = base
+            role = acl.add_role('user_9', groups)
+            keys.add(paste.get_decision_key(role, acl.get_privilege('edit'), acl.add_resource('blog.post.9')))
+        self.assertEqual(len(keys), 3)
+
+
+class TestReload(unittest.TestCase):
+
+    def setUp(self):
+        self.policy = copy.deepcopy(POLICY)
+        self.policy['roles'] = [i for i in self.policy['roles'] if i != 'staff.editor' and i[0] != 'user_3']
+        self.policy['roles'][-1] = ['user_2', {'any': ['authenticated'], 'blog.post.1': ['author']}]
+        self.policy['roles'].append(['editor', ['authenticated']])
+        self.policy['resources'] = ['blog.post.1', 'blog.post.2', 'blog.post.3', 'blog.post.4', 'board.message.3']
+        self.policy['acl']['blog.post.3'] = {'moderator': {'edit': True}}
+        del self.policy['acl']['any']['staff']
+        self.policy['acl']['blog.post.4'] = {'editor': {'edit.blog.post': True}}
+        self.expected = simpleacl.Acl.create_instance(self.policy)
+
+    def assertSameAnswers(self, acl):
+        for question in iter_questions(self.expected):
+            self.assertEqual(acl.is_allowed(*question), self.expected.is_allowed(*question), question)
+
+    def test_reload(self):
+        for options in ({'cache_size': 1000}, {'compiled': True}, {'backend_factory': simpleacl.CompactBackend}):
+            acl = simpleacl.Acl.create_instance(POLICY, **options)
+            for question in iter_questions(simpleacl.Acl.create_instance(POLICY)):
+                acl.is_allowed(*question)
+            acl.reload(self.policy, POLICY)
+            self.assertSameAnswers(acl)
+            self.assertRaises(MissingRole, acl.get_role, 'user_3')
+            self.assertEqual(acl.get_policy_version(), self.expected.get_policy_version())
+
+    def test_retained_decisions(self):
+        acl = simpleacl.Acl.create_instance(POLICY, cache_size=1000)
+        for question in iter_questions(acl):
+            acl.is_allowed(*question)
+        size = acl.get_cache_stats()['size']
+        acl.reload(self.policy, POLICY)
+        self.assertTrue(0 < acl.get_cache_stats()['size'] < size)
+        self.assertSameAnswers(acl)
+
+    def test_live_diff(self):
+        acl = simpleacl.Acl.create_instance(POLICY)
+        acl.add_role('user_9', ['author'])
+        acl.reload(self.policy)
+        self.assertRaises(MissingRole, acl.get_role, 'user_9')
+        self.assertEqual(acl.get_policy_version(), self.expected.get_policy_version())
+        acl.add_role('user_9', ['author'])
+        self.assertNotEqual(acl.get_policy_version(), self.expected.get_policy_version())
+        acl.reload(POLICY)
+        self.assertTrue(acl.get_role('user_9'))  # Not in the previous policy
+        acl.remove_role('user_9')
+        self.assertEqual(acl.get_policy_version(), simpleacl.Acl.create_instance(POLICY).get_policy_version())
+
+    def test_policy_version(self):
+        acl = simpleacl.Acl.create_instance(POLICY)
+        version = acl.get_policy_version()
+        self.assertEqual(version, loader.hash_policy(loader.normalize_policy(POLICY)))
+        acl.allow('user_1', 'delete', 'blog.post.1')
+        self.assertNotEqual(acl.get_policy_version(), version)
+        acl.remove_allow('user_1', 'delete', 'blog.post.1')
+        self.assertEqual(acl.get_policy_version(), version)
+        child = simpleacl.Acl()
+        child.parent = acl
+        self.assertNotEqual(child.get_policy_version(), simpleacl.Acl().get_policy_version())
+
+    def test_remove_role(self):
+        acl = simpleacl.Acl.create_instance(POLICY)
+        acl.remove_role('author')
+        self.assertFalse(acl.is_allowed('user_2', 'edit.blog.post', 'blog.post.2'))
+        self.assertEqual(acl.get_role('user_2').get_parents_map(), {acl.get_resource('any'): (acl.get_role('authenticated'), )})
+
+    def test_paste(self):
+        old_settings = settings.INITIAL_DATA, settings.INITIAL_SNAPSHOT
+        paste._ctx.__dict__.clear()
+        try:
+            settings.INITIAL_DATA, settings.INITIAL_SNAPSHOT = POLICY, None
+            acl = paste.get_acl()
+            acl.add_role('user_9', ['author'])
+            paste.reload_policy(self.policy)
+            self.assertTrue(paste.get_acl() is acl)
+            self.assertSameAnswers(acl)
+            self.assertTrue(acl.get_role('user_9'))
+        finally:
+            settings.INITIAL_DATA, settings.INITIAL_SNAPSHOT = old_settings
+            paste._ctx.__dict__.clear()
+
+
+class TestInheritedLookups(unittest.TestCase):
+
+    def setUp(self):
+        self.base = simpleacl.Acl.create_instance(POLICY)
+        self.middle = simpleacl.Acl()
+        self.middle.parent = self.base
+        self.acl = simpleacl.Acl()
+        self.acl.parent = self.middle
+
+    def test_memoized(self):
+        self.assertTrue(self.acl.get_role('author') is self.base.get_role('author'))
+        self.assertRaises(MissingRole, self.acl.get_role, 'editor')
+        self.assertEqual(self.acl._inherited['role'], {'author': self.base.get_role('author'), 'editor': None})
+
+    def test_changes_of_parents(self):
+        self.assertRaises(MissingRole, self.acl.get_role, 'editor')
+        self.base.add_role('editor', ['author'])
+        self.assertTrue(self.acl.get_role('editor') is self.base.get_role('editor'))
+        self.middle.add_role(simpleacl.Role('editor'))
+        self.assertTrue(self.acl.get_role('editor') is self.middle.get_role('editor'))
+        self.acl.add_role('user_9', ['editor'])
+        self.acl.allow('editor', 'edit', 'blog.post.1')
+        self.assertTrue(self.acl.is_allowed('user_9', 'edit.blog.post', 'blog.post.1'))
+        self.base.remove_role('author')
+        self.assertRaises(MissingRole, self.acl.get_role, 'author')
+        self.acl.parent = simpleacl.Acl()
+        self.assertRaises(MissingRole, self.acl.get_role, 'moderator')
+
+    def test_lazy_parent(self):
+        loaded = []
+        base = simpleacl.Acl(backend_factory=partial(
+            simpleacl.LazyRoleBackend, loader=lambda acl, name: loaded.append(acl.add_role(name))))
+        self.acl.parent = base
+        self.assertTrue(self.acl.get_role('user_5') is loaded[0])
+        self.assertFalse(self.acl._inherited)
+
+
+class TestTenantRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.base = copy.deepcopy(POLICY)
+        self.base['roles'] = [i for i in POLICY['roles'] if not utils.is_list(i)]
+        self.loaded = []
+        self.registry = tenants.TenantRegistry(self.base, self.load)
+
+    def load(self, acl, tenant):
+        self.loaded.append(tenant)
+        acl.fast_bulk_load({'roles': [i for i in POLICY['roles'] if utils.is_list(i)]})
+        acl.allow('user_1', 'delete', acl.add_resource('blog.post.{0}'.format(tenant)))
+
+    def test_same_answers(self):
+        expected = simpleacl.Acl.create_instance(POLICY)
+        expected.allow('user_1', 'delete', 'blog.post.3')
+        acl = self.registry.get(3)
+        for role, privilege, resource in iter_questions(expected):
+            self.assertEqual(acl.is_allowed(role, privilege, resource), expected.is_allowed(role, privilege, resource),
+                             (role, privilege, resource))
+        self.assertTrue(acl.is_allowed('user_1', 'delete.blog.post', 'blog.post.3'))
+        self.assertFalse(self.registry.get(2).is_allowed('user_1', 'delete.blog.post', 'blog.post.3'))
+        self.assertTrue(self.registry.get(3) is acl)
+        self.assertEqual(self.loaded, [3, 2])
+        self.assertRaises(MissingRole, self.registry.base.get_role, 'user_1')
+        self.assertEqual(acl._backend.get_privileges(), [])
+        self.assertTrue(acl.get_resource('any') is self.registry.base.get_resource('any'))
+
+    def test_memory_budget(self):
+        self.registry.get(1)
+        size = self.registry.memory_usage()[1]
+        self.assertTrue(size > 0)
+        registry = tenants.TenantRegistry(self.registry.base, self.load, memory_budget=size * 3 + size // 2)
+        for tenant in range(10):
+            registry.get(tenant)
+        usage = registry.memory_usage()
+        self.assertEqual(sorted(usage), [7, 8, 9])
+        self.assertEqual(registry.get_stats()['bytes'], sum(usage.values()))
+        self.assertEqual(registry.evictions, 7)
+        registry.get(7).allow('user_2', 'delete', 'blog.post.1')
+        self.assertTrue(registry.memory_usage()[7] > usage[7])
+
+
+class TestSqlBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'acl.sqlite')
+        self.statements = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def connect(self):
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.set_trace_callback(self.statements.append)
+        return connection
+
+    def assertSameAnswers(self, acl, expected):
+        for question in iter_questions(expected):
+            self.assertEqual(acl.is_allowed(*question), expected.is_allowed(*question), question)
+
+    def test_same_answers(self):
+        expected = simpleacl.Acl.create_instance(POLICY)
+        acl = simpleacl.Acl.create_instance(POLICY, backend_factory=partial(sql.SqlBackend, self.path))
+        self.assertSameAnswers(acl, expected)
+        self.assertEqual(sorted(acl.allowed_resources('user_1', 'edit')),
+                         sorted(expected.allowed_resources('user_1', 'edit')))
+        acl.remove_allow('moderator', 'edit', 'blog.post.3')
+        expected.remove_allow('moderator', 'edit', 'blog.post.3')
+        self.assertSameAnswers(acl, expected)
+
+    def test_persistence(self):
+        simpleacl.Acl.create_instance(POLICY, backend_factory=partial(sql.SqlBackend, self.path))
+        acl = simpleacl.Acl(backend_factory=partial(sql.SqlBackend, self.path))
+        self.assertSameAnswers(acl, simpleacl.Acl.create_instance(POLICY))
+        self.assertEqual(acl.get_role('user_2').get_parents_map(),
+                         simpleacl.Acl.create_instance(POLICY).get_role('user_2').get_parents_map())
+
+    def test_one_query_per_decision(self):
+        simpleacl.Acl.create_instance(POLICY, backend_factory=partial(sql.SqlBackend, self.path))
+        acl = simpleacl.Acl(backend_factory=partial(sql.SqlBackend, self.connect))
+        questions = list(iter_questions(simpleacl.Acl.create_instance(POLICY)))
+        for question in questions:
+            acl.is_allowed(*question)  # Loads the entities
+        del self.statements[:]
+        for question in questions:
+            acl.is_allowed(*question)
+        self.assertEqual(len(self.statements), len(questions))
+        self.assertTrue(all(i.startswith('SELECT role_id') for i in self.statements))
+
+    def test_chunked_rule_queries(self):
+        expected = simpleacl.Acl.create_instance(POLICY)
+        acl = simpleacl.Acl.create_instance(POLICY, backend_factory=partial(sql.SqlBackend, self.connect))
+        max_params, sql.MAX_PARAMS = sql.MAX_PARAMS, 6
+        try:
+            del self.statements[:]
+            for role in ('user_1', 'user_3'):
+                self.assertEqual(acl.allowed_resources(role, 'edit'), expected.allowed_resources(role, 'edit'))
+            self.assertEqual(acl.roles_with_access('edit.blog.post', 'blog.post.1'),
+                             expected.roles_with_access('edit.blog.post', 'blog.post.1'))
+        finally:
+            sql.MAX_PARAMS = max_params
+        for statement in self.statements:
+            if statement.startswith('SELECT DISTINCT'):
+                self.assertLessEqual(sum(len(i.split(',')) for i in re.findall(r'IN \(([^)]*)\)', statement)), 6)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,4 +1,8 @@
 import sys
+import threading
+import weakref
+from array import array
+from collections import OrderedDict
 import c3linearize
 
 try:
@@ -9,15 +13,403 @@ except NameError:
     string_types = (str,)
     integer_types = (int,)
 
+try:
+    KEY_TYPECODE = str(array(str('Q')).typecode)
+except ValueError:  # Python 2.*, long is 64-bit on the platforms with mmap
+    KEY_TYPECODE = str('L')
+
+
+class MroCache(object):
+    """Memoized linearizations.
+
+    Entries are keyed by the accessor and by the entities the accessor
+    depends on. The cache is dropped only when an entity (or an ACL) which
+    takes part in some cached linearization or key changes its parents.
+    Members are compared by identity, so a new instance with the name of a
+    cached one (e.g. the role of a user in the next request) doesn't drop it.
+    Names looked up in vain (e.g. the dotted ancestors skipped by
+    walkers.get_dotted_parent()) drop it once an entity with such name is added.
+    The members of keys are referenced weakly, the entries of an overlay ACL
+    or of the roles of a request are dropped when they are collected.
+    Changes are made under the lock, so an entry linearized before a
+    concurrent clear() is never stored.
+    """
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self.generation = 0
+        self._entries = {}  # ids of the key -> (key members, bases of current)
+        self._refs = {}  # id -> (weak reference, ids of the keys of its entries)
+        self._members = set()  # ids of the entities of the entries
+        self._missing = set()  # names which weren't found while linearizing
+        self._lock = threading.RLock()  # Reentrant, the weak reference callbacks may run while it's held
+
+    def get_mro(self, key, current, bases_getter):
+        """Returns cached linearization of current, the result must not be mutated."""
+        ids = tuple(map(id, key))
+        entry = self._entries.get(ids)
+        if entry is not None and all(ref() is obj for ref, obj in zip(entry[0], key)):
+            return (current,) + entry[1]
+        generation = self.generation
+        mro = linearize(current, bases_getter)
+        if mro and mro[0] is current:
+            with self._lock:
+                if generation == self.generation:
+                    if len(self._entries) >= self.max_size:
+                        self.clear()
+                    self._entries[ids] = (tuple(self._ref(obj, ids) for obj in key), tuple(mro[1:]))
+                    self._members.update(map(id, mro))
+                    self._members.update(ids)
+        return mro
+
+    def _ref(self, obj, ids):
+        """Returns a weak reference to the member of the key"""
+        try:
+            ref, keys = self._refs[id(obj)]
+        except KeyError:
+            i = id(obj)
+            try:
+                ref = weakref.ref(obj, lambda ref: self._collected(i, ref))
+            except TypeError:
+                return lambda: obj  # Not weakly referenceable, it's held
+            ref, keys = self._refs[i] = (ref, set())
+        keys.add(ids)
+        return ref
+
+    def _collected(self, i, ref):
+        """Drops the entries whose key had the collected object"""
+        with self._lock:
+            current = self._refs.get(i)
+            if current is not None and current[0] is ref:
+                del self._refs[i]
+                self._members.discard(i)
+                for ids in current[1]:
+                    self._entries.pop(ids, None)
+
+    def invalidate(self, *objects):
+        """Drops the cache if any of objects takes part in a cached linearization.
+
+        Without arguments the cache is dropped unconditionally.
+        """
+        with self._lock:
+            if not objects or any(id(obj) in self._members for obj in objects):
+                self.clear()
+
+    def add_missing(self, name):
+        """Remembers that the linearization depends on the absence of the name"""
+        self._missing.add(name)
+
+    def added(self, instance):
+        """Drops the cache if some linearization depends on the absence of the name of instance"""
+        with self._lock:
+            if instance.get_name() in self._missing:
+                self.clear()
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries = {}
+            self._refs = {}
+            self._members = set()
+            self._missing = set()
+
+mro_cache = MroCache()
+
+
+class LRUCache(object):
+    """Bounded mapping which evicts least recently used entries."""
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def discard_if(self, predicate):
+        """Drops the entries for which predicate(key, value) is true"""
+        with self._lock:
+            for key, value in list(self._data.items()):
+                if predicate(key, value):
+                    del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+
+class NameTable(object):
+    """Interns names to integer ids, in the order of addition.
+
+    Names are encoded into one buffer and found through an open addressing
+    index of ids, so a name costs its length and about 12 bytes, where
+    a dict of strings to ints needs about a hundred.
+    """
+    def __init__(self):
+        self._buffer = bytearray()
+        self._offsets = array(str('I'), [0])  # Name i is buffer[offsets[i]:offsets[i + 1]]
+        self._index = array(str('i'), [-1]) * 8
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def _lookup(self, encoded):
+        """Returns (slot, id), id is -1 if the name isn't there"""
+        buffer, offsets, index = self._buffer, self._offsets, self._index
+        mask = len(index) - 1
+        slot = hash(encoded) & mask
+        while True:
+            i = index[slot]
+            if i < 0 or buffer[offsets[i]:offsets[i + 1]] == encoded:
+                return slot, i
+            slot = (slot + 1) & mask
+
+    def find(self, name):
+        """Returns the id of the name, or None"""
+        i = self._lookup(name.encode('utf-8'))[1]
+        return None if i < 0 else i
+
+    def add(self, name):
+        """Returns the id of the name, it's added if needed"""
+        encoded = name.encode('utf-8')
+        slot, i = self._lookup(encoded)
+        if i >= 0:
+            return i
+        i = len(self)
+        self._buffer.extend(encoded)
+        self._offsets.append(len(self._buffer))
+        self._index[slot] = i
+        if 3 * len(self) >= 2 * len(self._index):
+            self._resize()
+        return i
+
+    def get_name(self, i):
+        return self._buffer[self._offsets[i]:self._offsets[i + 1]].decode('utf-8')
+
+    def _resize(self):
+        self._index = array(str('i'), [-1]) * (len(self._index) * 2)
+        for i in range(len(self)):
+            slot = self._lookup(bytes(self._buffer[self._offsets[i]:self._offsets[i + 1]]))[0]
+            self._index[slot] = i
+
+
+class IntTable(object):
+    """Maps integer keys below 2 ** 63 to integer values below 2 ** 32, in flat arrays.
+
+    Keys are hashed by Fibonacci hashing into an open addressing table,
+    a pair costs about 24 bytes, where a dict of ints needs about ninety.
+    """
+    EMPTY = 0
+    REMOVED = (1 << 64) - 1
+
+    def __init__(self):
+        self._keys = array(KEY_TYPECODE, [self.EMPTY]) * 8  # Key + 1, EMPTY or REMOVED
+        self._values = array(str('I'), [0]) * 8
+        self._shift = 61
+        self._size = 0
+        self._used = 0  # Size with removed slots
 
-def get_mro(current, bases_getter):
+    def __len__(self):
+        return self._size
+
+    def _lookup(self, key):
+        """Returns the slot of the key, or the slot to insert it"""
+        keys, stored = self._keys, key + 1
+        mask = len(keys) - 1
+        slot = ((key * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) >> self._shift
+        free = None
+        while True:
+            current = keys[slot]
+            if current == stored:
+                return slot
+            if current == self.EMPTY:
+                return slot if free is None else free
+            if current == self.REMOVED and free is None:
+                free = slot
+            slot = (slot + 1) & mask
+
+    def get(self, key, default=None):
+        slot = self._lookup(key)
+        return self._values[slot] if self._keys[slot] == key + 1 else default
+
+    def set(self, key, value):
+        slot = self._lookup(key)
+        if self._keys[slot] != key + 1:
+            if self._keys[slot] == self.EMPTY:
+                self._used += 1
+            self._size += 1
+            self._keys[slot] = key + 1
+        self._values[slot] = value
+        if 3 * self._used >= 2 * len(self._keys):
+            self._resize()
+
+    def pop(self, key, default=None):
+        slot = self._lookup(key)
+        if self._keys[slot] != key + 1:
+            return default
+        self._keys[slot] = self.REMOVED
+        self._size -= 1
+        return self._values[slot]
+
+    def items(self):
+        for slot, key in enumerate(self._keys):
+            if key != self.EMPTY and key != self.REMOVED:
+                yield key - 1, self._values[slot]
+
+    def _resize(self):
+        items = list(self.items())
+        size = 8
+        while 2 * len(items) >= size:
+            size *= 2
+        self._keys = array(KEY_TYPECODE, [self.EMPTY]) * size
+        self._values = array(str('I'), [0]) * size
+        self._shift = 64 - size.bit_length() + 1
+        self._size = self._used = 0
+        for key, value in items:
+            self.set(key, value)
+
+
+class CallbackSink(object):
+    """Passes metrics to func(kind, name, value), kind is "incr", "timing" or "histogram"."""
+    def __init__(self, func):
+        self._func = func
+
+    def incr(self, name, count=1):
+        self._func('incr', name, count)
+
+    def timing(self, name, seconds):
+        self._func('timing', name, seconds)
+
+    def histogram(self, name, value):
+        self._func('histogram', name, value)
+
+
+class StatsCollector(object):
+    """Local statsd-like collector of counters, timings and histograms."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def incr(self, name, count=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + count
+
+    def timing(self, name, seconds):
+        self._observe(self.timings, name, seconds)
+
+    def histogram(self, name, value):
+        self._observe(self.histograms, name, value)
+
+    def _observe(self, stats, name, value):
+        with self._lock:
+            stat = stats.get(name)
+            if stat is None:
+                stats[name] = {'count': 1, 'sum': value, 'min': value, 'max': value}
+            else:
+                stat['count'] += 1
+                stat['sum'] += value
+                stat['min'] = min(stat['min'], value)
+                stat['max'] = max(stat['max'], value)
+
+    def get_stats(self):
+        """Returns a copy of collected metrics"""
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'timings': dict((k, dict(v)) for k, v in self.timings.items()),
+                'histograms': dict((k, dict(v)) for k, v in self.histograms.items()),
+            }
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.timings = {}
+            self.histograms = {}
+
+
+def linearize(current, bases_getter):
     return c3linearize.linearize(c3linearize.build_graph(current, bases_getter))[current]
 
 
+def get_mro(current, bases_getter, cache_key=None):
+    """Returns C3 linearization of current.
+
+    When cache_key is given, the result is memoized in mro_cache. The key
+    must contain every object the bases_getter depends on.
+    """
+    if cache_key is None:
+        return linearize(current, bases_getter)
+    return mro_cache.get_mro(cache_key, current, bases_getter)
+
+
 def is_list(v):
     return isinstance(v, (list, tuple))
 
 
+class DynamicRuleRegistry(object):
+    """Objects of dotted-path rules (like "myapp.rules.is_owner"), each path is imported once."""
+    def __init__(self):
+        self._objects = {}
+
+    def register(self, path):
+        """Resolves the path eagerly.
+
+        Returns False if it can't be imported yet, then it's resolved on first use.
+        """
+        try:
+            self.resolve(path)
+        except (ImportError, AttributeError, ValueError):
+            return False
+        return True
+
+    def resolve(self, path):
+        try:
+            return self._objects[path]
+        except KeyError:
+            obj = self._objects[path] = resolve(path)
+            return obj
+
+    def clear(self):
+        """Drops resolved objects, e.g. after reloading of modules"""
+        self._objects = {}
+
+    def __contains__(self, path):
+        return path in self._objects
+
+dynamic_rules = DynamicRuleRegistry()
+
+
+def is_dynamic_rule(value):
+    """Returns True if the rule value is a dotted path"""
+    return isinstance(value, string_types) and '.' in value
+
+
 def resolve(str_or_obj):
     """Returns object from string"""
     if not isinstance(str_or_obj, string_types):
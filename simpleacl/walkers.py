@@ -1,15 +1,25 @@
-from simpleacl import interfaces, utils
+import copy
+import time
+import weakref
+from threading import local
+from simpleacl import exceptions, interfaces, utils
 from simpleacl.constants import ANY_PRIVILEGE, ANY_RESOURCE
 
+timer = getattr(time, 'perf_counter', time.time)
+
 
 class HierarchicalRoleParentsWalker(interfaces.IRoleParentsWalker):
-    def __init__(self, parents_accessor, delegate):
+    def __init__(self, parents_accessor, delegate, depends=('role', 'resource', 'acl')):
         """
         :type parents_accessor: (simpleacl.interfaces.IRole, simpleacl.interfaces.IResource, simpleacl.interfaces.IAcl) -> tuple[simpleacl.interfaces.IResource]
         :type delegate: simpleacl.interfaces.IRoleParentsWalker
+        :param depends: names of arguments the parents_accessor depends on,
+            they are used as the key of linearization cache.
+        :type depends: tuple[str]
         """
         self._parents_accessor = parents_accessor
         self._delegate = delegate
+        self._depends = tuple(i for i in depends if i != 'resource')
 
     def __call__(self, role, resource, acl):
         """
@@ -23,7 +33,9 @@ class HierarchicalRoleParentsWalker(interfaces.IRoleParentsWalker):
         def bases_getter(current):
             return self._parents_accessor(role, current, acl)
 
-        resource_bases = utils.get_mro(resource, bases_getter)
+        kwargs = {'role': role, 'acl': acl}
+        cache_key = (self, resource) + tuple(kwargs[i] for i in self._depends)
+        resource_bases = utils.get_mro(resource, bases_getter, cache_key)
         for resource_base in resource_bases:
             parent_roles += self._delegate(role, resource_base, acl)
         return parent_roles
@@ -96,17 +108,44 @@ class CompositeAclWalker(interfaces.IAclWalker):
             if result is not None:
                 return result
 
+    def expand(self, role, privilege, resource, acl):
+        """
+        :type role: simpleacl.interfaces.IRole
+        :type privilege: simpleacl.interfaces.IPrivilege
+        :type resource: simpleacl.interfaces.IResource
+        :type acl: simpleacl.interfaces.IAcl
+        :rtype: collections.Iterable[tuple]
+        """
+        for delegate in self._delegates:
+            for probe in delegate.expand(role, privilege, resource, acl):
+                yield probe
+
+    def instrumented(self, instrumentation, depth=0):
+        """Returns the instrumented copy of the walker.
+
+        :type instrumentation: simpleacl.walkers.Instrumentation
+        :type depth: int
+        :rtype: simpleacl.interfaces.IAclWalker
+        """
+        obj = copy.copy(self)
+        obj._delegates = tuple(_instrument(i, instrumentation, depth + 1) for i in self._delegates)
+        return InstrumentedAclWalker(obj, instrumentation, '{0}_composite'.format(depth))
+
 
 class HierarchicalAclWalker(interfaces.IAclWalker):
-    def __init__(self, arg, parents_accessor, delegate):
+    def __init__(self, arg, parents_accessor, delegate, depends=('role', 'privilege', 'resource', 'acl')):
         """
         :type arg: str
         :type parents_accessor: simpleacl.interfaces.IRole, simpleacl.interfaces.IPrivilege, simpleacl.interfaces.IResource, simpleacl.interfaces.IAcl) -> tuple[simpleacl.interfaces.IEntity]
         :type delegate: simpleacl.interfaces.IAclWalker
+        :param depends: names of arguments the parents_accessor depends on,
+            they are used as the key of linearization cache.
+        :type depends: tuple[str]
         """
         self._arg = arg
         self._parents_accessor = parents_accessor
         self._delegate = delegate
+        self._depends = tuple(i for i in depends if i != arg)
 
     def __call__(self, role, privilege, resource, acl):
         """
@@ -118,6 +157,30 @@ class HierarchicalAclWalker(interfaces.IAclWalker):
         """
         kwargs = locals().copy()
         kwargs.pop('self')
+        for base in self._get_bases(kwargs):
+            new_kwargs = kwargs.copy()
+            new_kwargs[self._arg] = base
+            result = self._delegate(**new_kwargs)
+            if result is not None:
+                return result
+
+    def expand(self, role, privilege, resource, acl):
+        """
+        :type role: simpleacl.interfaces.IRole
+        :type privilege: simpleacl.interfaces.IPrivilege
+        :type resource: simpleacl.interfaces.IResource
+        :type acl: simpleacl.interfaces.IAcl
+        :rtype: collections.Iterable[tuple]
+        """
+        kwargs = locals().copy()
+        kwargs.pop('self')
+        for base in self._get_bases(kwargs):
+            new_kwargs = kwargs.copy()
+            new_kwargs[self._arg] = base
+            for probe in self._delegate.expand(**new_kwargs):
+                yield probe
+
+    def _get_bases(self, kwargs):
         current = kwargs[self._arg]
 
         def bases_getter(current):
@@ -125,13 +188,39 @@ class HierarchicalAclWalker(interfaces.IAclWalker):
             new_kwargs[self._arg] = current
             return self._parents_accessor(**new_kwargs)
 
-        bases = utils.get_mro(current, bases_getter)
-        for base in bases:
-            new_kwargs = kwargs.copy()
-            new_kwargs[self._arg] = base
-            result = self._delegate(**new_kwargs)
-            if result is not None:
-                return result
+        cache_key = (self, current) + tuple(kwargs[i] for i in self._depends)
+        return utils.get_mro(current, bases_getter, cache_key)
+
+    def instrumented(self, instrumentation, depth=0):
+        """Returns the instrumented copy of the walker.
+
+        Besides calls and time of the layer, reports the calls of get_mro(),
+        the number of bases it returns and the calls of parents_accessor
+        (they are made on misses of the linearization cache only).
+
+        :type instrumentation: simpleacl.walkers.Instrumentation
+        :type depth: int
+        :rtype: simpleacl.interfaces.IAclWalker
+        """
+        name = '{0}_hierarchical_{1}'.format(depth, self._arg)
+        obj = copy.copy(self)
+        obj._delegate = _instrument(self._delegate, instrumentation, depth + 1)
+        get_bases = obj._get_bases
+        parents_accessor = self._parents_accessor
+
+        def instrumented_get_bases(kwargs):
+            instrumentation.incr('get_mro')
+            bases = get_bases(kwargs)
+            instrumentation.histogram('walker.{0}.bases'.format(name), len(bases))
+            return bases
+
+        def instrumented_parents_accessor(**kwargs):
+            instrumentation.incr('walker.{0}.parents'.format(name))
+            return parents_accessor(**kwargs)
+
+        obj._get_bases = instrumented_get_bases
+        obj._parents_accessor = instrumented_parents_accessor
+        return InstrumentedAclWalker(obj, instrumentation, name)
 
 
 class SubstituteAclWalker(interfaces.IAclWalker):
@@ -162,6 +251,22 @@ class SubstituteAclWalker(interfaces.IAclWalker):
             if result is not None:
                 return result
 
+    def expand(self, role, privilege, resource, acl):
+        """
+        :type role: simpleacl.interfaces.IRole
+        :type privilege: simpleacl.interfaces.IPrivilege
+        :type resource: simpleacl.interfaces.IResource
+        :type acl: simpleacl.interfaces.IAcl
+        :rtype: collections.Iterable[tuple]
+        """
+        kwargs = locals().copy()
+        kwargs.pop('self')
+        for item in self._get_items(**kwargs):
+            new_kwargs = kwargs.copy()
+            new_kwargs[self._arg] = item
+            for probe in self._delegate.expand(**new_kwargs):
+                yield probe
+
     def _get_items(self, **kwargs):
         substitutes = self._substitute_accessor(**kwargs)
         items = [kwargs[self._arg]]
@@ -170,6 +275,72 @@ class SubstituteAclWalker(interfaces.IAclWalker):
                 items.append(i)
         return items
 
+    def instrumented(self, instrumentation, depth=0):
+        """Returns the instrumented copy of the walker.
+
+        :type instrumentation: simpleacl.walkers.Instrumentation
+        :type depth: int
+        :rtype: simpleacl.interfaces.IAclWalker
+        """
+        obj = copy.copy(self)
+        obj._delegate = _instrument(self._delegate, instrumentation, depth + 1)
+        return InstrumentedAclWalker(obj, instrumentation, '{0}_substitute_{1}'.format(depth, self._arg))
+
+
+class GuardAclWalker(interfaces.IAclWalker):
+    def __init__(self, predicate, delegate):
+        """Skips the delegate when predicate is false, i.e. no probe of the delegate can match.
+
+        :type predicate: (simpleacl.interfaces.IRole, simpleacl.interfaces.IPrivilege, simpleacl.interfaces.IResource, simpleacl.interfaces.IAcl) -> bool
+        :type delegate: simpleacl.interfaces.IAclWalker
+        """
+        self._predicate = predicate
+        self._delegate = delegate
+
+    def __call__(self, role, privilege, resource, acl):
+        """
+        :type role: simpleacl.interfaces.IRole
+        :type privilege: simpleacl.interfaces.IPrivilege
+        :type resource: simpleacl.interfaces.IResource
+        :type acl: simpleacl.interfaces.IAcl
+        :rtype: bool or None
+        """
+        if self._predicate(role, privilege, resource, acl):
+            return self._delegate(role, privilege, resource, acl)
+
+    def expand(self, role, privilege, resource, acl):
+        """
+        :type role: simpleacl.interfaces.IRole
+        :type privilege: simpleacl.interfaces.IPrivilege
+        :type resource: simpleacl.interfaces.IResource
+        :type acl: simpleacl.interfaces.IAcl
+        :rtype: collections.Iterable[tuple]
+        """
+        if self._predicate(role, privilege, resource, acl):
+            return self._delegate.expand(role, privilege, resource, acl)
+        return ()
+
+    def instrumented(self, instrumentation, depth=0):
+        """Returns the instrumented copy of the walker, which reports the skips.
+
+        :type instrumentation: simpleacl.walkers.Instrumentation
+        :type depth: int
+        :rtype: simpleacl.interfaces.IAclWalker
+        """
+        name = '{0}_guard'.format(depth)
+        obj = copy.copy(self)
+        obj._delegate = _instrument(self._delegate, instrumentation, depth + 1)
+        predicate = self._predicate
+
+        def instrumented_predicate(role, privilege, resource, acl):
+            result = predicate(role, privilege, resource, acl)
+            if not result:
+                instrumentation.incr('walker.{0}.skips'.format(name))
+            return result
+
+        obj._predicate = instrumented_predicate
+        return InstrumentedAclWalker(obj, instrumentation, name)
+
 
 class CallAclWalker(interfaces.IAclWalker):
     def __init__(self, delegate):
@@ -188,17 +359,392 @@ class CallAclWalker(interfaces.IAclWalker):
         """
         return self._delegate(role, privilege, resource, acl)
 
+    def expand(self, role, privilege, resource, acl):
+        """Yields the arguments of the call, which is the leaf of a walk.
+
+        :type role: simpleacl.interfaces.IRole
+        :type privilege: simpleacl.interfaces.IPrivilege
+        :type resource: simpleacl.interfaces.IResource
+        :type acl: simpleacl.interfaces.IAcl
+        :rtype: collections.Iterable[tuple]
+        """
+        yield role, privilege, resource, acl
+
+    def instrumented(self, instrumentation, depth=0):
+        """Returns the instrumented copy of the walker, which reports the rule lookups.
+
+        :type instrumentation: simpleacl.walkers.Instrumentation
+        :type depth: int
+        :rtype: simpleacl.interfaces.IAclWalker
+        """
+        obj = copy.copy(self)
+        delegate = self._delegate
+
+        def instrumented_delegate(role, privilege, resource, acl):
+            return instrumentation.lookup(delegate, role, privilege, resource, acl)
+
+        obj._delegate = instrumented_delegate
+        return InstrumentedAclWalker(obj, instrumentation, '{0}_call'.format(depth))
+
+
+class ParentAclWalker(interfaces.IAclWalker):
+    def __init__(self, delegate):
+        """Walks the acl itself with the delegate, then asks the parent ACL.
+
+        Unlike HierarchicalAclWalker('acl', ...), the parent answers with
+        its own walker and decision cache, so a shared (e.g. compiled)
+        parent does the work once for all its children.
+
+        :type delegate: simpleacl.interfaces.IAclWalker
+        """
+        self._delegate = delegate
+
+    def __call__(self, role, privilege, resource, acl):
+        """
+        :type role: simpleacl.interfaces.IRole
+        :type privilege: simpleacl.interfaces.IPrivilege
+        :type resource: simpleacl.interfaces.IResource
+        :type acl: simpleacl.interfaces.IAcl
+        :rtype: bool or None
+        """
+        result = self._delegate(role, privilege, resource, acl)
+        if result is None and acl.parent is not None:
+            result = acl.parent.get_decision(role, privilege, resource, None)[0]
+        return result
+
+    def expand(self, role, privilege, resource, acl):
+        """
+        :type role: simpleacl.interfaces.IRole
+        :type privilege: simpleacl.interfaces.IPrivilege
+        :type resource: simpleacl.interfaces.IResource
+        :type acl: simpleacl.interfaces.IAcl
+        :rtype: collections.Iterable[tuple]
+        """
+        for probe in self._delegate.expand(role, privilege, resource, acl):
+            yield probe
+        if acl.parent is not None:
+            for probe in acl.parent._walk.expand(role, privilege, resource, acl.parent):
+                yield probe
+
+    def instrumented(self, instrumentation, depth=0):
+        """Returns the instrumented copy of the walker.
+
+        :type instrumentation: simpleacl.walkers.Instrumentation
+        :type depth: int
+        :rtype: simpleacl.interfaces.IAclWalker
+        """
+        obj = copy.copy(self)
+        obj._delegate = _instrument(self._delegate, instrumentation, depth + 1)
+        return InstrumentedAclWalker(obj, instrumentation, '{0}_parent'.format(depth))
+
+
+def _get_foreign_owner(acl, entities):
+    """Returns the ACL out of the chain of acl which owns some of the entities, or None.
+
+    Of several ones, the one with the longest chain (e.g. the overlay of a request) is returned.
+    """
+    owner = chain = None
+    for entity in entities:
+        ref = getattr(entity, '_acl', None)
+        if ref is None or ref is acl._ref:
+            continue
+        current = ref()
+        if current is None:
+            continue
+        if chain is None:
+            chain = set(id(i) for i in acl._get_chain())
+        if id(current) not in chain and (owner is None or len(current._get_chain()) > len(owner._get_chain())):
+            owner = current
+    return owner
+
+
+class CompiledAclWalker(interfaces.IAclWalker):
+    """Flattens the delegate walker into a resolution table.
+
+    For every (role, privilege, resource) the delegate is expanded once
+    into the ordered tuple of (role, privilege, resource, acl) probes which
+    have a rule in the backend.  The table is dropped as soon
+    as the revision of the acl chain changes.  The leaves of the delegate
+    are expected to resolve rules with acl.is_plain_allowed().
+    Entries for entities of other ACLs (e.g. the roles of a request asked
+    through its overlay) are kept in a table of that ACL, so they are
+    dropped with it.
+    """
+    def __init__(self, delegate, max_size=100000):
+        """
+        :type delegate: simpleacl.interfaces.IAclWalker
+        :type max_size: int
+        """
+        self._delegate = delegate
+        self._max_size = max_size
+        self._tables = weakref.WeakKeyDictionary()
+        self._foreign_tables = weakref.WeakKeyDictionary()  # owner of entities -> {acl: table}
+
+    def __call__(self, role, privilege, resource, acl):
+        """
+        :type role: simpleacl.interfaces.IRole
+        :type privilege: simpleacl.interfaces.IPrivilege
+        :type resource: simpleacl.interfaces.IResource
+        :type acl: simpleacl.interfaces.IAcl
+        :rtype: bool or None
+        """
+        try:
+            probes = self.compile(role, privilege, resource, acl)
+        except exceptions.AclEcxeption:
+            # Let the delegate fail (or succeed) exactly where it would.
+            return self._delegate(role, privilege, resource, acl)
+        for current_role, current_privilege, current_resource, current_acl in probes:
+            result = current_acl.is_plain_allowed(current_role, current_privilege, current_resource)
+            if result is not None:
+                return result
+
+    def expand(self, role, privilege, resource, acl):
+        """
+        :type role: simpleacl.interfaces.IRole
+        :type privilege: simpleacl.interfaces.IPrivilege
+        :type resource: simpleacl.interfaces.IResource
+        :type acl: simpleacl.interfaces.IAcl
+        :rtype: collections.Iterable[tuple]
+        """
+        return self._delegate.expand(role, privilege, resource, acl)
+
+    def compile(self, role, privilege, resource, acl):
+        """Returns the probes with rules for given arguments.
+
+        :type role: simpleacl.interfaces.IRole
+        :type privilege: simpleacl.interfaces.IPrivilege
+        :type resource: simpleacl.interfaces.IResource
+        :type acl: simpleacl.interfaces.IAcl
+        :rtype: tuple[tuple]
+        """
+        entries = self._get_entries(role, privilege, resource, acl)
+        key = (role, privilege, resource)
+        entry = entries.get(key)
+        if entry is not None and entry[0] is role and entry[1] is privilege and entry[2] is resource:
+            return entry[3]
+        probes = []
+        seen = set()
+        for probe in self._delegate.expand(role, privilege, resource, acl):
+            if probe in seen:
+                continue
+            seen.add(probe)
+            if probe[3].get_plain_rule(probe[0], probe[1], probe[2]) is not None:
+                probes.append(probe)
+        probes = tuple(probes)
+        entries[key] = (role, privilege, resource, probes)
+        return probes
+
+    def _get_entries(self, role, privilege, resource, acl, create=True):
+        """Returns the entries of the table for given arguments, None if there's no table and not create"""
+        owner = _get_foreign_owner(acl, (role, privilege, resource))
+        if owner is None:
+            tables, revision = self._tables, acl.get_revision()
+        else:
+            tables = self._foreign_tables.get(owner)
+            if tables is None:
+                tables = self._foreign_tables[owner] = weakref.WeakKeyDictionary()
+            # The table mustn't reference the owner, it's a weak key
+            revision = (acl.get_revision(), tuple(
+                id(i) if isinstance(i, interfaces.IAcl) else i for i in owner.get_revision()))
+        table = tables.get(acl)
+        if table is None or table[0] != revision or len(table[1]) >= self._max_size:
+            if not create:
+                return None
+            table = tables[acl] = (revision, {})
+        return table[1]
+
+    def rebase(self, acl, old_revision, new_revision, is_affected):
+        """Keeps the table of acl built at old_revision for new_revision, without entries
+        for which is_affected(role, privilege, resource) is true.
+
+        :type acl: simpleacl.interfaces.IAcl
+        :type is_affected: collections.Callable
+        """
+        table = self._tables.get(acl)
+        if table is not None and table[0] == old_revision:
+            entries = dict((key, entry) for key, entry in table[1].items()
+                           if not is_affected(entry[0], entry[1], entry[2]))
+            self._tables[acl] = (new_revision, entries)
+
+    def instrumented(self, instrumentation, depth=0):
+        """Returns the instrumented copy of the walker, which shares the tables with this one.
+
+        :type instrumentation: simpleacl.walkers.Instrumentation
+        :type depth: int
+        :rtype: simpleacl.interfaces.IAclWalker
+        """
+        obj = copy.copy(self)
+        obj.__class__ = InstrumentedCompiledAclWalker
+        obj._instrumentation = instrumentation
+        obj._delegate = _instrument(self._delegate, instrumentation, depth + 1)
+        return InstrumentedAclWalker(obj, instrumentation, '{0}_compiled'.format(depth))
+
+
+class InstrumentedCompiledAclWalker(CompiledAclWalker):
+    """CompiledAclWalker which reports compilations and rule lookups"""
+
+    def __call__(self, role, privilege, resource, acl):
+        try:
+            probes = self.compile(role, privilege, resource, acl)
+        except exceptions.AclEcxeption:
+            return self._delegate(role, privilege, resource, acl)
+        for current_role, current_privilege, current_resource, current_acl in probes:
+            result = self._instrumentation.lookup(
+                _call_plain_allowed, current_role, current_privilege, current_resource, current_acl
+            )
+            if result is not None:
+                return result
+
+    def compile(self, role, privilege, resource, acl):
+        entries = self._get_entries(role, privilege, resource, acl, create=False)
+        entry = entries and entries.get((role, privilege, resource))
+        if not entry or entry[0] is not role or entry[1] is not privilege or entry[2] is not resource:
+            self._instrumentation.incr('compile')
+        return super(InstrumentedCompiledAclWalker, self).compile(role, privilege, resource, acl)
+
+
+class Instrumentation(object):
+    """Passes metrics of instrumented walkers to the sink.
+
+    The sink has statsd-like methods incr(name, count), timing(name, seconds)
+    and histogram(name, value), see simpleacl.utils.StatsCollector.
+    Times of a layer include the times of the layers it delegates to.
+    """
+    def __init__(self, sink, prefix='simpleacl'):
+        self.sink = sink
+        self.prefix = prefix
+        self._local = local()
+
+    def incr(self, name, count=1):
+        self.sink.incr('{0}.{1}'.format(self.prefix, name), count)
+        counts = getattr(self._local, 'counts', None)
+        if counts:
+            counts[-1][name] = counts[-1].get(name, 0) + count
+
+    def timing(self, name, seconds):
+        self.sink.timing('{0}.{1}'.format(self.prefix, name), seconds)
+
+    def histogram(self, name, value):
+        self.sink.histogram('{0}.{1}'.format(self.prefix, name), value)
+
+    def lookup(self, func, role, privilege, resource, acl):
+        """Calls func(role, privilege, resource, acl) which resolves the rule with acl.is_plain_allowed()"""
+        self.incr('lookups')
+        rule = acl.get_plain_rule(role, privilege, resource)
+        if not utils.is_dynamic_rule(rule):
+            return func(role, privilege, resource, acl)
+        self.incr('callable_rules')
+        start = timer()
+        try:
+            return func(role, privilege, resource, acl)
+        finally:
+            self.timing('callable_rules', timer() - start)
+
+    def begin_decision(self):
+        counts = getattr(self._local, 'counts', None)
+        if counts is None:
+            counts = self._local.counts = []
+        counts.append({})
+
+    def end_decision(self, seconds):
+        counts = self._local.counts.pop()
+        self.incr('decisions')
+        self.timing('decision', seconds)
+        for name in ('lookups', 'get_mro', 'callable_rules', 'compile'):
+            self.histogram('decision.' + name, counts.get(name, 0))
+
+
+class InstrumentedAclWalker(interfaces.IAclWalker):
+    """Reports calls and time of the delegate.
+
+    With decision=True the walker is the top of the chain, and it reports
+    the metrics per decision as well.
+    """
+    def __init__(self, delegate, instrumentation, name, decision=False):
+        """
+        :type delegate: simpleacl.interfaces.IAclWalker
+        :type instrumentation: simpleacl.walkers.Instrumentation
+        :type name: str
+        :type decision: bool
+        """
+        self._delegate = delegate
+        self._instrumentation = instrumentation
+        self._name = 'walker.' + name
+        self._decision = decision
+
+    def __call__(self, role, privilege, resource, acl):
+        """
+        :type role: simpleacl.interfaces.IRole
+        :type privilege: simpleacl.interfaces.IPrivilege
+        :type resource: simpleacl.interfaces.IResource
+        :type acl: simpleacl.interfaces.IAcl
+        :rtype: bool or None
+        """
+        instrumentation = self._instrumentation
+        if self._decision:
+            instrumentation.begin_decision()
+        instrumentation.incr(self._name + '.calls')
+        start = timer()
+        try:
+            return self._delegate(role, privilege, resource, acl)
+        finally:
+            elapsed = timer() - start
+            instrumentation.timing(self._name, elapsed)
+            if self._decision:
+                instrumentation.end_decision(elapsed)
+
+    def expand(self, role, privilege, resource, acl):
+        """
+        :type role: simpleacl.interfaces.IRole
+        :type privilege: simpleacl.interfaces.IPrivilege
+        :type resource: simpleacl.interfaces.IResource
+        :type acl: simpleacl.interfaces.IAcl
+        :rtype: collections.Iterable[tuple]
+        """
+        self._instrumentation.incr(self._name + '.expand')
+        return self._delegate.expand(role, privilege, resource, acl)
+
+    def instrumented(self, instrumentation, depth=0):
+        return self
+
+
+def _instrument(walker, instrumentation, depth):
+    if hasattr(walker, 'instrumented'):
+        return walker.instrumented(instrumentation, depth)
+    return walker
+
+
+def _call_plain_allowed(role, privilege, resource, acl):
+    return acl.is_plain_allowed(role, privilege, resource)
+
+
+def get_dotted_parent(getter, name):
+    """Returns the nearest registered dotted ancestor.
+
+    For example, (<Resource: blog>, ) for "blog.post.15" when "blog.post"
+    is not registered in the ACL (it can be registered by a child ACL only).
+    The skipped names are remembered by the linearization cache, so it's
+    dropped when they are registered later.
+    """
+    while '.' in name:
+        name = name.rsplit('.', 1).pop(0)
+        try:
+            return (getter(name), )
+        except exceptions.AclEcxeption:
+            utils.mro_cache.add_missing(name)
+    return ()
+
 
 default_role_walker = SubstituteRoleParentsWalker(
     (lambda role, resource, acl: (acl.get_resource(ANY_RESOURCE),)),
     HierarchicalRoleParentsWalker(
         (lambda role, resource, acl: resource.get_parents()),
         HierarchicalRoleParentsWalker(
-            (lambda role, resource, acl: (acl.get_resource(
-                resource.get_name().rsplit('.', 1).pop(0)
-            ),) if '.' in resource.get_name() else ()),
-            (lambda role, resource, acl: role.get_plain_parents(resource, acl))
-        )
+            (lambda role, resource, acl: get_dotted_parent(acl.get_resource, resource.get_name())),
+            (lambda role, resource, acl: role.get_plain_parents(resource, acl)),
+            depends=('resource', 'acl')
+        ),
+        depends=('resource',)
     )
 )
 
@@ -210,36 +756,45 @@ default_acl_walker = HierarchicalAclWalker(
         (lambda role, privilege, resource, acl: role.get_parents(resource, acl)),
         HierarchicalAclWalker(
             'role',
-            (lambda role, privilege, resource, acl: (acl.get_role(
-                role.get_name().rsplit('.', 1).pop(0)
-            ),) if '.' in role.get_name() else ()),
-            SubstituteAclWalker(
-                'resource',
-                (lambda role, privilege, resource, acl: (acl.get_resource(ANY_RESOURCE),)),
-                HierarchicalAclWalker(
+            (lambda role, privilege, resource, acl: get_dotted_parent(acl.get_role, role.get_name())),
+            GuardAclWalker(
+                (lambda role, privilege, resource, acl: acl.has_plain_rules(role=role)),
+                SubstituteAclWalker(
                     'resource',
-                    (lambda role, privilege, resource, acl: resource.get_parents()),
+                    (lambda role, privilege, resource, acl: (acl.get_resource(ANY_RESOURCE),)),
                     HierarchicalAclWalker(
                         'resource',
-                        (lambda role, privilege, resource, acl: (acl.get_resource(
-                            resource.get_name().rsplit('.', 1).pop(0)
-                        ),) if '.' in resource.get_name() else ()),
-                        SubstituteAclWalker(
-                            'privilege',
-                            (lambda role, privilege, resource, acl: (acl.get_privilege(ANY_PRIVILEGE),)),
-                            HierarchicalAclWalker(
-                                'privilege',
-                                (lambda role, privilege, resource, acl: (acl.get_privilege(
-                                    privilege.get_name().rsplit('.', 1).pop(0)
-                                ),) if '.' in privilege.get_name() else ()),
-                                CallAclWalker(
-                                    (lambda role, privilege, resource, acl: acl.is_plain_allowed(role, privilege, resource))
+                        (lambda role, privilege, resource, acl: resource.get_parents()),
+                        HierarchicalAclWalker(
+                            'resource',
+                            (lambda role, privilege, resource, acl: get_dotted_parent(acl.get_resource, resource.get_name())),
+                            GuardAclWalker(
+                                (lambda role, privilege, resource, acl: acl.has_plain_rules(role, resource)),
+                                SubstituteAclWalker(
+                                    'privilege',
+                                    (lambda role, privilege, resource, acl: (acl.get_privilege(ANY_PRIVILEGE),)),
+                                    HierarchicalAclWalker(
+                                        'privilege',
+                                        (lambda role, privilege, resource, acl: get_dotted_parent(acl.get_privilege, privilege.get_name())),
+                                        CallAclWalker(
+                                            (lambda role, privilege, resource, acl: acl.is_plain_allowed(role, privilege, resource))
+                                        ),
+                                        depends=('privilege', 'acl')
+                                    )
                                 )
-                            )
-                        )
+                            ),
+                            depends=('resource', 'acl')
+                        ),
+                        depends=('resource',)
                     )
                 )
-            )
-        )
-    )
+            ),
+            depends=('role', 'acl')
+        ),
+        depends=('role', 'resource', 'acl')
+    ),
+    depends=('acl',)
 )
+
+# For ACLs whose parent is shared by many of them, see simpleacl.tenants
+overlay_acl_walker = ParentAclWalker(default_acl_walker._delegate)